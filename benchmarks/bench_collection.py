@@ -0,0 +1,62 @@
+"""Benchmark the bulk operations of the person collections.
+
+Compares moving a batch of persons between two collections one person at a
+time, with :meth:`move_many`, and sampling followed by removal with
+:meth:`sample_and_pop`, for collections of 10^6 members.
+
+Run with ``python benchmarks/bench_collection.py``.
+"""
+
+import timeit
+
+import numpy as np
+import simsurveillance as se
+
+
+N = 10 ** 6
+BATCH_SIZES = [100, 10000, 100000]
+
+
+def object_collections():
+    persons = [se.Person(None) for _ in range(N)]
+    source = se.PersonCollection()
+    source.add_many(persons)
+    return source, se.PersonCollection()
+
+
+def array_collections():
+    population = se.ArrayPopulation(None, N)
+    return se.ArrayPersonCollection(population, np.arange(N)), \
+        se.ArrayPersonCollection(population)
+
+
+def one_at_a_time(source, destination, num, rng):
+    for person in source.random_people(num, rng):
+        source.remove_person(person)
+        destination.add_person(person)
+
+
+def in_bulk(source, destination, num, rng):
+    destination.add_many(source.sample_and_pop(num, rng))
+
+
+def main():
+    for name, make_collections in [('PersonCollection', object_collections),
+                                   ('ArrayPersonCollection',
+                                    array_collections)]:
+        print(name)
+        for num in BATCH_SIZES:
+            times = []
+            for move in [one_at_a_time, in_bulk]:
+                source, destination = make_collections()
+                rng = np.random.default_rng(1)
+                times.append(min(timeit.repeat(
+                    lambda: move(source, destination, num, rng),
+                    number=1, repeat=3)))
+            print('  move {:>6d} of 10^6: one at a time {:.4f} s, '
+                  'bulk {:.4f} s, speedup {:.1f}x'.format(
+                      num, times[0], times[1], times[0] / times[1]))
+
+
+if __name__ == '__main__':
+    main()
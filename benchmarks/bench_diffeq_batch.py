@@ -0,0 +1,54 @@
+"""Benchmark integrating many SIRS systems at once.
+
+Compares calling :meth:`SIRSModel.simulate` for each parameter vector with
+one call to :meth:`SIRSModel.simulate_batch`, in a single process, and
+reports the throughput in simulations per second.
+
+Run with ``python benchmarks/bench_diffeq_batch.py``.
+"""
+
+import time
+
+import numpy as np
+import simsurveillance as se
+
+
+BATCH_SIZES = [10, 100, 1000, 10000]
+TIMES = np.arange(0, 200.0)
+
+
+def prior_samples(num, rng):
+    return np.column_stack((rng.uniform(0.1, 1.0, num),
+                            rng.uniform(0.05, 0.3, num),
+                            rng.uniform(0.001, 0.05, num)))
+
+
+def main():
+    model = se.SIRSModel(init_condition=[0.99, 0.01, 0.0], N=10 ** 6)
+    rng = np.random.default_rng(1)
+
+    for num in BATCH_SIZES:
+        parameters = prior_samples(num, rng)
+
+        start = time.perf_counter()
+        batch = model.simulate_batch(parameters, TIMES)
+        batch_time = time.perf_counter() - start
+
+        # Loop over a subset of large batches, to keep the run short
+        num_loop = min(num, 200)
+        start = time.perf_counter()
+        single = np.array([model.simulate(p, TIMES)
+                           for p in parameters[:num_loop]])
+        loop_time = (time.perf_counter() - start) * num / num_loop
+
+        max_difference = np.max(
+            np.abs(batch[:num_loop, :, 0] - single[:, :, 0]))
+
+        print('{:>6d} simulations: loop {:8.0f} /s, batch {:8.0f} /s, '
+              'speedup {:5.1f}x, max prevalence difference {:.1e}'.format(
+                  num, num / loop_time, num / batch_time,
+                  loop_time / batch_time, max_difference))
+
+
+if __name__ == '__main__':
+    main()
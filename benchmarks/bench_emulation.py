@@ -0,0 +1,134 @@
+"""Benchmark calibrating the agent based model with and without emulators.
+
+Calibrates the transmission, recovery and waning rates of
+:class:`SIRSAgentModel` to one synthetic season of prevalence surveys and
+symptomatic case counts, by
+
+- direct rejection ABC, simulating the agent model for every prior draw
+- history matching with Gaussian process emulators, then ABC on the final
+  emulator
+- the same, with :class:`ODESummaries` as a low-fidelity source
+
+and reports the number of agent model simulations, the run time, and the
+mean and standard deviation of the accepted parameters of each.
+
+Run with ``python benchmarks/bench_emulation.py``.
+"""
+
+import time
+
+import numpy as np
+import simsurveillance as se
+
+
+N = 2000
+NUM_INFECTED = 20
+TIMES = list(range(61))
+SURVEY_TIMES = list(range(10, 61, 10))
+NUM_TESTS = 200
+CASE_BIN = 10
+PROPORTION_SYMPTOMATIC = 0.25
+
+TRUE_PARAMETERS = [0.5, 0.2, 0.02]
+LOWER = [0.1, 0.05, 0.0]
+UPPER = [1.0, 0.5, 0.1]
+
+NUM_DIRECT_SIMULATIONS = 2000
+DIRECT_QUANTILE = 0.025
+
+
+def model_factory(parameters, seed):
+    model = se.SIRSAgentModel(N, seed=seed, record_events=False)
+    model.params.set_parameters(dict(zip(
+        ['transmission_rate', 'recovery_rate', 'waning_rate'], parameters)))
+    model.params.set_parameters(
+        {'proportion_symptomatic': PROPORTION_SYMPTOMATIC})
+    model.initialize_infection(NUM_INFECTED)
+    return model
+
+
+def prevalence_survey_factory(model):
+    return se.PrevalenceSurvey(
+        model, se.DiseaseTest(), SURVEY_TIMES,
+        [NUM_TESTS] * len(SURVEY_TIMES), aggregate=True)
+
+
+def symptomatic_testing_factory(model):
+    return se.SymptomaticTesting(model, se.DiseaseTest(), start_time=1)
+
+
+def statistics(observers):
+    """Positive tests of each survey, and the cases of each ten days.
+    """
+    num_positive = observers[0].records()['num_positive'].to_numpy(float)
+    cases = observers[1].records()['cases'].to_numpy(float)
+    return np.concatenate((num_positive, binned(cases)))
+
+
+def binned(cases):
+    return cases.reshape(cases.shape[:-1] + (-1, CASE_BIN)).sum(axis=-1)
+
+
+class BinnedODESummaries(se.ODESummaries):
+    def __call__(self, parameters):
+        summaries = super().__call__(parameters)
+        num_surveys = len(self.survey_times)
+        return np.concatenate(
+            (summaries[..., :num_surveys],
+             binned(summaries[..., num_surveys:])), axis=-1)
+
+
+def report(name, num_simulations, elapsed, samples):
+    print('{:<32s} {:>6d} simulations {:7.1f} s   mean {}   sd {}'.format(
+        name, num_simulations, elapsed,
+        np.array2string(samples.mean(axis=0), precision=3),
+        np.array2string(samples.std(axis=0), precision=3)))
+
+
+def main():
+    simulator = se.SimulationSummaries(
+        model_factory,
+        [prevalence_survey_factory, symptomatic_testing_factory],
+        TIMES, statistics)
+    observed = simulator(TRUE_PARAMETERS, 1)
+    print('True parameters {}'.format(TRUE_PARAMETERS))
+
+    # Direct rejection ABC
+    rng = np.random.default_rng(2)
+    start = time.perf_counter()
+    prior_draws = rng.uniform(LOWER, UPPER, (NUM_DIRECT_SIMULATIONS, 3))
+    simulated = np.array([simulator(p, seed) for seed, p in enumerate(
+        prior_draws, start=100)])
+    scale = simulated.std(axis=0)
+    scale[scale <= 0] = 1
+    distance = np.sqrt(np.sum(((simulated - observed) / scale) ** 2, axis=1))
+    accepted = prior_draws[np.argsort(distance)[
+        :int(DIRECT_QUANTILE * NUM_DIRECT_SIMULATIONS)]]
+    direct_simulations = NUM_DIRECT_SIMULATIONS
+    report('Direct rejection ABC', direct_simulations,
+           time.perf_counter() - start, accepted)
+
+    low_fidelity = BinnedODESummaries(
+        se.SIRSModel([1 - NUM_INFECTED / N, NUM_INFECTED / N, 0], N),
+        SURVEY_TIMES, [NUM_TESTS] * len(SURVEY_TIMES),
+        list(range(1, TIMES[-1] + 1)),
+        ascertainment=PROPORTION_SYMPTOMATIC)
+
+    for name, source in [('History matching + emulator ABC', None),
+                         ('  with ODE low fidelity', low_fidelity)]:
+        start = time.perf_counter()
+        history_matching = se.HistoryMatching(
+            simulator, observed, LOWER, UPPER, low_fidelity=source)
+        history_matching.run(num_waves=4, design_size=40)
+        samples = history_matching.abc(num_samples=500, quantile=0.1)
+        report(name, history_matching.num_simulations,
+               time.perf_counter() - start, samples)
+        print('{:<32s} {:.0f}x fewer simulations, non-implausible '
+              'fraction by wave {}'.format(
+                  '', direct_simulations / history_matching.num_simulations,
+                  [round(float(w.non_implausible_fraction), 4)
+                   for w in history_matching.waves]))
+
+
+if __name__ == '__main__':
+    main()
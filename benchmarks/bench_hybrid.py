@@ -0,0 +1,94 @@
+"""Benchmark the hybrid agent and compartment model.
+
+Simulates replicate epidemics in a population of 10^5, observed by
+symptomatic testing and a prevalence survey, with
+
+- :class:`SIRSArrayAgentModel`, the pure agent based model
+- :class:`HybridSIRSModel`, switching to binomial leaps of the compartments
+  above 1000 infected
+- the same, with the flows of the differential equation model instead
+
+and reports the run time of each, with summaries of the simulated
+epidemics and observations. For each summary, the p-value of a two-sample
+Kolmogorov-Smirnov test against the agent based model is given.
+
+Run with ``python benchmarks/bench_hybrid.py``.
+"""
+
+import time
+
+import numpy as np
+import scipy.stats
+import simsurveillance as se
+
+
+N = 10 ** 5
+NUM_INFECTED = 10
+THRESHOLD = 1000
+TIMES = list(range(121))
+SURVEY_TIMES = list(range(10, 121, 10))
+NUM_TESTS = 1000
+NUM_REPLICATES = 20
+
+PARAMETERS = {'transmission_rate': 1.0,
+              'recovery_rate': 0.5,
+              'waning_rate': 0.05}
+
+
+def simulate(model):
+    model.params.set_parameters(PARAMETERS)
+    model.initialize_infection(NUM_INFECTED)
+    test = se.DiseaseTest(0.9, 0.99)
+    testing = se.SymptomaticTesting(model, test, start_time=1)
+    survey = se.PrevalenceSurvey(model, test, SURVEY_TIMES,
+                                 [NUM_TESTS] * len(SURVEY_TIMES))
+    model.add_observers(testing, survey)
+
+    start = time.perf_counter()
+    output = model.simulate(TIMES)
+    elapsed = time.perf_counter() - start
+
+    infected = output[se.InfectionStatus.INFECTED].to_numpy()
+    summaries = {
+        'peak infected': infected.max(),
+        'peak time': infected.argmax(),
+        'infected at 120': infected[-1],
+        'total cases': testing.records()['cases'].sum(),
+        'total positive tests': survey.records()['num_positive'].sum(),
+    }
+    return elapsed, summaries
+
+
+def main():
+    models = [
+        ('agents', lambda seed: se.SIRSArrayAgentModel(
+            N, seed, record_events=False)),
+        ('hybrid tau', lambda seed: se.HybridSIRSModel(
+            N, THRESHOLD, seed=seed, record_events=False)),
+        ('hybrid ode', lambda seed: se.HybridSIRSModel(
+            N, THRESHOLD, method='ode', seed=seed, record_events=False)),
+    ]
+
+    results = {}
+    for name, factory in models:
+        times, summaries = zip(*[simulate(factory(seed))
+                                 for seed in range(NUM_REPLICATES)])
+        results[name] = (np.array(times), {
+            key: np.array([s[key] for s in summaries])
+            for key in summaries[0]})
+
+    agent_time, agent_summaries = results['agents']
+    for name, (times, summaries) in results.items():
+        print('{}: {:.2f} s per simulation, speedup {:.1f}x'.format(
+            name, times.mean(), agent_time.mean() / times.mean()))
+        for key, values in summaries.items():
+            line = '  {:<22s} {:>9.1f} +- {:>7.1f}'.format(
+                key, values.mean(), values.std())
+            if name != 'agents':
+                line += ', KS p-value {:.2f}'.format(scipy.stats.ks_2samp(
+                    values, agent_summaries[key]).pvalue)
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
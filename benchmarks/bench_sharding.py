@@ -0,0 +1,114 @@
+"""Benchmark the sharded agent based model.
+
+First simulates one epidemic in a population of 10^6 (or the size given as
+the first argument) with :class:`ShardedSIRSModel`, for an increasing
+number of worker processes, up to the number of CPUs, and reports the run
+time of each. The run in this process also reports the growth of the peak
+resident memory per person, which bounds the size of population that fits
+in the memory of a machine.
+
+Then compares 250 replicate epidemics in a population of 10^4, simulated by
+:class:`SIRSArrayAgentModel` and by :class:`ShardedSIRSModel` in 4 shards,
+reporting summaries of each, and the p-value of a two-sample
+Kolmogorov-Smirnov test of each summary.
+
+Run with ``python benchmarks/bench_sharding.py [N]``.
+"""
+
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+import scipy.stats
+import simsurveillance as se
+
+
+NUM_INFECTED = 10
+TIMES = list(range(61))
+NUM_REPLICATES = 250
+
+PARAMETERS = {'transmission_rate': 1.0,
+              'recovery_rate': 0.5,
+              'waning_rate': 0.05}
+
+
+def symptomatic_testing(model):
+    return se.SymptomaticTesting(model, se.DiseaseTest(0.9, 0.99), 1)
+
+
+def summaries(output):
+    infected = output[se.InfectionStatus.INFECTED].to_numpy()
+    return {'peak infected': infected.max(),
+            'peak time': infected.argmax(),
+            'infected at 60': infected[-1],
+            'total transmissions': output['transmissions'].sum()}
+
+
+def peak_memory():
+    """Peak resident memory of this process, in bytes.
+    """
+    # Linux reports kilobytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def throughput(N):
+    num_workers = 1
+    while num_workers <= os.cpu_count():
+        memory_before = peak_memory()
+        model = se.ShardedSIRSModel(N, num_shards=num_workers,
+                                    num_workers=num_workers)
+        model.params.set_parameters(PARAMETERS)
+        model.add_shard_observers(symptomatic_testing)
+
+        start = time.perf_counter()
+        with model:
+            model.initialize_infection(NUM_INFECTED)
+            output = model.simulate(TIMES)
+        elapsed = time.perf_counter() - start
+
+        print('{} workers: {:.1f} s, peak of {} infected'.format(
+            num_workers, elapsed,
+            output[se.InfectionStatus.INFECTED].max()))
+        if num_workers == 1:
+            print('  {:.0f} bytes of peak memory per person'.format(
+                (peak_memory() - memory_before) / N))
+        num_workers *= 2
+
+
+def equivalence():
+    results = {}
+    for name in ['single process', 'sharded']:
+        replicates = []
+        for seed in range(NUM_REPLICATES):
+            if name == 'sharded':
+                model = se.ShardedSIRSModel(10 ** 4, 4, 1, seed)
+            else:
+                model = se.SIRSArrayAgentModel(
+                    10 ** 4, seed, record_events=False)
+            model.params.set_parameters(PARAMETERS)
+            model.initialize_infection(NUM_INFECTED)
+            replicates.append(summaries(model.simulate(TIMES)))
+        results[name] = {key: np.array([r[key] for r in replicates])
+                         for key in replicates[0]}
+
+    for name, values in results.items():
+        print(name)
+        for key, value in values.items():
+            line = '  {:<20s} {:>9.1f} +- {:>7.1f}'.format(
+                key, value.mean(), value.std())
+            if name == 'sharded':
+                line += ', KS p-value {:.2f}'.format(scipy.stats.ks_2samp(
+                    value, results['single process'][key]).pvalue)
+            print(line)
+
+
+def main():
+    N = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10 ** 6
+    throughput(N)
+    equivalence()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,10 +2,23 @@
 """
 
 from .infection_status import *  # noqa
+from .seeding import *  # noqa
 from .diffeq_model import *  # noqa
+from .likelihood import *  # noqa
 from .agent_model import *  # noqa
+from .stochastic_model import *  # noqa
 from .collection import *  # noqa
 from .parameters import *  # noqa
 from .agents import *  # noqa
+from .population import *  # noqa
+from .scheduler import *  # noqa
+from .event_log import *  # noqa
+from .incidence import *  # noqa
 from .steps import *  # noqa
 from .observation import *  # noqa
+from .ensemble import *  # noqa
+from .fitting import *  # noqa
+from .emulation import *  # noqa
+from .abc_smc import *  # noqa
+from .particle_filter import *  # noqa
+from .sharding import *  # noqa
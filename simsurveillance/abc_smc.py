@@ -0,0 +1,611 @@
+"""Approximate Bayesian computation by sequential Monte Carlo.
+"""
+
+import collections
+import concurrent.futures
+import time
+import numpy as np
+import scipy.linalg
+import simsurveillance as se
+
+
+class MultivariateNormalKernel:
+    """Gaussian perturbation kernel of ABC-SMC.
+
+    Particles are perturbed by a multivariate normal distribution, whose
+    covariance is a multiple of the weighted covariance of the particles of
+    the previous generation. Twice the covariance is the choice of Beaumont
+    et al. (2009).
+
+    Attributes
+    ----------
+    scale : float
+        Multiple of the covariance of the particles
+    covariance : numpy.ndarray
+        Covariance of the kernel, set by :meth:`fit`
+    """
+    def __init__(self, scale=2.0):
+        """
+        Parameters
+        ----------
+        scale : float, optional (2.0)
+            Multiple of the covariance of the particles
+        """
+        self.scale = scale
+        self.covariance = None
+
+    def fit(self, particles, weights):
+        """Adapt the kernel to a generation of particles.
+
+        Parameters
+        ----------
+        particles : numpy.ndarray
+            Particles, of shape (n, n_parameters)
+        weights : numpy.ndarray
+            Normalised weight of each particle
+        """
+        covariance = np.atleast_2d(np.cov(particles.T, aweights=weights))
+        # Keep the kernel proper if the particles have collapsed
+        covariance += 1e-12 * np.eye(len(covariance))
+        self.covariance = self.scale * covariance
+        self._cholesky = np.linalg.cholesky(self.covariance)
+
+    def perturb(self, particles, rng):
+        """Perturb particles.
+
+        Parameters
+        ----------
+        particles : numpy.ndarray
+            Particles, of shape (n, n_parameters)
+        rng : numpy.random.Generator
+            Random generator
+
+        Returns
+        -------
+        numpy.ndarray
+            Perturbed particles
+        """
+        return particles + rng.standard_normal(particles.shape) \
+            @ self._cholesky.T
+
+    def density(self, proposals, particles):
+        """Compute the density of moving from each particle to each
+        proposal.
+
+        Parameters
+        ----------
+        proposals : numpy.ndarray
+            Perturbed particles, of shape (m, n_parameters)
+        particles : numpy.ndarray
+            Particles, of shape (n, n_parameters)
+
+        Returns
+        -------
+        numpy.ndarray
+            Kernel densities, of shape (m, n)
+        """
+        differences = proposals[:, np.newaxis, :] - particles[np.newaxis]
+        whitened = scipy.linalg.solve_triangular(
+            self._cholesky, differences.reshape(-1, differences.shape[2]).T,
+            lower=True)
+        squared = np.sum(whitened ** 2, axis=0).reshape(differences.shape[:2])
+        log_normaliser = np.sum(np.log(np.diag(self._cholesky))) \
+            + 0.5 * len(self._cholesky) * np.log(2 * np.pi)
+        return np.exp(-0.5 * squared - log_normaliser)
+
+
+class UniformKernel:
+    """Component-wise uniform perturbation kernel of ABC-SMC.
+
+    Each parameter is perturbed uniformly within plus or minus a multiple of
+    its range over the particles of the previous generation, as proposed by
+    Toni et al. (2009).
+
+    Attributes
+    ----------
+    scale : float
+        Half-width of the kernel, as a multiple of the range of the
+        particles
+    half_widths : numpy.ndarray
+        Half-width for each parameter, set by :meth:`fit`
+    """
+    def __init__(self, scale=0.5):
+        """
+        Parameters
+        ----------
+        scale : float, optional (0.5)
+            Half-width of the kernel, as a multiple of the range of the
+            particles
+        """
+        self.scale = scale
+        self.half_widths = None
+
+    def fit(self, particles, weights):
+        """Adapt the kernel to a generation of particles.
+
+        Parameters
+        ----------
+        particles : numpy.ndarray
+            Particles, of shape (n, n_parameters)
+        weights : numpy.ndarray
+            Normalised weight of each particle
+        """
+        ranges = np.ptp(particles, axis=0)
+        self.half_widths = self.scale * np.maximum(ranges, 1e-12)
+
+    def perturb(self, particles, rng):
+        """Perturb particles.
+
+        Parameters
+        ----------
+        particles : numpy.ndarray
+            Particles, of shape (n, n_parameters)
+        rng : numpy.random.Generator
+            Random generator
+
+        Returns
+        -------
+        numpy.ndarray
+            Perturbed particles
+        """
+        return particles + self.half_widths * rng.uniform(
+            -1, 1, particles.shape)
+
+    def density(self, proposals, particles):
+        """Compute the density of moving from each particle to each
+        proposal.
+
+        Parameters
+        ----------
+        proposals : numpy.ndarray
+            Perturbed particles, of shape (m, n_parameters)
+        particles : numpy.ndarray
+            Particles, of shape (n, n_parameters)
+
+        Returns
+        -------
+        numpy.ndarray
+            Kernel densities, of shape (m, n)
+        """
+        inside = np.all(
+            np.abs(proposals[:, np.newaxis, :] - particles[np.newaxis])
+            <= self.half_widths, axis=2)
+        return inside / np.prod(2 * self.half_widths)
+
+
+ABCGeneration = collections.namedtuple(
+    'ABCGeneration',
+    ['tolerance', 'particles', 'weights', 'distances', 'num_simulations',
+     'num_stopped_early', 'acceptance_rate', 'simulations_per_second'])
+ABCGeneration.__doc__ = """One generation of :class:`ABCSMC`.
+
+Attributes
+----------
+tolerance : float
+    Largest distance of the accepted particles
+particles : numpy.ndarray
+    Accepted parameters, of shape (num_particles, n_parameters)
+weights : numpy.ndarray
+    Normalised importance weight of each particle
+distances : numpy.ndarray
+    Distance of the simulation of each particle to the observations
+num_simulations : int
+    Number of simulations run in the generation, including those stopped
+    early
+num_stopped_early : int
+    Number of simulations stopped once their distance exceeded the
+    tolerance
+acceptance_rate : float
+    Fraction of the simulations which were accepted
+simulations_per_second : float
+    Throughput of the simulations of the generation
+"""
+
+
+class ABCSMC:
+    """Calibration of a stochastic model to observer records by ABC-SMC.
+
+    Each generation accepts a population of particles, that is parameter
+    vectors whose simulated observations are within the tolerance of the
+    real ones. The first generation is drawn from the prior. Each later
+    generation proposes particles by resampling the previous generation by
+    weight and perturbing them with the kernel, which is adapted to the
+    previous particles, and weights them by the ratio of the prior to the
+    proposal density (Beaumont et al., 2009). The tolerance of each
+    generation is a quantile of the distances accepted in the previous one
+    (Del Moral et al., 2012).
+
+    The distance between a simulation and the observations is
+
+    ``sqrt(sum_j sum_t ((x_jt - y_jt) / s_j) ** 2)``
+
+    over the observers j and the times t at which both have records, where
+    the statistics of each record are given by
+    :func:`simsurveillance.statistic_columns`, and s_j is a scale for each
+    observer. As the distance can only grow as the simulation goes on, a
+    simulation is stopped as soon as its distance exceeds the tolerance,
+    without changing the result.
+
+    Proposals are simulated in batches, spread across a pool of worker
+    processes, with seeds from :func:`simsurveillance.spawn_seeds`. When the
+    simulations are run in worker processes, the factories must be
+    picklable, for example functions defined at module level.
+
+    Attributes
+    ----------
+    model_factory : callable
+        Called as ``model_factory(parameters, seed)``, returns a new model
+        with those parameters, ready to simulate.
+    observer_factories : list
+        Callables, each of which is called with the model and returns a new
+        observer.
+    observed : list of pandas.DataFrame
+        Real records of each observer
+    times : list
+        Time points of the simulations
+    log_prior : pints.LogPrior
+        Prior of the parameters
+    kernel : object
+        Perturbation kernel, such as :class:`MultivariateNormalKernel` or
+        :class:`UniformKernel`
+    scales : numpy.ndarray
+        Scale of the statistics of each observer
+    check_every : int
+        Number of time steps between checks of the distance of a running
+        simulation against the tolerance
+    max_proposal_rounds : int
+        Largest number of rounds of perturbations drawn to propose the
+        particles of a generation, after which proposing is abandoned
+    generations : list of simsurveillance.ABCGeneration
+        Generations run so far
+    """
+    def __init__(self, model_factory, observer_factories, observed, times,
+                 log_prior, kernel=None, scales=None, check_every=5,
+                 max_proposal_rounds=100, seed=1234):
+        """
+        Parameters
+        ----------
+        model_factory : callable
+            Called as ``model_factory(parameters, seed)``, returns a new
+            model with those parameters, ready to simulate.
+        observer_factories : list
+            Callables, each of which is called with the model and returns a
+            new observer.
+        observed : list of pandas.DataFrame
+            Real records of each observer, in the format of their
+            ``records()``
+        times : list
+            Time points of the simulations
+        log_prior : pints.LogPrior
+            Prior of the parameters
+        kernel : object, optional (None)
+            Perturbation kernel. By default, a MultivariateNormalKernel.
+        scales : list, optional (None)
+            Scale of the statistics of each observer. By default, the
+            standard deviation of its observed statistics, or 1 if that is
+            smaller.
+        check_every : int, optional (5)
+            Number of time steps between checks of the distance of a
+            running simulation against the tolerance
+        max_proposal_rounds : int, optional (100)
+            Largest number of rounds of perturbations drawn to propose the
+            particles of a generation. Each round perturbs as many
+            particles as are needed, and proposals outside the support of
+            the prior are redrawn in the next round.
+        seed : int, optional (1234)
+            Seed of the proposals and of the simulations
+        """
+        if len(observed) != len(observer_factories):
+            raise ValueError('Records are required for each observer.')
+
+        self.model_factory = model_factory
+        self.observer_factories = list(observer_factories)
+        self.observed = [records.set_index('time')[se.statistic_columns(
+            records)] for records in observed]
+        self._observed_rows = [
+            {t: i for i, t in enumerate(records.index.tolist())}
+            for records in self.observed]
+        self.times = times
+        self.log_prior = log_prior
+        self.kernel = kernel or MultivariateNormalKernel()
+        self.check_every = check_every
+        self.max_proposal_rounds = max_proposal_rounds
+
+        if scales is None:
+            scales = [max(float(np.std(records.to_numpy(dtype=float))), 1.0)
+                      for records in self.observed]
+        self.scales = np.asarray(scales, dtype=float)
+        if self.scales.shape != (len(self.observed), ):
+            raise ValueError('One scale is required for each observer.')
+
+        self.generations = []
+
+        self._seed_sequence, rng_seed = \
+            np.random.SeedSequence(seed).spawn(2)
+        self._rng = np.random.default_rng(rng_seed)
+
+    def distance(self, parameters, seed, tolerance=np.inf):
+        """Simulate the model, and compute the distance of its observations
+        to the real ones.
+
+        Parameters
+        ----------
+        parameters : list
+            Parameters passed to the model factory
+        seed : int
+            Seed passed to the model factory
+        tolerance : float, optional (numpy.inf)
+            The simulation is stopped as soon as the distance exceeds the
+            tolerance.
+
+        Returns
+        -------
+        float
+            Distance, or a lower bound of it, greater than the tolerance, if
+            the simulation was stopped early.
+        bool
+            Whether the simulation was stopped early
+        """
+        model = self.model_factory(parameters, seed)
+        observers = [factory(model) for factory in self.observer_factories]
+        monitor = _DistanceMonitor(self, observers, tolerance)
+        model.add_observers(*observers, monitor)
+
+        try:
+            model.simulate(self.times)
+        except _ToleranceExceeded:
+            return monitor.distance(), True
+        return monitor.distance(), False
+
+    def _partial_squared_distances(self, observers, counted):
+        """Squared distance over the records of each observer which were
+        not yet counted.
+        """
+        total = 0.0
+        for j, observer in enumerate(observers):
+            records = observer.records()
+            new = records.iloc[counted[j]:]
+            counted[j] = len(records)
+            if new.empty:
+                continue
+
+            rows = [self._observed_rows[j].get(t)
+                    for t in new['time'].tolist()]
+            matched = [i for i, row in enumerate(rows) if row is not None]
+            if not matched:
+                continue
+
+            simulated = new[self.observed[j].columns].to_numpy(
+                dtype=float)[matched]
+            real = self.observed[j].to_numpy(dtype=float)[
+                [rows[i] for i in matched]]
+            total += np.sum(((simulated - real) / self.scales[j]) ** 2)
+        return total
+
+    def _sample_prior(self, num):
+        # pints priors draw from the global numpy random state, which is
+        # seeded from the generator of this object and then restored.
+        global_state = np.random.get_state()
+        np.random.seed(int(self._rng.integers(2 ** 32)))
+        try:
+            return np.atleast_2d(self.log_prior.sample(num))
+        finally:
+            np.random.set_state(global_state)
+
+    def _propose(self, num):
+        """Propose particles, and their weights before normalisation.
+        """
+        if not self.generations:
+            return self._sample_prior(num), np.ones(num)
+
+        previous = self.generations[-1]
+        proposals = []
+        num_proposed = 0
+        for _ in range(self.max_proposal_rounds):
+            # Proposals outside the support of the prior are redrawn
+            indices = self._rng.choice(
+                len(previous.particles), num, p=previous.weights)
+            candidates = self.kernel.perturb(
+                previous.particles[indices], self._rng)
+            candidates = candidates[np.isfinite(
+                [self.log_prior(c) for c in candidates])]
+            proposals.append(candidates)
+            num_proposed += len(candidates)
+            if num_proposed >= num:
+                break
+        else:
+            raise RuntimeError(
+                'Only {} of {} proposals of the {} fell within the support '
+                'of the {} after {} rounds; the kernel may be too wide for '
+                'the prior.'.format(
+                    num_proposed, num, type(self.kernel).__name__,
+                    type(self.log_prior).__name__, self.max_proposal_rounds))
+        proposals = np.concatenate(proposals)[:num]
+
+        prior = np.exp([self.log_prior(p) for p in proposals])
+        proposal_density = self.kernel.density(
+            proposals, previous.particles) @ previous.weights
+        return proposals, prior / proposal_density
+
+    def _simulate(self, parameters, tolerance, pool, num_workers):
+        seeds = se.spawn_seeds(self._seed_sequence, len(parameters))
+        tasks = [(self, p, seed, tolerance)
+                 for p, seed in zip(parameters, seeds)]
+
+        if pool is None:
+            results = [_run_particle(task) for task in tasks]
+        else:
+            chunksize = -(-len(tasks) // (4 * num_workers))
+            results = list(pool.map(_run_particle, tasks,
+                                    chunksize=chunksize))
+        distances, stopped = zip(*results)
+        return np.array(distances), np.array(stopped)
+
+    def _tolerance(self, quantile):
+        if not self.generations:
+            return np.inf
+        previous = self.generations[-1]
+        return float(np.quantile(previous.distances, quantile))
+
+    def run(self, num_particles=100, num_generations=5, quantile=0.5,
+            batch_size=None, num_workers=1, min_tolerance=0.0,
+            min_acceptance_rate=0.0, max_simulations=None, verbose=False):
+        """Run generations of ABC-SMC.
+
+        Parameters
+        ----------
+        num_particles : int, optional (100)
+            Number of accepted particles in each generation
+        num_generations : int, optional (5)
+            Largest number of generations to run
+        quantile : float, optional (0.5)
+            Quantile of the distances of the previous generation used as
+            the tolerance of the next.
+        batch_size : int, optional (None)
+            Number of particles proposed and simulated together. By default,
+            num_particles.
+        num_workers : int, optional (1)
+            Number of worker processes. If 1, the simulations are run in
+            this process.
+        min_tolerance : float, optional (0.0)
+            Smallest tolerance. The run stops after a generation with this
+            tolerance.
+        min_acceptance_rate : float, optional (0.0)
+            The run stops after a generation whose acceptance rate is below
+            this value.
+        max_simulations : int, optional (None)
+            Largest number of simulations in a generation, at least 1. If
+            it is reached, the generation is incomplete and the run stops.
+        verbose : bool, optional (False)
+            Whether to print the progress after every generation
+
+        Returns
+        -------
+        numpy.ndarray
+            Particles of the last generation
+        numpy.ndarray
+            Weight of each particle
+        """
+        if max_simulations is not None and max_simulations < 1:
+            raise ValueError('At least one simulation is required in each '
+                             'generation.')
+
+        batch_size = batch_size or num_particles
+        pool = None
+        if num_workers > 1:
+            pool = concurrent.futures.ProcessPoolExecutor(num_workers)
+
+        try:
+            for _ in range(num_generations):
+                tolerance = max(self._tolerance(quantile), min_tolerance)
+                if self.generations:
+                    self.kernel.fit(self.generations[-1].particles,
+                                    self.generations[-1].weights)
+
+                generation = self._run_generation(
+                    num_particles, tolerance, batch_size, pool, num_workers,
+                    max_simulations)
+                self.generations.append(generation)
+                if verbose:
+                    _print_generation(len(self.generations) - 1, generation)
+
+                if len(generation.particles) < num_particles or \
+                        tolerance <= min_tolerance or \
+                        generation.acceptance_rate < min_acceptance_rate:
+                    break
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        return self.generations[-1].particles, self.generations[-1].weights
+
+    def _run_generation(self, num_particles, tolerance, batch_size, pool,
+                        num_workers, max_simulations):
+        particles, weights, distances = [], [], []
+        num_simulations = num_stopped_early = 0
+        start = time.perf_counter()
+
+        while len(particles) < num_particles and (
+                max_simulations is None or num_simulations < max_simulations):
+            size = batch_size
+            if max_simulations is not None:
+                size = min(size, max_simulations - num_simulations)
+            proposals, proposal_weights = self._propose(size)
+            batch_distances, stopped = self._simulate(
+                proposals, tolerance, pool, num_workers)
+            num_simulations += size
+            num_stopped_early += int(np.count_nonzero(stopped))
+
+            for i in np.flatnonzero(batch_distances <= tolerance):
+                if len(particles) == num_particles:
+                    break
+                particles.append(proposals[i])
+                weights.append(proposal_weights[i])
+                distances.append(batch_distances[i])
+
+        elapsed = time.perf_counter() - start
+        weights = np.array(weights)
+        return ABCGeneration(
+            float(np.max(distances)) if distances else tolerance,
+            np.array(particles).reshape(
+                len(particles), self.log_prior.n_parameters()),
+            weights / np.sum(weights) if len(weights) else weights,
+            np.array(distances),
+            num_simulations,
+            num_stopped_early,
+            len(particles) / num_simulations,
+            num_simulations / max(elapsed, 1e-9))
+
+
+class _ToleranceExceeded(Exception):
+    """Raised to stop a simulation whose distance exceeds the tolerance.
+    """
+
+
+class _DistanceMonitor:
+    """Observer-like object which stops a simulation as soon as its distance
+    to the real records exceeds the tolerance.
+
+    It is attached after the real observers, so that their records of a
+    time step are counted in the same step.
+    """
+    def __init__(self, abc, observers, tolerance):
+        self.abc = abc
+        self.observers = observers
+        self.tolerance = tolerance
+        self._counted = [0] * len(observers)
+        self._squared_distance = 0.0
+        self._end_time = max(abc.times)
+
+    def next_time(self, time):
+        # Only stop at check times, to avoid visiting every time step
+        if time > self._end_time:
+            return None
+        check_every = self.abc.check_every
+        return min(-(-time // check_every) * check_every, self._end_time)
+
+    def __call__(self, time):
+        if np.isinf(self.tolerance) or time % self.abc.check_every:
+            return
+        if self.distance() > self.tolerance:
+            raise _ToleranceExceeded
+
+    def distance(self):
+        self._squared_distance += self.abc._partial_squared_distances(
+            self.observers, self._counted)
+        return float(np.sqrt(self._squared_distance))
+
+
+def _run_particle(task):
+    """Simulate one particle, possibly in a worker process.
+    """
+    abc, parameters, seed, tolerance = task
+    return abc.distance(parameters, seed, tolerance)
+
+
+def _print_generation(index, generation):
+    print('Generation {}: tolerance {:.4g}, {} simulations ({} stopped '
+          'early), acceptance rate {:.3f}, {:.1f} simulations/s'.format(
+              index, generation.tolerance, generation.num_simulations,
+              generation.num_stopped_early, generation.acceptance_rate,
+              generation.simulations_per_second))
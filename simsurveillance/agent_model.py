@@ -2,14 +2,177 @@
 """
 
 from collections import defaultdict
-import random
+import contextlib
+import gc
+import pickle
 import numpy as np
 import pandas
 import simsurveillance as se
 from simsurveillance import InfectionStatus as InfStatus
 
 
-class AgentModel:
+class SteppedModel:
+    """Base of the models simulated in discrete time steps.
+
+    It holds the random streams of the model and its observers, and drives
+    the simulation, skipping the time steps at which nothing is due.
+    Subclasses run their steps in :meth:`_advance`, and say when they are
+    next due in :meth:`_next_time`.
+
+    Attributes
+    ----------
+    observers : list of simsurveillance.Observer
+        The observation processes that will be called each iteration of the
+        simulation.
+    rng : numpy.random.Generator
+        Random generator of the simulation
+    time : int
+        Next time step to simulate
+    """
+    def __init__(self, seed=1234):
+        """
+        Parameters
+        ----------
+        seed : int, optional (1234)
+            Random seed, from which all random generators of the model, its
+            steps and its observers are derived.
+        """
+        # We employ two independent random streams so that consistent
+        # simulations can be obtained even if the testing procedure is
+        # adjusted. Generators of the model and its steps are spawned from
+        # the first, and generators of the observers from the second.
+        self.seed_sequences = dict(zip(
+            ('simulation', 'observation'),
+            np.random.SeedSequence(seed).spawn(2)))
+        self.rng = self.spawn_rng()
+        self.observers = []
+        self.time = 0
+
+    def add_observers(self, *observers):
+        """Add observation processes.
+
+        Parameters
+        ----------
+        observers : simsurveillance.Observer
+            To be added to the model
+        """
+        for observer in observers:
+            self.observers.append(observer)
+
+    def spawn_rng(self, stream='simulation'):
+        """Create a new random generator, derived from the model seed.
+
+        Parameters
+        ----------
+        stream : str, optional ('simulation')
+            'simulation' for generators of the model and its steps, or
+            'observation' for generators of observers.
+
+        Returns
+        -------
+        numpy.random.Generator
+            Independent random generator
+        """
+        return np.random.default_rng(self.seed_sequences[stream].spawn(1)[0])
+
+    def _next_time(self, time):
+        """Get the earliest time step, not before the given one, at which
+        the model or any observer is due.
+
+        Parameters
+        ----------
+        time : int
+            Time step from which to look
+
+        Returns
+        -------
+        int or None
+            Next time step at which something is due, or None if the model
+            will not change again.
+        """
+        raise NotImplementedError
+
+    def _advance(self, time):
+        """Run the steps of the model at a time step.
+        """
+        raise NotImplementedError
+
+    def _record_output(self, output, time):
+        """Record simulation outputs at a time step.
+        """
+        raise NotImplementedError
+
+    def _clear_transmissions(self):
+        """Reset the number infected during the most recent time step.
+        """
+        raise NotImplementedError
+
+    def simulate(self, times):
+        """Simulate the model and return the output at given times.
+
+        Rather than visiting every time step, the simulation jumps directly
+        to the next time step at which a step or an observer is due (see
+        :meth:`simsurveillance.ModelStep.next_time` and
+        :meth:`simsurveillance.Observer.next_time`). The model is unchanged
+        at the time steps which are skipped, and their outputs are filled in.
+
+        The simulation starts from :attr:`time`, which is 0 for a new model,
+        and ends after the last of the given times, so a model can be
+        simulated further by calling this method again.
+
+        Parameters
+        ----------
+        times : list
+            Time points at which to evaluate outputs. Times before
+            :attr:`time` are ignored.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Time series output of simulation
+        """
+        output = defaultdict(list)
+        output_times = sorted(t for t in set(times) if t >= self.time)
+        end_time = max(times)
+
+        next_output = 0
+        sim_time = self.time
+        while sim_time <= end_time:
+
+            if next_output < len(output_times) and \
+                    output_times[next_output] == sim_time:
+                self._record_output(output, sim_time)
+                next_output += 1
+
+            ##### Observation processes #####
+            for observer in self.observers:
+                observer(sim_time)
+
+            ##### Simulation steps #####
+            self._advance(sim_time)
+
+            next_time = self._next_time(sim_time + 1)
+            if next_time is None or next_time > end_time:
+                next_time = end_time + 1
+
+            if next_time > sim_time + 1:
+                # Nothing happens at the skipped time steps. The infections
+                # of this time step are reported at the following one only.
+                while next_output < len(output_times) and \
+                        output_times[next_output] < next_time:
+                    if output_times[next_output] > sim_time + 1:
+                        self._clear_transmissions()
+                    self._record_output(output, output_times[next_output])
+                    next_output += 1
+                self._clear_transmissions()
+
+            sim_time = next_time
+
+        self.time = max(self.time, end_time + 1)
+        return pandas.DataFrame(output)
+
+
+class AgentModel(SteppedModel):
     """Abstract agent based model.
 
     Attributes
@@ -31,8 +194,26 @@ class AgentModel:
     steps : list of simsurveillance.ModelStep
         The transmission steps that will be called each iteration of the
         simulation.
+    rng : numpy.random.Generator
+        Random generator of the simulation
+    event_log : simsurveillance.EventLog or None
+        Record of the status changes of all persons, or None if they are not
+        recorded.
+    time : int
+        Next time step to simulate. Each call of :meth:`simulate` continues
+        from it, so a model can be simulated in stages, or snapshotted part
+        way and forked.
     """
-    def __init__(self):
+    def __init__(self, seed=1234):
+        """
+        Parameters
+        ----------
+        seed : int, optional (1234)
+            Random seed, from which all random generators of the model, its
+            steps and its observers are derived.
+        """
+        super().__init__(seed)
+
         self.persons = {
             infection_status: se.PersonCollection()
             for infection_status in InfStatus
@@ -40,55 +221,152 @@ class AgentModel:
         self.all_persons = se.PersonCollection()
         self.N = 0
         self.params = se.ModelParameters()
-        self.observers = []
         self.steps = []
+        self.event_log = None
 
-    def add_observers(self, *observers):
-        """Add observation processes.
+    @property
+    def counts(self):
+        """Number of persons of each infection status, as a dict.
+        """
+        return {status: len(self.persons[status]) for status in InfStatus}
+
+    def snapshot(self):
+        """Capture the full state of the model.
+
+        Everything the simulation depends on is captured together: the
+        persons and their collections, the scheduled transitions, the event
+        log, the steps with their counters, the observers with their
+        records, and the state of every random generator. Restoring the
+        snapshot gives a model which continues exactly as this one would.
+
+        Returns
+        -------
+        bytes
+            Serialised state, which may be stored, sent to another process,
+            or passed to :meth:`restore`.
+        """
+        with _gc_paused():
+            return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def restore(snapshot):
+        """Create a model from a snapshot.
 
         Parameters
         ----------
-        observers : simsurveillance.Observer
-            To be added to the model
+        snapshot : bytes
+            Returned by :meth:`snapshot`
+
+        Returns
+        -------
+        simsurveillance.AgentModel
+            Independent copy of the model, with its observers, at the time
+            of the snapshot
         """
-        for observer in observers:
-            self.observers.append(observer)
+        with _gc_paused():
+            return pickle.loads(snapshot)
 
-    def simulate(self, times):
-        """Simulate the model and return the output at given times.
+    def reseed(self, seed):
+        """Replace the random generators of the model, its steps and its
+        observers with new ones derived from a seed.
 
         Parameters
         ----------
-        times : list
-            Time points at which to evaluate outputs.
+        seed : int or numpy.random.SeedSequence
+            New random seed
+        """
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed_sequences = dict(zip(
+            ('simulation', 'observation'), seed.spawn(2)))
+
+        self.rng = self.spawn_rng()
+        for step in self.steps:
+            step.rng = self.spawn_rng()
+        for observer in self.observers:
+            observer.rng = self.spawn_rng('observation')
+
+    def fork(self, num_forks, reseed=False, seed=None):
+        """Create independent copies of the model in its current state.
+
+        The model is serialised once, and each fork restored from the same
+        snapshot, which is much quicker than simulating each of them from
+        the start.
+
+        Parameters
+        ----------
+        num_forks : int
+            Number of copies
+        reseed : bool, optional (False)
+            Whether to give each fork its own random generators, so that
+            their futures differ. Otherwise, all forks continue exactly as
+            this model would.
+        seed : int, optional (None)
+            Seed from which the seeds of the forks are spawned when
+            reseeding. By default, fresh entropy is taken from the operating
+            system.
 
         Returns
         -------
-        pandas.DataFrame
-            Time series output of simulation
+        list of simsurveillance.AgentModel
+            Copies of the model, with their observers
         """
-        raise NotImplementedError
+        snapshot = self.snapshot()
+        forks = [self.restore(snapshot) for _ in range(num_forks)]
+
+        if reseed:
+            seed_sequences = np.random.SeedSequence(seed).spawn(num_forks)
+            for fork, seed_sequence in zip(forks, seed_sequences):
+                fork.reseed(seed_sequence)
+        return forks
+
+    def _next_time(self, time):
+        """Get the earliest time step, not before the given one, at which
+        any step or observer is due.
+        """
+        next_times = [step.next_time(time) for step in self.steps] + \
+            [observer.next_time(time) for observer in self.observers]
+        return min((t for t in next_times if t is not None), default=None)
+
+    def _advance(self, time):
+        for step in self.steps:
+            step(time)
 
 
 class SIRSAgentModel(AgentModel):
     """Stochastic Agent based model of SIRS.
+
+    Attributes
+    ----------
+    transitions : simsurveillance.EventScheduler
+        Time steps at which each infected or recovered person will next
+        change status.
+    incidence : simsurveillance.IncidenceIndex
+        Persons newly infected at the most recent time steps, to which
+        observers can subscribe.
     """
-    def __init__(self, N, seed=1234):
+    def __init__(self, N, seed=1234, record_events=True):
         """Create a new SIRS agent based model.
 
         Parameters
         ----------
         N : int
             Total number of persons to simulate.
+        seed : int, optional (1234)
+            Random seed
+        record_events : bool, optional (True)
+            Whether to record the status changes of all persons in an
+            event log. Switch off to save memory when the history is not
+            needed.
         """
-        super().__init__()
-        self.transitions = defaultdict(list)
+        super().__init__(seed)
+        self.transitions = se.EventScheduler()
+        self.incidence = se.IncidenceIndex()
         self.N = N
+        if record_events:
+            self.event_log = se.EventLog()
 
-        for _ in range(N):
-            p = se.Person(self)
-            self.persons[p.status].add_person(p)
-            self.all_persons.add_person(p)
+        self._create_persons(N)
 
         self.infection_progression_step =\
             se.InfectionProgressionStep(self)
@@ -99,27 +377,123 @@ class SIRSAgentModel(AgentModel):
             self.infection_progression_step,
         ]
 
-        # We employ two random seeds so that consistent simulations can be
-        # obtained even if the testing procedure is adjusted.
-        np.random.seed(seed)
-        random.seed(seed)
-        self.simulation_random_state = random.getstate()
-        random.seed(seed + 1)
-        self.testing_random_state = random.getstate()
+    def _create_persons(self, N):
+        """Create the susceptible persons of the simulation.
+
+        Parameters
+        ----------
+        N : int
+            Total number of persons to create.
+        """
+        for agent_id in range(N):
+            p = se.Person(self, agent_id)
+            self.persons[p.status].add_person(p)
+            self.all_persons.add_person(p)
+
+    def update_statuses(self, persons, new_status, time):
+        """Change the infection status of many persons at once.
+
+        The persons are moved between the collections of each status in
+        bulk, rather than one at a time as by
+        :meth:`simsurveillance.Person.update_status`.
+
+        Parameters
+        ----------
+        persons : list of simsurveillance.Person
+            Distinct persons whose status changes
+        new_status : simsurveillance.InfectionStatus
+            New status to switch to
+        time : int
+            Time step of the change
+        """
+        by_status = defaultdict(list)
+        for person in persons:
+            by_status[person.status].append(person)
+
+        for status in InfStatus:
+            if by_status[status]:
+                self.persons[status].move_many(
+                    by_status[status], self.persons[new_status])
+
+        for person in persons:
+            person.status = new_status
+            person.last_transition_time = time
+
+        if self.event_log is not None:
+            self.event_log.record_many(
+                [person.agent_id for person in persons], new_status, time)
+
+    def schedule_transition(self, person, time):
+        """Schedule the next status change of a person.
+
+        Parameters
+        ----------
+        person : simsurveillance.Person
+            Person whose status will next change
+        time : int
+            Time step at which the change will happen
+        """
+        self.transitions.schedule(person, time)
+
+    def schedule_transitions(self, persons, times):
+        """Schedule the next status change of many persons at once.
+
+        Parameters
+        ----------
+        persons : list of simsurveillance.Person
+            Persons whose status will next change
+        times : numpy.ndarray
+            Time step at which the change of each person will happen
+        """
+        self.transitions.schedule_many(persons, times)
+
+    def draw_delays(self, rate, num, rng=None):
+        """Draw the number of time steps until the next status changes.
+
+        Delays are exponentially distributed, and rounded to whole time
+        steps.
+
+        Parameters
+        ----------
+        rate : float
+            Rate of the status change
+        num : int
+            Number of delays to draw
+        rng : numpy.random.Generator, optional (None)
+            Random generator to use. By default, the generator of the model.
+
+        Returns
+        -------
+        numpy.ndarray
+            Delay of each status change
+        """
+        if rng is None:
+            rng = self.rng
+        return np.rint(rng.exponential(1 / rate, num)).astype(np.int64)
 
     def infect_people(self, persons, time):
         """Move the given people to the I (infected) status.
+
+        The recovery times and the symptoms of all the people are drawn
+        together, and the recoveries are scheduled in one batch.
         """
-        for person in persons:
-            person.update_status(InfStatus.INFECTED, time)
+        persons = list(persons)
+        if not persons:
+            return
+
+        self.update_statuses(persons, InfStatus.INFECTED, time)
 
-            # Now they are Infect. Check when they will become recovered.
-            next_status_change = random.expovariate(self.params.recovery_rate)
-            next_status_change = round(next_status_change)
-            self.transitions[time + next_status_change].append(person)
+        # Now they are Infect. Check when they will become recovered.
+        next_status_change = self.draw_delays(
+            self.params.recovery_rate, len(persons))
+        self.schedule_transitions(persons, time + next_status_change)
 
-            if random.random() < self.params.proportion_symptomatic:
-                person.symptoms = True
+        symptomatic = self.rng.random(len(persons)) \
+            < self.params.proportion_symptomatic
+        for i in np.flatnonzero(symptomatic).tolist():
+            persons[i].symptoms = True
+
+        self.incidence.record(persons, symptomatic.tolist(), time)
 
     def initialize_infection(self, num_infect, time=0):
         """Start an infection with the given number of infect, randomly
@@ -133,37 +507,195 @@ class SIRSAgentModel(AgentModel):
             Time step. By default, used for initialization, time=0, before
             running the simulation.
         """
-        infect = self.persons[InfStatus.SUSCEPTIBLE].random_people(num_infect)
+        infect = self.persons[InfStatus.SUSCEPTIBLE].random_people(
+            num_infect, self.rng)
         self.infect_people(infect, time)
         self.transmission_step.num_infected += num_infect
 
-    def simulate(self, times):
-        output = defaultdict(list)
-        sim_times = range(max(times) + 1)
+    def _record_output(self, output, time):
+        """Record simulation outputs at a time step.
+        """
+        output['time'].append(time)
+        for status in InfStatus:
+            output[status].append(len(self.persons[status]))
+        output['transmissions'].append(self.transmission_step.num_infected)
 
-        for sim_time in sim_times:
+    def _clear_transmissions(self):
+        self.transmission_step.num_infected = 0
 
-            if sim_time in times:
-                # Record simulation outputs at this time step
-                output['time'].append(sim_time)
-                for status in InfStatus:
-                    output[status].append(len(self.persons[status]))
-                output['transmissions'].append(
-                    self.transmission_step.num_infected)
 
-            ##### Observation processes #####
-            random.setstate(self.testing_random_state)
-            for observer in self.observers:
-                observer(sim_time)
-            self.testing_random_state = random.getstate()
+class SIRSArrayAgentModel(SIRSAgentModel):
+    """Stochastic Agent based model of SIRS, with array-backed persons.
 
-            ##### Simulation steps #####
-            random.setstate(self.simulation_random_state)
-            for step in self.steps:
-                step(sim_time)
-            self.simulation_random_state = random.getstate()
+    The simulation is identical to :class:`SIRSAgentModel`, but rather
+    than creating one :class:`Person` object per agent, the state of all
+    persons is stored in the NumPy arrays of a
+    :class:`simsurveillance.ArrayPopulation`. This makes it possible to
+    create and hold populations of millions of agents. The same steps and
+    observers are used, accessing persons through
+    :class:`simsurveillance.AgentView` objects.
 
-            while len(self.transitions[sim_time]) > 0:
-                self.infection_progression_step(sim_time)
+    Attributes
+    ----------
+    population : simsurveillance.ArrayPopulation
+        Arrays holding the state of every person.
+    """
+    def _create_persons(self, N):
+        self.population = se.ArrayPopulation(self, N, self.event_log)
+        self.persons = self.population.persons
+        self.all_persons = self.population.all_persons
 
-        return pandas.DataFrame(output)
+    def update_statuses(self, persons, new_status, time):
+        self.population.update_status_many(
+            [person.agent_id for person in persons], new_status, time)
+
+    def schedule_transition(self, person, time):
+        super().schedule_transition(person, time)
+        self.population.next_transition[person.agent_id] = time
+
+    def schedule_transitions(self, persons, times):
+        super().schedule_transitions(persons, times)
+        self.population.next_transition[
+            [person.agent_id for person in persons]] = times
+
+
+class HybridSIRSModel(SIRSArrayAgentModel):
+    """Stochastic model of SIRS, switching between individual persons and
+    compartments according to the number of infected persons.
+
+    While few persons are infected, as during the introduction or the fade
+    out of an epidemic, the model is simulated exactly as
+    :class:`SIRSArrayAgentModel`, with the recovery and waning of each
+    person scheduled individually. Once the number infected reaches a
+    threshold, the transmission and infection progression steps are
+    replaced by a :class:`simsurveillance.CompartmentStep`, which advances
+    the number of persons of each status by a binomial leap, or the
+    differential equation model, and moves randomly chosen persons to
+    match. When the number infected drops below a lower threshold, the
+    individual transitions of all infected and recovered persons are
+    scheduled again, and the agent based steps resume.
+
+    The delays of the agent based model are geometric beyond the time step
+    of each status change, so no information is lost by forgetting the
+    scheduled transitions, and drawing them afresh, when switching. With the
+    'tau' method, the model therefore has the same distribution as the
+    agent based model throughout.
+
+    The persons stay in the array-backed population in both
+    representations, and status changes are recorded in the incidence index
+    and event log, so the same observers stay attached throughout.
+
+    Attributes
+    ----------
+    threshold : int
+        Number of infected persons at which the model switches to
+        compartments
+    lower_threshold : int
+        Number of infected persons below which the model switches back to
+        individual persons
+    representation : str
+        'agents' or 'compartments', the representation of the next time
+        step to simulate
+    switches : list of tuple
+        Time step from which each representation applies, and the
+        representation, starting with (0, 'agents').
+    compartment_step : simsurveillance.CompartmentStep
+        Step simulating the compartments
+    """
+    def __init__(self, N, threshold=1000, lower_threshold=None, method='tau',
+                 seed=1234, record_events=True):
+        """Create a new hybrid SIRS model.
+
+        Parameters
+        ----------
+        N : int
+            Total number of persons to simulate.
+        threshold : int, optional (1000)
+            Number of infected persons at which to switch to compartments
+        lower_threshold : int, optional (None)
+            Number of infected persons below which to switch back to
+            individual persons. By default, half the threshold, so that the
+            model does not switch back and forth at every time step.
+        method : str, optional ('tau')
+            'tau' for binomial leaps of the compartments, or 'ode' for the
+            flows of the differential equation model
+        seed : int, optional (1234)
+            Random seed
+        record_events : bool, optional (True)
+            Whether to record the status changes of all persons in an
+            event log.
+        """
+        super().__init__(N, seed, record_events)
+
+        if lower_threshold is None:
+            lower_threshold = threshold // 2
+        if lower_threshold > threshold:
+            raise ValueError('The lower threshold must not be above the '
+                             'threshold.')
+        self.threshold = threshold
+        self.lower_threshold = lower_threshold
+
+        self.compartment_step = se.CompartmentStep(self, method)
+        self.switch_step = se.RepresentationSwitchStep(self)
+        self._agent_steps = self.steps + [self.switch_step]
+        self._compartment_steps = [self.compartment_step, self.switch_step]
+
+        self.representation = 'agents'
+        self.steps = self._agent_steps
+        self.switches = [(0, 'agents')]
+
+    def switch_representation(self, representation, time):
+        """Switch between individual persons and compartments.
+
+        Parameters
+        ----------
+        representation : str
+            'agents' or 'compartments'
+        time : int
+            Time step from which the new representation applies
+        """
+        if representation == self.representation:
+            return
+
+        if representation == 'compartments':
+            self.transitions = se.EventScheduler()
+            self.population.next_transition[:] = -1
+            self.steps = self._compartment_steps
+
+        elif representation == 'agents':
+            for status, rate in [
+                    (InfStatus.INFECTED, self.params.recovery_rate),
+                    (InfStatus.RECOVERED, self.params.waning_rate)]:
+                persons = list(self.persons[status])
+                delays = self.rng.geometric(-np.expm1(-rate), len(persons))
+                self.schedule_transitions(persons, time + delays - 1)
+            self.steps = self._agent_steps
+
+        else:
+            raise ValueError('Unknown representation {}'.format(
+                representation))
+
+        self.representation = representation
+        self.switches.append((time, representation))
+
+    def reseed(self, seed):
+        super().reseed(seed)
+
+        # The steps of the other representation are reseeded as well
+        for step in self._agent_steps + self._compartment_steps:
+            if step not in self.steps:
+                step.rng = self.spawn_rng()
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    """Pause the garbage collector, whose passes over the many objects of a
+    model being serialised or restored otherwise dominate the cost.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
@@ -15,16 +15,20 @@ class Person:
         Model to which this person is attached
     symptoms : bool
         Whether or not they have symptoms
-    transition_history : dict
-        Keys are simulation time steps, and values are which status they
-        switched too at that time. Their initial status is indicated as
-        time -1.
+    agent_id : int or None
+        Index of this person in the model, under which their status changes
+        are recorded in the event log of the model.
+    last_transition_time : int
+        Time step of their most recent status change, or -1 if they are
+        still in their initial status. The full history is kept by the
+        model, see :class:`simsurveillance.EventLog`.
     """
-    def __init__(self, model):
+    def __init__(self, model, agent_id=None):
         self.status = InfectionStatus.SUSCEPTIBLE
         self.model = model
         self.symptoms = False
-        self.transition_history = {-1: InfectionStatus.SUSCEPTIBLE}
+        self.agent_id = agent_id
+        self.last_transition_time = -1
 
     def update_status(self, new_status, time):
         """Change my infection status.
@@ -37,4 +41,86 @@ class Person:
         self.model.persons[self.status].remove_person(self)
         self.model.persons[new_status].add_person(self)
         self.status = new_status
-        self.transition_history[time] = new_status
+        self.last_transition_time = time
+
+        if self.model.event_log is not None:
+            self.model.event_log.record(self.agent_id, new_status, time)
+
+    def __getstate__(self):
+        # A tuple rather than the attribute dict keeps model snapshots of
+        # many persons small and quick to restore.
+        return (self.status, self.model, self.symptoms, self.agent_id,
+                self.last_transition_time)
+
+    def __setstate__(self, state):
+        self.status, self.model, self.symptoms, self.agent_id, \
+            self.last_transition_time = state
+
+
+class AgentView:
+    """Individual person stored in an array-backed population.
+
+    A lightweight view of one row of a
+    :class:`simsurveillance.ArrayPopulation`, offering the same interface as
+    :class:`Person`. Views hold no state of their own, so any number of them
+    may be created for the same agent, and they compare equal.
+
+    Attributes
+    ----------
+    population : simsurveillance.ArrayPopulation
+        Population holding the state of this person
+    agent_id : int
+        Index of this person in the population arrays
+    """
+    __slots__ = ('population', 'agent_id')
+
+    def __init__(self, population, agent_id):
+        self.population = population
+        self.agent_id = agent_id
+
+    @property
+    def model(self):
+        """Model to which this person is attached.
+        """
+        return self.population.model
+
+    @property
+    def status(self):
+        """Current infection status.
+        """
+        return InfectionStatus(self.population.status[self.agent_id])
+
+    @property
+    def symptoms(self):
+        """Whether or not they have symptoms.
+        """
+        return bool(self.population.symptoms[self.agent_id])
+
+    @symptoms.setter
+    def symptoms(self, value):
+        self.population.symptoms[self.agent_id] = value
+
+    @property
+    def last_transition_time(self):
+        """Time step of their most recent status change, or -1 if they are
+        still in their initial status.
+        """
+        return int(self.population.last_transition[self.agent_id])
+
+    def update_status(self, new_status, time):
+        """Change my infection status.
+
+        Parameters
+        ----------
+        new_status : simsurvey.InfectionStatus
+            New status to switch to
+        """
+        self.population.update_status(self.agent_id, new_status, time)
+
+    def __eq__(self, other):
+        return isinstance(other, AgentView) and \
+            self.agent_id == other.agent_id and \
+            self.population is other.population
+
+    def __hash__(self):
+        return hash(self.agent_id)
@@ -1,7 +1,7 @@
 """Data structure for holding persons.
 """
 
-import random
+import numpy as np
 
 
 class PersonCollection:
@@ -13,12 +13,23 @@ class PersonCollection:
 
     See https://stackoverflow.com/questions/15993447/python-data-structure-for-efficient-add-remove-and-random-choice  # noqa
     for discussion.
+
+    Batches of persons can be added, removed, or moved to another collection
+    at once, with a cost proportional to the size of the batch rather than
+    the size of the collection. Removing a batch fills the gaps it leaves
+    with the remaining persons from the end of the collection, in order.
+
+    Random selections draw from the generator they are given, usually that
+    of a model step or observer. Without one, they draw from a generator of
+    the collection, created on first use with a fixed seed, so that they
+    remain reproducible.
     """
     def __init__(self):
         """Initialize an empty collection.
         """
         self.persons = []
         self.persons_map = dict()
+        self._default_rng = None
 
     def add_person(self, person):
         """Add a person to this collection.
@@ -51,28 +62,116 @@ class PersonCollection:
         self.persons[map_location] = last_person
         self.persons_map[last_person] = map_location
 
-    def random_people(self, num):
+    def add_many(self, persons):
+        """Add many persons to this collection.
+
+        Persons already in the collection are ignored.
+
+        Parameters
+        ----------
+        persons : iterable of simsurveillance.Person
+            Persons to be added
+        """
+        new_persons = [person for person in dict.fromkeys(persons)
+                       if person not in self.persons_map]
+        start = len(self.persons)
+        self.persons.extend(new_persons)
+        self.persons_map.update(
+            zip(new_persons, range(start, start + len(new_persons))))
+
+    def remove_many(self, persons):
+        """Remove many persons from this collection.
+
+        Parameters
+        ----------
+        persons : iterable of simsurveillance.Person
+            Distinct persons to be removed
+        """
+        persons = list(persons)
+        locations = [self.persons_map[person] for person in persons]
+        for person in persons:
+            del self.persons_map[person]
+
+        # Fill the gaps below the new end with the persons remaining above it
+        new_size = len(self.persons) - len(persons)
+        gaps = [i for i in locations if i < new_size]
+        gaps.sort()
+        remaining = [person for person in self.persons[new_size:]
+                     if person in self.persons_map]
+
+        for i, person in zip(gaps, remaining):
+            self.persons[i] = person
+        self.persons_map.update(zip(remaining, gaps))
+        del self.persons[new_size:]
+
+    def move_many(self, persons, destination):
+        """Move many persons from this collection to another.
+
+        Parameters
+        ----------
+        persons : iterable of simsurveillance.Person
+            Distinct persons to be moved
+        destination : simsurveillance.PersonCollection
+            Collection to which they are added
+        """
+        persons = list(persons)
+        self.remove_many(persons)
+        destination.add_many(persons)
+
+    def sample_and_pop(self, num, rng=None):
+        """Select people at random, without replacement, and remove them
+        from the collection.
+
+        Parameters
+        ----------
+        num : int
+            Number to randomly sample
+        rng : numpy.random.Generator, optional (None)
+            Random generator to use, usually that of the model step or
+            observer. By default, the generator of the collection.
+
+        Returns
+        -------
+        list
+            List of people who happened to be chosen
+        """
+        persons = self.random_people(num, rng)
+        self.remove_many(persons)
+        return persons
+
+    def random_people(self, num, rng=None):
         """Select people, at random, without replacement from the collection.
 
         Parameters
         ----------
         num : int
             Number to randomly sample
+        rng : numpy.random.Generator, optional (None)
+            Random generator to use, usually that of the model step or
+            observer. By default, the generator of the collection.
 
         Returns
         -------
         list
             List of people who happened to be chosen
         """
-        return random.sample(self.persons, num)
+        rng = _generator(self, rng)
+        return [self.persons[i]
+                for i in rng.choice(len(self.persons), num, replace=False)]
 
-    def shuffle(self):
+    def shuffle(self, rng=None):
         """Randomize the order of persons in this collection.
+
+        Parameters
+        ----------
+        rng : numpy.random.Generator, optional (None)
+            Random generator to use, usually that of the model step or
+            observer. By default, the generator of the collection.
         """
         new_persons = []
         new_persons_map = dict()
 
-        random.shuffle(self.persons)
+        _generator(self, rng).shuffle(self.persons)
         for person in self.persons:
             new_persons.append(person)
             new_persons_map[person] = len(new_persons) - 1
@@ -91,3 +190,254 @@ class PersonCollection:
 
     def __getitem__(self, i):
         return self.persons[i]
+
+
+class ArrayPersonCollection:
+    """A collection of persons of an array-backed population.
+
+    It offers the same interface as :class:`PersonCollection`, but stores
+    integer agent ids in a NumPy array, with the index of each agent in a
+    second array in place of the dictionary. Persons are returned as
+    :class:`simsurveillance.AgentView` objects.
+
+    As for :class:`PersonCollection`, random selections without a given
+    generator draw from a generator of the collection.
+    """
+    def __init__(self, population, agent_ids=()):
+        """Initialize a collection.
+
+        Parameters
+        ----------
+        population : simsurveillance.ArrayPopulation
+            Population whose persons are held in this collection
+        agent_ids : sequence of int, optional (())
+            Ids of the persons initially in the collection
+        """
+        self.population = population
+        self._default_rng = None
+
+        capacity = population.N
+        self.agent_ids = np.empty(capacity, dtype=population.id_dtype)
+        self.positions = np.full(capacity, -1, dtype=population.id_dtype)
+
+        agent_ids = np.asarray(agent_ids, dtype=population.id_dtype)
+        self.size = len(agent_ids)
+        self.agent_ids[:self.size] = agent_ids
+        self.positions[agent_ids] = np.arange(self.size)
+
+    def add_person(self, person):
+        """Add a person to this collection.
+
+        Parameters
+        ----------
+        person : simsurveillance.AgentView
+            Person to be added
+        """
+        self._add_id(person.agent_id)
+
+    def remove_person(self, person):
+        """Remove a person from this collection.
+
+        Parameters
+        ----------
+        person : simsurveillance.AgentView
+            Person to be removed
+        """
+        self._remove_id(person.agent_id)
+
+    def add_many(self, persons):
+        """Add many persons to this collection.
+
+        Persons already in the collection are ignored.
+
+        Parameters
+        ----------
+        persons : iterable of simsurveillance.AgentView
+            Persons to be added
+        """
+        self._add_ids(_agent_ids(persons))
+
+    def remove_many(self, persons):
+        """Remove many persons from this collection.
+
+        Parameters
+        ----------
+        persons : iterable of simsurveillance.AgentView
+            Distinct persons to be removed
+        """
+        self._remove_ids(_agent_ids(persons))
+
+    def move_many(self, persons, destination):
+        """Move many persons from this collection to another.
+
+        Parameters
+        ----------
+        persons : iterable of simsurveillance.AgentView
+            Distinct persons to be moved
+        destination : simsurveillance.ArrayPersonCollection
+            Collection of the same population to which they are added
+        """
+        agent_ids = _agent_ids(persons)
+        self._remove_ids(agent_ids)
+        destination._add_ids(agent_ids)
+
+    def sample_and_pop(self, num, rng=None):
+        """Select people at random, without replacement, and remove them
+        from the collection.
+
+        Parameters
+        ----------
+        num : int
+            Number to randomly sample
+        rng : numpy.random.Generator, optional (None)
+            Random generator to use, usually that of the model step or
+            observer. By default, the generator of the collection.
+
+        Returns
+        -------
+        list
+            List of people who happened to be chosen
+        """
+        agent_ids = self.random_agent_ids(num, rng)
+        self._remove_ids(agent_ids)
+        return [self.population.person(i) for i in agent_ids.tolist()]
+
+    def _add_id(self, agent_id):
+        if self.positions[agent_id] < 0:
+            self.agent_ids[self.size] = agent_id
+            self.positions[agent_id] = self.size
+            self.size += 1
+
+    def _remove_id(self, agent_id):
+        map_location = self.positions[agent_id]
+        if map_location < 0:
+            raise KeyError(agent_id)
+        self.positions[agent_id] = -1
+        self.size -= 1
+
+        # As in PersonCollection, slot the last person into the gap
+        if map_location == self.size:
+            return
+        last_id = self.agent_ids[self.size]
+        self.agent_ids[map_location] = last_id
+        self.positions[last_id] = map_location
+
+    def _add_ids(self, agent_ids):
+        agent_ids = np.asarray(agent_ids, dtype=self.agent_ids.dtype)
+        agent_ids = agent_ids[self.positions[agent_ids] < 0]
+        _, first = np.unique(agent_ids, return_index=True)
+        if len(first) < len(agent_ids):
+            agent_ids = agent_ids[np.sort(first)]
+
+        new_size = self.size + len(agent_ids)
+        self.agent_ids[self.size:new_size] = agent_ids
+        self.positions[agent_ids] = np.arange(self.size, new_size)
+        self.size = new_size
+
+    def _remove_ids(self, agent_ids):
+        agent_ids = np.asarray(agent_ids, dtype=self.agent_ids.dtype)
+        locations = self.positions[agent_ids]
+        if np.any(locations < 0):
+            raise KeyError(int(agent_ids[np.argmax(locations < 0)]))
+        self.positions[agent_ids] = -1
+
+        # As in PersonCollection.remove_many, fill the gaps below the new end
+        # with the persons remaining above it
+        new_size = self.size - len(agent_ids)
+        gaps = np.sort(locations[locations < new_size])
+        tail = self.agent_ids[new_size:self.size]
+        remaining = tail[self.positions[tail] >= 0]
+
+        self.agent_ids[gaps] = remaining
+        self.positions[remaining] = gaps
+        self.size = new_size
+
+    def random_people(self, num, rng=None):
+        """Select people, at random, without replacement from the collection.
+
+        Parameters
+        ----------
+        num : int
+            Number to randomly sample
+        rng : numpy.random.Generator, optional (None)
+            Random generator to use, usually that of the model step or
+            observer. By default, the generator of the collection.
+
+        Returns
+        -------
+        list
+            List of people who happened to be chosen
+        """
+        return [self.population.person(i)
+                for i in self.random_agent_ids(num, rng).tolist()]
+
+    def random_agent_ids(self, num, rng=None):
+        """Select agent ids, at random, without replacement from the
+        collection.
+
+        Parameters
+        ----------
+        num : int
+            Number to randomly sample
+        rng : numpy.random.Generator, optional (None)
+            Random generator to use, usually that of the model step or
+            observer. By default, the generator of the collection.
+
+        Returns
+        -------
+        numpy.ndarray
+            Agent ids of the people who happened to be chosen
+        """
+        rng = _generator(self, rng)
+        return self.agent_ids[rng.choice(self.size, num, replace=False)]
+
+    def shuffle(self, rng=None):
+        """Randomize the order of persons in this collection.
+
+        Parameters
+        ----------
+        rng : numpy.random.Generator, optional (None)
+            Random generator to use, usually that of the model step or
+            observer. By default, the generator of the collection.
+        """
+        _generator(self, rng).shuffle(self.agent_ids[:self.size])
+        self.positions[self.agent_ids[:self.size]] = np.arange(self.size)
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self[i]
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, person):
+        return self.positions[person.agent_id] >= 0
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError('collection index out of range')
+        return self.population.person(int(self.agent_ids[i]))
+
+
+def _agent_ids(persons):
+    """Get the agent ids of array-backed persons.
+    """
+    return np.fromiter((person.agent_id for person in persons),
+                       dtype=np.int64)
+
+
+def _generator(collection, rng):
+    """Get the given random generator, or else the default generator of a
+    collection, created on first use.
+    """
+    if rng is not None:
+        return rng
+    if collection._default_rng is None:
+        collection._default_rng = np.random.default_rng(_DEFAULT_SEED)
+    return collection._default_rng
+
+
+# Seed of the generators of the collections used without one
+_DEFAULT_SEED = 1234
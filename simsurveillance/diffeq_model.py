@@ -1,16 +1,41 @@
 """Differential equation models of epidemic simulation.
 """
 
+import collections
 import numpy as np
 import pandas
 import pints
 import scipy.integrate
 
 
-class SIRSModel(pints.ForwardModel):
+class SIRSModel(pints.ForwardModelS1):
     """SIRS Differential equation model.
+
+    The model has two outputs, the prevalence and the incidence since the
+    previous time point, and three parameters, the transmission, recovery
+    and waning rates.
+
+    :meth:`simulate` returns the outputs straight from the solver arrays, as
+    it is called many times during inference. The full solution of the most
+    recent simulation is available as a DataFrame from :attr:`output_df`,
+    which is only built when requested, and its final state from
+    :attr:`final_state`.
+
+    :meth:`simulateS1` also returns the sensitivities of both outputs to the
+    parameters, computed by integrating the forward sensitivity equations
+    alongside the model, so that gradient-based samplers and optimisers can
+    be used. The analytic Jacobian is passed to the implicit solvers
+    ('Radau', 'BDF' and 'LSODA'), which may be selected for stiff regimes,
+    such as fast recovery relative to waning.
+
+    Optionally, the solutions of :meth:`simulate` are kept in a bounded
+    least recently used cache (see :meth:`set_cache_size`). Each entry holds
+    the dense output of the solver, so that a repeated call with the same
+    parameters, initial condition and starting time, even with different
+    time points, is served without integrating again.
     """
-    def __init__(self, init_condition=[1.0, 0.0, 0.0], N=None):
+    def __init__(self, init_condition=[1.0, 0.0, 0.0], N=None,
+                 method='RK45', cache_size=0):
         """
         Parameters
         ----------
@@ -20,11 +45,26 @@ class SIRSModel(pints.ForwardModel):
         N : int, optional (None)
             Population size. If equal to None or 1, just simulate
             proportions in each compartment.
+        method : str, optional ('RK45')
+            Integration method of scipy.integrate.solve_ivp.
+        cache_size : int, optional (0)
+            Maximum number of solutions to cache. By default, nothing is
+            cached.
         """
         super().__init__()
 
         self.set_init_condition(init_condition)
         self.set_population_size(N or 1)
+        self.set_method(method)
+
+        self._cache = collections.OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self.set_cache_size(cache_size)
+
+        self._output_times = None
+        self._output = None
+        self._output_df = None
 
     def set_population_size(self, N):
         """Set population size.
@@ -44,49 +84,433 @@ class SIRSModel(pints.ForwardModel):
         """
         self._init_condition = init_condition
 
+    def set_method(self, method):
+        """Set the integration method.
+
+        Parameters
+        ----------
+        method : str
+            Integration method of scipy.integrate.solve_ivp, such as 'RK45',
+            or 'Radau', 'BDF' or 'LSODA' for stiff problems, which make use
+            of the analytic Jacobian.
+        """
+        if method not in _SOLVER_METHODS:
+            raise ValueError('Unknown integration method {}'.format(method))
+        self._method = method
+
+    def set_cache_size(self, cache_size):
+        """Set the maximum number of cached solutions.
+
+        The population size is applied to the outputs after integration,
+        so solutions are shared between population sizes.
+
+        Parameters
+        ----------
+        cache_size : int
+            Maximum number of solutions to cache, or 0 to switch the cache
+            off.
+        """
+        self._cache_size = max(int(cache_size), 0)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def cache_info(self):
+        """Report the statistics of the solution cache.
+
+        Returns
+        -------
+        SolutionCacheInfo
+            Named tuple of hits, misses, maxsize and currsize, as for
+            functools.lru_cache
+        """
+        return SolutionCacheInfo(self._cache_hits, self._cache_misses,
+                                 self._cache_size, len(self._cache))
+
+    def clear_cache(self):
+        """Remove all cached solutions, and reset the statistics.
+        """
+        self._cache.clear()
+        self._cache_hits = 0
+        self._cache_misses = 0
+
     def n_parameters(self):
         return 3
 
+    def n_outputs(self):
+        return 2
+
+    def _solve(self, fun, jac, y0, times, dense_output=False):
+        """Integrate a system from the first to the last time point.
+        """
+        kwargs = dict()
+        if self._method in _IMPLICIT_METHODS:
+            kwargs['jac'] = jac
+
+        return scipy.integrate.solve_ivp(
+            fun,
+            (min(times), max(times)),
+            y0,
+            method=self._method,
+            t_eval=None if dense_output else times,
+            dense_output=dense_output,
+            rtol=1e-6,
+            atol=1e-6,
+            **kwargs
+        )
+
+    def _cached_solution(self, parameters, times, integrate):
+        """Evaluate the cached solution for the parameters at the times,
+        integrating and caching it first if needed.
+        """
+        key = (tuple(float(p) for p in parameters),
+               tuple(float(x) for x in self._init_condition),
+               float(min(times)), self._method)
+        end_time = max(times)
+
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] >= end_time:
+            self._cache_hits += 1
+            self._cache.move_to_end(key)
+            return entry[1](times)
+
+        self._cache_misses += 1
+        solution = integrate(times).sol
+        self._cache[key] = (end_time, solution)
+        self._cache.move_to_end(key)
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return solution(times)
+
     def simulate(self, parameters, times):
         transmission_rate, recovery_rate, waning_rate = parameters
 
         def rhs(t, y):
             S, I, R, _ = y
-            dSdt = -transmission_rate * S * I + waning_rate * R
-            dIdt = transmission_rate * S * I - recovery_rate * I
-            dRdt = recovery_rate * I - waning_rate * R
             dinfectionsdt = transmission_rate * S * I
+            dSdt = -dinfectionsdt + waning_rate * R
+            dIdt = dinfectionsdt - recovery_rate * I
+            dRdt = recovery_rate * I - waning_rate * R
             return [dSdt, dIdt, dRdt, dinfectionsdt]
 
-        t_span = (min(times), max(times))
+        def jac(t, y):
+            return _jacobian(y, transmission_rate, recovery_rate, waning_rate)
 
-        y0 = self._init_condition + [0.0]
+        y0 = list(self._init_condition) + [0.0]
 
-        simulation = scipy.integrate.solve_ivp(
-            rhs,
-            t_span,
-            y0,
-            method='RK45',
-            t_eval=times,
-            rtol=1e-6,
-            atol=1e-6
-        )
+        if self._cache_size:
+            output = self._cached_solution(
+                parameters, times,
+                lambda times: self._solve(rhs, jac, y0, times, True))
+            output = np.asarray(output).T * self._N
+        else:
+            simulation = self._solve(rhs, jac, y0, times)
+            output = simulation.y.T * self._N
 
-        output = simulation.y.T * self._N
+        self._output_times = times
+        self._output = output
+        self._output_df = None
 
-        df = pandas.DataFrame(
-            {'time': times,
-             'S': output[:, 0],
-             'I': output[:, 1],
-             'R': output[:, 2],
-             'infections': output[:, 3],
-             }
-        )
-        self.output_df = df
+        # Prevalence, and the incidence since the previous time point
+        incidence = np.diff(output[:, 3], prepend=output[0, 3])
+        return np.column_stack((output[:, 1] / self._N, incidence))
+
+    def simulateS1(self, parameters, times):
+        """Simulate the model, and its sensitivities to the parameters.
+
+        Parameters
+        ----------
+        parameters : list
+            Transmission, recovery and waning rates
+        times : list
+            Time points at which to evaluate outputs.
+
+        Returns
+        -------
+        numpy.ndarray
+            Prevalence and incidence at each time, of shape (n_times, 2)
+        numpy.ndarray
+            Derivatives of the outputs with respect to the parameters, of
+            shape (n_times, 2, 3)
+        """
+        transmission_rate, recovery_rate, waning_rate = parameters
+
+        # The state is followed by its derivative with respect to each
+        # parameter, stored as a (4, 3) matrix.
+        def rhs(t, z):
+            y = z[:4]
+            sensitivities = z[4:].reshape(4, 3)
+            jacobian = _jacobian(
+                y, transmission_rate, recovery_rate, waning_rate)
+            dsdt = jacobian @ sensitivities + _parameter_jacobian(y)
+            return np.concatenate((
+                _rhs(y, transmission_rate, recovery_rate, waning_rate),
+                dsdt.ravel()))
+
+        def jac(t, z):
+            return _sensitivity_jacobian(
+                z, transmission_rate, recovery_rate, waning_rate)
+
+        z0 = np.zeros(16)
+        z0[:3] = self._init_condition
+
+        simulation = self._solve(rhs, jac, z0, times)
+
+        output = simulation.y[:4].T * self._N
+        self._output_times = times
+        self._output = output
+        self._output_df = None
+
+        sensitivities = simulation.y[4:].T.reshape(-1, 4, 3)
+
+        y = np.column_stack((
+            output[:, 1] / self._N,
+            np.diff(output[:, 3], prepend=output[0, 3])))
+        dy = np.stack((
+            sensitivities[:, 1],
+            np.diff(sensitivities[:, 3] * self._N, axis=0,
+                    prepend=sensitivities[:1, 3] * self._N)), axis=1)
+
+        return y, dy
+
+    def simulate_batch(self, parameters, times):
+        """Simulate the model for many parameter vectors at once.
+
+        All the systems are integrated together, as one state vectorized
+        over the batch, with the Dormand-Prince 5(4) method. Each system
+        takes its own adaptive steps, under the same tolerances as
+        :meth:`simulate`, and lands exactly on every time point. The initial
+        condition and population size of the model are used for all of
+        them, and :attr:`output_df` is not updated.
+
+        Parameters
+        ----------
+        parameters : numpy.ndarray
+            Transmission, recovery and waning rates of each simulation, of
+            shape (n_batch, 3)
+        times : list
+            Increasing time points at which to evaluate outputs.
+
+        Returns
+        -------
+        numpy.ndarray
+            Prevalence and incidence at each time of each simulation, of
+            shape (n_batch, n_times, 2)
+        """
+        parameters = np.atleast_2d(np.asarray(parameters, dtype=float))
+        times = np.asarray(times, dtype=float)
+
+        y0 = np.zeros((len(parameters), 4))
+        y0[:, :3] = self._init_condition
+
+        output = _integrate_batch(
+            parameters, y0, times, rtol=1e-6, atol=1e-6) * self._N
+
+        incidence = np.diff(output[:, :, 3], axis=1,
+                            prepend=output[:, :1, 3])
+        return np.stack((output[:, :, 1] / self._N, incidence), axis=2)
+
+    @property
+    def output_df(self):
+        """Solution of the most recent simulation, as a DataFrame with
+        columns time, S, I, R and (cumulative) infections.
+        """
+        if self._output_df is None and self._output is not None:
+            output = self._output
+            self._output_df = pandas.DataFrame(
+                {'time': self._output_times,
+                 'S': output[:, 0],
+                 'I': output[:, 1],
+                 'R': output[:, 2],
+                 'infections': output[:, 3],
+                 }
+            )
+        return self._output_df
+
+    @property
+    def final_state(self):
+        """Numbers in S, I and R at the last time point of the most recent
+        simulation, read straight from the solver arrays.
+        """
+        if self._output is None:
+            return None
+        return self._output[-1, :3]
+
+
+SolutionCacheInfo = collections.namedtuple(
+    'SolutionCacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+_SOLVER_METHODS = ('RK45', 'RK23', 'DOP853', 'Radau', 'BDF', 'LSODA')
+_IMPLICIT_METHODS = ('Radau', 'BDF', 'LSODA')
+
+# Change of (S, I, R, infections) caused by one infection, one recovery and
+# one waning
+_INFECTION = np.array([-1.0, 1.0, 0.0, 1.0])
+_RECOVERY = np.array([0.0, -1.0, 1.0, 0.0])
+_WANING = np.array([1.0, 0.0, -1.0, 0.0])
+
+
+def _rhs(y, transmission_rate, recovery_rate, waning_rate):
+    """Right hand side of the SIRS equations, with cumulative infections.
+    """
+    S, I, R, _ = y
+    return transmission_rate * S * I * _INFECTION \
+        + recovery_rate * I * _RECOVERY + waning_rate * R * _WANING
+
+
+def _jacobian(y, transmission_rate, recovery_rate, waning_rate):
+    """Jacobian of the right hand side with respect to (S, I, R,
+    infections).
+    """
+    S, I, R, _ = y
+    jacobian = np.zeros((4, 4))
+    jacobian[:, 0] = transmission_rate * I * _INFECTION
+    jacobian[:, 1] = transmission_rate * S * _INFECTION \
+        + recovery_rate * _RECOVERY
+    jacobian[:, 2] = waning_rate * _WANING
+    return jacobian
+
+
+def _parameter_jacobian(y):
+    """Jacobian of the right hand side with respect to the transmission,
+    recovery and waning rates.
+    """
+    S, I, R, _ = y
+    return np.column_stack((S * I * _INFECTION, I * _RECOVERY, R * _WANING))
+
+
+def _sensitivity_jacobian(z, transmission_rate, recovery_rate, waning_rate):
+    """Jacobian of the right hand side of the model and its forward
+    sensitivity equations.
+    """
+    y = z[:4]
+    S, I, R, _ = y
+    sensitivities = z[4:].reshape(4, 3)
+    jacobian = _jacobian(y, transmission_rate, recovery_rate, waning_rate)
+
+    full = np.zeros((16, 16))
+    full[:4, :4] = jacobian
+
+    # The sensitivities of each parameter follow the model Jacobian
+    for k in range(3):
+        full[4 + k:16:3, 4 + k:16:3] = jacobian
+
+    # Derivative of the sensitivity equations with respect to the state.
+    # Only the infection term depends on more than one state.
+    for k in range(3):
+        rows = slice(4 + k, 16, 3)
+        full[rows, 0] = transmission_rate * sensitivities[1, k] * _INFECTION
+        full[rows, 1] = transmission_rate * sensitivities[0, k] * _INFECTION
+    full[4:16:3, 0] += I * _INFECTION
+    full[4:16:3, 1] += S * _INFECTION
+    full[5:16:3, 1] += _RECOVERY
+    full[6:16:3, 2] += _WANING
+
+    return full
+
+
+# Dormand-Prince 5(4) coefficients
+_DOPRI_C = np.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1])
+_DOPRI_A = [
+    [],
+    [1 / 5],
+    [3 / 40, 9 / 40],
+    [44 / 45, -56 / 15, 32 / 9],
+    [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+    [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+]
+_DOPRI_B = np.array([35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784,
+                     11 / 84])
+_DOPRI_E = np.array([-71 / 57600, 0, 71 / 16695, -71 / 1920,
+                     17253 / 339200, -22 / 525, 1 / 40])
+
+
+def _rhs_batch(y, parameters):
+    """Right hand side of many SIRS systems, of shape (n_batch, 4).
+    """
+    S, I, R = y[:, 0], y[:, 1], y[:, 2]
+    infection = parameters[:, 0] * S * I
+    recovery = parameters[:, 1] * I
+    waning = parameters[:, 2] * R
+    return np.column_stack((-infection + waning, infection - recovery,
+                            recovery - waning, infection))
+
+
+def _integrate_batch(parameters, y0, times, rtol, atol):
+    """Integrate many SIRS systems with adaptive Dormand-Prince steps.
+
+    Each system has its own step size, which is shortened where needed to
+    land on the next time point.
+
+    Returns
+    -------
+    numpy.ndarray
+        State at each time point, of shape (n_batch, n_times, 4)
+    """
+    n_batch, n_states = y0.shape
+    output = np.empty((n_batch, len(times), n_states))
+    output[:, 0] = y0
+    if len(times) == 1:
+        return output
+
+    y = y0.copy()
+    t = np.full(n_batch, times[0])
+    f = _rhs_batch(y, parameters)
+    next_index = np.ones(n_batch, dtype=int)
+
+    # Initial step, as proposed by Hairer, Norsett and Wanner
+    scale = atol + np.abs(y) * rtol
+    d0 = np.sqrt(np.mean((y / scale) ** 2, axis=1))
+    d1 = np.sqrt(np.mean((f / scale) ** 2, axis=1))
+    h = np.where((d0 < 1e-5) | (d1 < 1e-5), 1e-6,
+                 0.01 * d0 / np.maximum(d1, 1e-300))
+
+    active = np.arange(n_batch)
+    while len(active):
+        params = parameters[active]
+        y_a = y[active]
+        t_a = t[active]
+        target = times[next_index[active]]
+
+        h_a = h[active]
+        landing = h_a >= target - t_a
+        h_a = np.where(landing, target - t_a, h_a)
+
+        if np.any(h_a <= 10 * np.spacing(np.maximum(np.abs(t_a), 1.0))):
+            raise RuntimeError('Required step size is too small.')
+
+        k = np.empty((7, len(active), n_states))
+        k[0] = f[active]
+        for stage in range(1, 6):
+            dy = sum(a * k[j] for j, a in enumerate(_DOPRI_A[stage]))
+            k[stage] = _rhs_batch(y_a + h_a[:, None] * dy, params)
+        y_new = y_a + h_a[:, None] * np.tensordot(_DOPRI_B, k[:6], axes=1)
+        k[6] = _rhs_batch(y_new, params)
+
+        scale = atol + np.maximum(np.abs(y_a), np.abs(y_new)) * rtol
+        error = h_a[:, None] * np.tensordot(_DOPRI_E, k, axes=1) / scale
+        error_norm = np.sqrt(np.mean(error ** 2, axis=1))
+        accepted = error_norm <= 1
+
+        with np.errstate(divide='ignore'):
+            factor = 0.9 * error_norm ** -0.2
+        factor = np.where(accepted, np.clip(factor, 0.2, 10),
+                          np.clip(factor, 0.2, 1))
+        new_h = h_a * factor
+        # Do not let landing on a time point shrink the following steps
+        new_h = np.where(accepted & landing, np.maximum(new_h, h[active]),
+                         new_h)
+        h[active] = new_h
+
+        done = active[accepted]
+        y[done] = y_new[accepted]
+        f[done] = k[6][accepted]
+        t[done] = np.where(landing[accepted], target[accepted],
+                           t_a[accepted] + h_a[accepted])
+
+        landed = done[landing[accepted]]
+        output[landed, next_index[landed]] = y[landed]
+        next_index[landed] += 1
 
-        multi_output = np.asarray([
-            np.asarray(df['I'] / self._N),
-            np.asarray([0] + list(np.diff(df['infections'])))
-        ]).T
+        active = active[next_index[active] < len(times)]
 
-        return multi_output
+    return output
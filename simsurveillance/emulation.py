@@ -0,0 +1,732 @@
+"""Emulators of the summary statistics of simulations, for calibration.
+"""
+
+import collections
+import concurrent.futures
+import numpy as np
+import scipy.linalg
+import scipy.optimize
+import simsurveillance as se
+
+
+class SimulationSummaries:
+    """Summary statistics of the observers of one stochastic simulation.
+
+    Calling the object with a parameter vector and a seed creates a model
+    and observers from the given factories, simulates the model, and
+    returns the statistics of the observers as one vector. By default, the
+    statistics are the columns of the records of each observer given by
+    :func:`simsurveillance.statistic_columns`, concatenated in the order of
+    the observer factories.
+
+    When simulations are run in worker processes, the factories must be
+    picklable, for example functions defined at module level.
+
+    Attributes
+    ----------
+    model_factory : callable
+        Called as ``model_factory(parameters, seed)``, returns a new model
+        with those parameters, ready to simulate.
+    observer_factories : list
+        Callables, each of which is called with the model and returns a new
+        observer.
+    times : list
+        Time points of the simulation
+    statistics : callable
+        Called with the list of observers after the simulation, returns the
+        summary statistics.
+    """
+    def __init__(self, model_factory, observer_factories, times,
+                 statistics=None):
+        """
+        Parameters
+        ----------
+        model_factory : callable
+            Called as ``model_factory(parameters, seed)``, returns a new
+            model with those parameters, ready to simulate.
+        observer_factories : list
+            Callables, each of which is called with the model and returns a
+            new observer.
+        times : list
+            Time points of the simulation
+        statistics : callable, optional (None)
+            Called with the list of observers after the simulation, returns
+            the summary statistics. By default, the records described above.
+        """
+        self.model_factory = model_factory
+        self.observer_factories = list(observer_factories)
+        self.times = times
+        self.statistics = statistics or _observer_statistics
+
+    def __call__(self, parameters, seed):
+        """Simulate the model, and summarise its observations.
+
+        Parameters
+        ----------
+        parameters : list
+            Parameters passed to the model factory
+        seed : int
+            Seed passed to the model factory
+
+        Returns
+        -------
+        numpy.ndarray
+            Summary statistics
+        """
+        model = self.model_factory(parameters, seed)
+        observers = [factory(model) for factory in self.observer_factories]
+        model.add_observers(*observers)
+        model.simulate(self.times)
+        return np.asarray(self.statistics(observers), dtype=float)
+
+
+class ODESummaries:
+    """Expected summary statistics under a differential equation model, as a
+    cheap low-fidelity approximation of :class:`SimulationSummaries`.
+
+    The statistics are, in this order, the expected number of positive tests
+    of a prevalence survey at each survey time, and the expected number of
+    cases found by symptomatic testing at each case time, computed as in
+    :class:`simsurveillance.PrevalenceLogLikelihood` and
+    :class:`simsurveillance.CasesLogLikelihood`. Many parameter vectors are
+    solved together with :meth:`simsurveillance.SIRSModel.simulate_batch`.
+
+    Attributes
+    ----------
+    model : simsurveillance.SIRSModel
+        Model, whose initial condition and population size are those of the
+        stochastic simulations.
+    survey_times : numpy.ndarray
+        Time of each prevalence survey
+    num_tests : numpy.ndarray
+        Number of tests of each prevalence survey
+    case_times : numpy.ndarray
+        Time of each count of cases
+    sensitivity : float
+        Sensitivity of the test of the prevalence survey
+    specificity : float
+        Specificity of the test of the prevalence survey
+    ascertainment : float
+        Fraction of the infections found by symptomatic testing
+    """
+    def __init__(self, model, survey_times=(), num_tests=(), case_times=(),
+                 sensitivity=1.0, specificity=1.0, ascertainment=1.0):
+        """
+        Parameters
+        ----------
+        model : simsurveillance.SIRSModel
+            Model, whose initial condition and population size are those of
+            the stochastic simulations.
+        survey_times : list, optional (())
+            Time of each prevalence survey
+        num_tests : list, optional (())
+            Number of tests of each prevalence survey
+        case_times : list, optional (())
+            Time of each count of cases
+        sensitivity : float, optional (1.0)
+            Sensitivity of the test of the prevalence survey
+        specificity : float, optional (1.0)
+            Specificity of the test of the prevalence survey
+        ascertainment : float, optional (1.0)
+            Fraction of the infections found by symptomatic testing
+        """
+        self.model = model
+        self.survey_times = np.asarray(survey_times, dtype=float)
+        self.num_tests = np.asarray(num_tests, dtype=float)
+        self.case_times = np.asarray(case_times, dtype=float)
+        if self.num_tests.shape != self.survey_times.shape:
+            raise ValueError('One number of tests is required at each survey '
+                             'time.')
+
+        self.sensitivity = sensitivity
+        self.specificity = specificity
+        self.ascertainment = ascertainment
+
+        previous_times = np.maximum(self.case_times - 1, 0)
+        self._model_times = np.union1d(
+            [0], np.concatenate(
+                (self.survey_times, self.case_times, previous_times)))
+        self._survey_index = np.searchsorted(
+            self._model_times, self.survey_times)
+        self._case_index = np.searchsorted(self._model_times, self.case_times)
+        self._previous_index = np.searchsorted(
+            self._model_times, previous_times)
+
+    def __call__(self, parameters):
+        """Compute the expected statistics.
+
+        Parameters
+        ----------
+        parameters : numpy.ndarray
+            Transmission, recovery and waning rates, of shape (3, ), or of
+            shape (n, 3) for many parameter vectors.
+
+        Returns
+        -------
+        numpy.ndarray
+            Statistics of shape (n_statistics, ), or (n, n_statistics)
+        """
+        parameters = np.asarray(parameters, dtype=float)
+        output = self.model.simulate_batch(
+            np.atleast_2d(parameters), self._model_times)
+
+        prevalence = output[:, self._survey_index, 0]
+        num_positive = self.num_tests * (
+            self.sensitivity * prevalence
+            + (1 - self.specificity) * (1 - prevalence))
+
+        cumulative = np.cumsum(output[:, :, 1], axis=1)
+        cases = self.ascertainment * (
+            cumulative[:, self._case_index]
+            - cumulative[:, self._previous_index])
+
+        statistics = np.concatenate((num_positive, cases), axis=1)
+        if parameters.ndim == 1:
+            return statistics[0]
+        return statistics
+
+
+class GaussianProcessEmulator:
+    """Gaussian process emulator of the statistics of a stochastic
+    simulator.
+
+    Each statistic is modelled as a regression mean plus a Gaussian process
+    with a squared exponential kernel, with one lengthscale per parameter,
+    and a noise term standing for the stochasticity of the simulator. The
+    statistics are standardised, and share the kernel hyperparameters, which
+    are fitted by maximising the summed log marginal likelihood, so that one
+    Cholesky factorisation serves all of them.
+
+    The regression mean is a constant, or, if a low-fidelity model is given
+    (such as :class:`ODESummaries`), a linear function of its statistics at
+    the same parameters, fitted separately for each statistic. The Gaussian
+    process then only has to learn the discrepancy between the two.
+
+    Attributes
+    ----------
+    lower : numpy.ndarray
+        Lower bound of each parameter, used to scale the inputs
+    upper : numpy.ndarray
+        Upper bound of each parameter
+    low_fidelity : callable or None
+        Called with parameters of shape (n, n_parameters), returns their
+        low-fidelity statistics of shape (n, n_statistics).
+    lengthscales : numpy.ndarray
+        Fitted lengthscale of each parameter, relative to its range
+    signal_variance : float
+        Fitted variance of the standardised Gaussian process
+    noise_variance : float
+        Fitted variance of the standardised simulator noise
+    """
+    def __init__(self, lower, upper, low_fidelity=None):
+        """
+        Parameters
+        ----------
+        lower : list
+            Lower bound of each parameter, used to scale the inputs
+        upper : list
+            Upper bound of each parameter
+        low_fidelity : callable, optional (None)
+            Called with parameters of shape (n, n_parameters), returns their
+            low-fidelity statistics of shape (n, n_statistics).
+        """
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        self.low_fidelity = low_fidelity
+
+        self.lengthscales = None
+        self.signal_variance = None
+        self.noise_variance = None
+
+    def _scale(self, parameters):
+        return (np.atleast_2d(parameters) - self.lower) \
+            / (self.upper - self.lower)
+
+    def _regressors(self, parameters):
+        """Design matrices of the regression mean, of shape
+        (n_statistics, n, 1 or 2).
+        """
+        ones = np.ones((len(parameters), 1))
+        if self.low_fidelity is None:
+            return ones[np.newaxis]
+
+        low = np.atleast_2d(self.low_fidelity(parameters))
+        return np.stack(
+            [np.column_stack((ones, column)) for column in low.T])
+
+    def _kernel(self, u, v):
+        squared_distance = np.sum(
+            ((u[:, np.newaxis, :] - v[np.newaxis, :, :])
+             / self.lengthscales) ** 2, axis=2)
+        return self.signal_variance * np.exp(-0.5 * squared_distance)
+
+    def fit(self, parameters, statistics):
+        """Fit the emulator to a design of simulations.
+
+        Parameters
+        ----------
+        parameters : numpy.ndarray
+            Parameters of each simulation, of shape (n, n_parameters)
+        statistics : numpy.ndarray
+            Statistics of each simulation, of shape (n, n_statistics)
+
+        Returns
+        -------
+        simsurveillance.GaussianProcessEmulator
+            The emulator itself
+        """
+        parameters = np.atleast_2d(np.asarray(parameters, dtype=float))
+        statistics = np.asarray(statistics, dtype=float).reshape(
+            len(parameters), -1)
+
+        # Regression mean of each statistic
+        regressors = self._regressors(parameters)
+        if len(regressors) == 1:
+            regressors = np.repeat(regressors, statistics.shape[1], axis=0)
+        self._coefficients = [
+            np.linalg.lstsq(X, y, rcond=None)[0]
+            for X, y in zip(regressors, statistics.T)]
+        residuals = statistics - np.column_stack(
+            [X @ c for X, c in zip(regressors, self._coefficients)])
+
+        self._scales = np.std(residuals, axis=0)
+        self._scales[self._scales <= 0] = 1
+        self._inputs = self._scale(parameters)
+        self._targets = residuals / self._scales
+
+        self._optimise_hyperparameters()
+        return self
+
+    def _negative_log_marginal_likelihood(self, log_hyperparameters):
+        """Negative summed log marginal likelihood of the standardised
+        residuals, and its gradient with respect to the logarithms of the
+        lengthscales, signal variance and noise variance.
+        """
+        num_dims = self._inputs.shape[1]
+        lengthscales = np.exp(log_hyperparameters[:num_dims])
+        signal_variance, noise_variance = \
+            np.exp(log_hyperparameters[num_dims:])
+
+        differences = (self._inputs[:, np.newaxis, :]
+                       - self._inputs[np.newaxis, :, :]) ** 2
+        scaled = differences / lengthscales ** 2
+        K = signal_variance * np.exp(-0.5 * np.sum(scaled, axis=2))
+        n, m = self._targets.shape
+        Ky = K + (noise_variance + _JITTER) * np.eye(n)
+
+        try:
+            cholesky = scipy.linalg.cho_factor(Ky, lower=True)
+        except np.linalg.LinAlgError:
+            return np.inf, np.zeros_like(log_hyperparameters)
+
+        alpha = scipy.linalg.cho_solve(cholesky, self._targets)
+        log_det = 2 * np.sum(np.log(np.diag(cholesky[0])))
+        value = 0.5 * np.sum(self._targets * alpha) + 0.5 * m * log_det \
+            + 0.5 * n * m * np.log(2 * np.pi)
+
+        W = alpha @ alpha.T - m * scipy.linalg.cho_solve(cholesky, np.eye(n))
+        WK = W * K
+        gradient = np.empty_like(log_hyperparameters)
+        gradient[:num_dims] = 0.5 * np.einsum('ij,ijd->d', WK, scaled)
+        gradient[num_dims] = 0.5 * np.sum(WK)
+        gradient[num_dims + 1] = 0.5 * noise_variance * np.trace(W)
+        return value, -gradient
+
+    def _optimise_hyperparameters(self):
+        num_dims = self._inputs.shape[1]
+        bounds = [(np.log(0.01), np.log(100.0))] * num_dims \
+            + [(np.log(1e-3), np.log(100.0)), (np.log(1e-6), np.log(10.0))]
+
+        best = None
+        for lengthscale in (0.2, 0.5, 1.0):
+            x0 = np.concatenate((np.full(num_dims, np.log(lengthscale)),
+                                 [0.0, np.log(0.1)]))
+            result = scipy.optimize.minimize(
+                self._negative_log_marginal_likelihood, x0, jac=True,
+                method='L-BFGS-B', bounds=bounds)
+            if best is None or result.fun < best.fun:
+                best = result
+
+        self.lengthscales = np.exp(best.x[:num_dims])
+        self.signal_variance, self.noise_variance = np.exp(best.x[num_dims:])
+
+        Ky = self._kernel(self._inputs, self._inputs) \
+            + (self.noise_variance + _JITTER) * np.eye(len(self._inputs))
+        self._cholesky = scipy.linalg.cho_factor(Ky, lower=True)
+        self._alpha = scipy.linalg.cho_solve(self._cholesky, self._targets)
+
+    def predict(self, parameters, include_noise=True):
+        """Predict the statistics of the simulator.
+
+        Parameters
+        ----------
+        parameters : numpy.ndarray
+            Parameters, of shape (n, n_parameters)
+        include_noise : bool, optional (True)
+            Whether the variance includes the stochasticity of the
+            simulator, rather than only the uncertainty of its mean.
+
+        Returns
+        -------
+        numpy.ndarray
+            Predictive mean of each statistic, of shape (n, n_statistics)
+        numpy.ndarray
+            Predictive variance of each statistic, of shape
+            (n, n_statistics)
+        """
+        if self.lengthscales is None:
+            raise RuntimeError('The emulator must be fitted first.')
+
+        parameters = np.atleast_2d(np.asarray(parameters, dtype=float))
+        regressors = self._regressors(parameters)
+        if len(regressors) == 1:
+            regressors = np.repeat(regressors, len(self._coefficients), axis=0)
+        regression = np.column_stack(
+            [X @ c for X, c in zip(regressors, self._coefficients)])
+
+        k = self._kernel(self._scale(parameters), self._inputs)
+        mean = regression + (k @ self._alpha) * self._scales
+
+        v = scipy.linalg.solve_triangular(
+            self._cholesky[0], k.T, lower=True)
+        variance = np.maximum(
+            self.signal_variance - np.sum(v ** 2, axis=0), 0)
+        if include_noise:
+            variance = variance + self.noise_variance
+        return mean, variance[:, np.newaxis] * self._scales ** 2
+
+
+HistoryMatchingWave = collections.namedtuple(
+    'HistoryMatchingWave',
+    ['parameters', 'statistics', 'emulator', 'non_implausible_fraction'])
+HistoryMatchingWave.__doc__ = """One wave of :class:`HistoryMatching`.
+
+Attributes
+----------
+parameters : numpy.ndarray
+    Design of the simulations run in the wave
+statistics : numpy.ndarray
+    Statistics of each simulation
+emulator : simsurveillance.GaussianProcessEmulator
+    Emulator fitted in the wave
+non_implausible_fraction : float
+    Fraction of the prior box which is not ruled out after the wave
+"""
+
+
+class HistoryMatching:
+    """Calibration of a stochastic simulator by history matching with
+    Gaussian process emulators.
+
+    In each wave, a design of simulations is run within the part of the
+    prior box which is not yet ruled out, an emulator is fitted to them, and
+    parameters are ruled out wherever the implausibility
+
+    ``max_k |z_k - E[f_k(x)]| / sqrt(Var[f_k(x)] + observation_variance_k)``
+
+    exceeds the threshold, where z are the observed statistics and the
+    variance includes the emulator uncertainty and simulator noise. As the
+    non-implausible region shrinks, the design concentrates where the
+    simulator matches the data, so far fewer simulations are needed than by
+    simulating directly from the prior.
+
+    On top of the final emulator, :meth:`abc` draws approximate posterior
+    samples by rejection ABC, with the simulator replaced by emulator draws.
+
+    The design of the first wave is a Latin hypercube, and later waves draw
+    their design at random from the non-implausible candidates. Candidates
+    are drawn uniformly from a box bounding the non-implausible region of
+    the previous wave, so they are not wasted on the part of the prior box
+    already ruled out. Simulation seeds come from
+    :func:`simsurveillance.spawn_seeds`.
+
+    Attributes
+    ----------
+    simulator : callable
+        Called as ``simulator(parameters, seed)``, returns the statistics of
+        one simulation, such as a :class:`SimulationSummaries`.
+    observed : numpy.ndarray
+        Observed statistics
+    lower : numpy.ndarray
+        Lower bound of each parameter
+    upper : numpy.ndarray
+        Upper bound of each parameter
+    low_fidelity : callable or None
+        Low-fidelity model passed to the emulators
+    threshold : float
+        Implausibility above which parameters are ruled out
+    observation_variance : numpy.ndarray
+        Variance of each observed statistic, beyond the simulator noise
+    waves : list of simsurveillance.HistoryMatchingWave
+        Waves run so far
+    num_simulations : int
+        Number of simulations run so far
+    """
+    def __init__(self, simulator, observed, lower, upper, low_fidelity=None,
+                 threshold=3.0, observation_variance=0.0, seed=1234):
+        """
+        Parameters
+        ----------
+        simulator : callable
+            Called as ``simulator(parameters, seed)``, returns the statistics
+            of one simulation.
+        observed : list
+            Observed statistics
+        lower : list
+            Lower bound of each parameter
+        upper : list
+            Upper bound of each parameter
+        low_fidelity : callable, optional (None)
+            Low-fidelity model passed to the emulators
+        threshold : float, optional (3.0)
+            Implausibility above which parameters are ruled out
+        observation_variance : float or list, optional (0.0)
+            Variance of each observed statistic, beyond the simulator noise
+        seed : int, optional (1234)
+            Seed of the designs and of the simulations
+        """
+        self.simulator = simulator
+        self.observed = np.asarray(observed, dtype=float)
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        self.low_fidelity = low_fidelity
+        self.threshold = threshold
+        self.observation_variance = np.broadcast_to(
+            np.asarray(observation_variance, dtype=float),
+            self.observed.shape)
+
+        self.waves = []
+        self.num_simulations = 0
+
+        self._seed_sequence, rng_seed = \
+            np.random.SeedSequence(seed).spawn(2)
+        self._rng = np.random.default_rng(rng_seed)
+        self._box = (self.lower, self.upper)
+        self._candidates = None
+
+    def _uniform(self, num):
+        lower, upper = self._box
+        return lower + (upper - lower) * self._rng.random((num, len(lower)))
+
+    def _latin_hypercube(self, num):
+        strata = np.column_stack(
+            [self._rng.permutation(num) for _ in self.lower])
+        unit = (strata + self._rng.random(strata.shape)) / num
+        return self.lower + (self.upper - self.lower) * unit
+
+    def implausibility(self, parameters):
+        """Compute the implausibility of parameters under all the waves so
+        far.
+
+        Parameters
+        ----------
+        parameters : numpy.ndarray
+            Parameters, of shape (n, n_parameters)
+
+        Returns
+        -------
+        numpy.ndarray
+            Largest implausibility of each parameter vector over the waves
+            and statistics.
+        """
+        parameters = np.atleast_2d(parameters)
+        implausibility = np.zeros(len(parameters))
+        for wave in self.waves:
+            mean, variance = wave.emulator.predict(parameters)
+            wave_implausibility = np.max(
+                np.abs(self.observed - mean)
+                / np.sqrt(variance + self.observation_variance + _JITTER),
+                axis=1)
+            implausibility = np.maximum(implausibility, wave_implausibility)
+        return implausibility
+
+    def non_implausible(self, num_candidates=10000):
+        """Draw parameters uniformly from the box bounding the region not
+        yet ruled out, keeping those which are not ruled out.
+
+        Parameters
+        ----------
+        num_candidates : int, optional (10000)
+            Number of parameter vectors drawn uniformly from the box
+
+        Returns
+        -------
+        numpy.ndarray
+            Non-implausible parameters amongst the candidates
+        """
+        candidates = self._uniform(num_candidates)
+        return candidates[self.implausibility(candidates) <= self.threshold]
+
+    def _draw_non_implausible(self, required, candidates, num_candidates,
+                              max_draws):
+        """Add to the non-implausible candidates, drawing num_candidates at
+        a time, until there are the required number of them.
+        """
+        candidates = [np.reshape(candidates, (-1, len(self.lower)))]
+        num_found = len(candidates[0])
+        for _ in range(max_draws):
+            if num_found >= required:
+                break
+            candidates.append(self.non_implausible(num_candidates))
+            num_found += len(candidates[-1])
+        return np.concatenate(candidates)[:required]
+
+    def _shrink_box(self, candidates):
+        """Bound the non-implausible candidates by a box, with a margin of
+        a tenth of their range on each side, within the prior box.
+        """
+        lower, upper = candidates.min(axis=0), candidates.max(axis=0)
+        width = np.maximum(upper - lower, 1e-3 * (self.upper - self.lower))
+        margin = 0.1 * width
+        self._box = (np.maximum(lower - margin, self.lower),
+                     np.minimum(upper + margin, self.upper))
+
+    def _simulate(self, parameters, num_workers):
+        seeds = se.spawn_seeds(self._seed_sequence, len(parameters))
+        tasks = [(self.simulator, p, seed)
+                 for p, seed in zip(parameters, seeds)]
+
+        if num_workers == 1:
+            results = [_run_simulation(task) for task in tasks]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(num_workers) as pool:
+                results = list(pool.map(_run_simulation, tasks))
+
+        self.num_simulations += len(parameters)
+        return np.array(results)
+
+    def run(self, num_waves=3, design_size=40, num_candidates=10000,
+            num_workers=1, max_draws=100):
+        """Run waves of history matching.
+
+        Parameters
+        ----------
+        num_waves : int, optional (3)
+            Number of waves to run
+        design_size : int, optional (40)
+            Number of simulations in each wave
+        num_candidates : int, optional (10000)
+            Number of parameter vectors drawn at once, to find the
+            non-implausible region.
+        num_workers : int, optional (1)
+            Number of worker processes running the simulations. If 1, they
+            are run in this process.
+        max_draws : int, optional (100)
+            Largest number of times that candidates are drawn for the design
+            of a wave. If too few are non-implausible, the design is smaller.
+
+        Returns
+        -------
+        numpy.ndarray
+            Non-implausible parameters after the last wave
+        """
+        for _ in range(num_waves):
+            if not self.waves:
+                design = self._latin_hypercube(design_size)
+            else:
+                if len(self._candidates) == 0:
+                    break
+                candidates = self._draw_non_implausible(
+                    design_size, self._candidates, num_candidates, max_draws)
+                design = candidates[self._rng.permutation(
+                    len(candidates))[:design_size]]
+
+            statistics = self._simulate(design, num_workers)
+
+            # Fit to the simulations from the non-implausible region only
+            parameters = np.concatenate(
+                [wave.parameters for wave in self.waves] + [design])
+            all_statistics = np.concatenate(
+                [wave.statistics for wave in self.waves] + [statistics])
+            keep = self.implausibility(parameters) <= self.threshold
+            emulator = GaussianProcessEmulator(
+                self.lower, self.upper, self.low_fidelity).fit(
+                    parameters[keep], all_statistics[keep])
+
+            self.waves.append(HistoryMatchingWave(
+                design, statistics, emulator, None))
+
+            # The region only shrinks from wave to wave, so the candidates
+            # are drawn from the box bounding the previous one.
+            lower, upper = self._box
+            box_fraction = np.prod((upper - lower) / (self.upper - self.lower))
+            self._candidates = self.non_implausible(num_candidates)
+            self.waves[-1] = self.waves[-1]._replace(
+                non_implausible_fraction=box_fraction
+                * len(self._candidates) / num_candidates)
+            if len(self._candidates):
+                self._shrink_box(self._candidates)
+
+        return self._candidates
+
+    def abc(self, num_samples=1000, quantile=0.05, num_candidates=10000,
+            max_draws=100):
+        """Draw approximate posterior samples by rejection ABC on the
+        emulator of the last wave.
+
+        Candidate parameters are drawn uniformly from the non-implausible
+        region, a draw of the statistics of each is taken from the emulator,
+        and the candidates whose draws are closest to the observations, in
+        the Euclidean distance scaled by the spread of the simulated
+        statistics, are accepted. No simulations are run.
+
+        Parameters
+        ----------
+        num_samples : int, optional (1000)
+            Number of samples to accept
+        quantile : float, optional (0.05)
+            Fraction of the non-implausible candidates which is accepted
+        num_candidates : int, optional (10000)
+            Number of parameter vectors drawn at once, which are drawn
+            until there are enough non-implausible ones.
+        max_draws : int, optional (100)
+            Largest number of times that candidates are drawn
+
+        Returns
+        -------
+        numpy.ndarray
+            Accepted parameters, of shape (num_samples, n_parameters), or
+            fewer if too few candidates are non-implausible.
+        """
+        if not self.waves:
+            raise RuntimeError('At least one wave must be run first.')
+
+        required = int(np.ceil(num_samples / quantile))
+        candidates = self._draw_non_implausible(
+            required, [], num_candidates, max_draws)
+
+        mean, variance = self.waves[-1].emulator.predict(candidates)
+        draws = mean + np.sqrt(variance) * self._rng.standard_normal(
+            mean.shape)
+
+        scale = np.std(np.concatenate(
+            [wave.statistics for wave in self.waves]), axis=0)
+        scale[scale <= 0] = 1
+        distance = np.sqrt(np.sum(
+            ((draws - self.observed) / scale) ** 2, axis=1))
+
+        num_accepted = min(num_samples, int(np.ceil(
+            quantile * len(candidates))))
+        return candidates[np.argsort(distance, kind='stable')[:num_accepted]]
+
+
+def _observer_statistics(observers):
+    """Default summary statistics of the records of observers.
+    """
+    statistics = []
+    for observer in observers:
+        records = observer.records()
+        columns = se.statistic_columns(records)
+        statistics.append(records[columns].to_numpy(dtype=float).ravel('F'))
+    return np.concatenate(statistics)
+
+
+def _run_simulation(task):
+    """Run one simulation, possibly in a worker process.
+    """
+    simulator, parameters, seed = task
+    return simulator(parameters, seed)
+
+
+# Added to variances, for numerical stability
+_JITTER = 1e-8
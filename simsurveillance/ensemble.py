@@ -0,0 +1,246 @@
+"""Running many replicate simulations of a model.
+"""
+
+import concurrent.futures
+import os
+import pandas
+import simsurveillance as se
+from simsurveillance import InfectionStatus as InfStatus
+
+
+class Ensemble:
+    """Replicate simulations of a model with observers attached.
+
+    Each replicate creates a fresh model and observers from the given
+    factories, and simulates it. The replicates are given independent seeds
+    by :func:`simsurveillance.spawn_seeds`.
+
+    The outputs of all replicates are collected in one long-format
+    pandas.DataFrame with columns
+
+    - replicate : index of the replicate
+    - source : 'model' for the model output, otherwise the observer name
+    - time : time step
+    - variable : name of the output, such as 'INFECTED' or 'num_positive'
+    - value : value of the output
+
+    When the model and observer factories are run in worker processes they
+    must be picklable, for example functions defined at module level.
+
+    Attributes
+    ----------
+    model_factory : callable
+        Called with an integer seed, returns a new model ready to simulate.
+    observer_factories : dict
+        Maps the name of each observer to a callable, which is called with
+        the model and returns a new observer.
+    times : list
+        Time points at which to evaluate outputs.
+    num_replicates : int
+        Number of replicate simulations
+    seed : int
+        Entropy of the seed sequence from which the replicate seeds are
+        spawned.
+    """
+    def __init__(self, model_factory, observer_factories, times,
+                 num_replicates, seed=1234):
+        """
+        Parameters
+        ----------
+        model_factory : callable
+            Called with an integer seed, returns a new model ready to
+            simulate.
+        observer_factories : dict or list
+            Callables, each of which is called with the model and returns
+            a new observer. If a list is given, observers are named after
+            their class, followed by their position in the list if the
+            class is repeated.
+        times : list
+            Time points at which to evaluate outputs.
+        num_replicates : int
+            Number of replicate simulations
+        seed : int, optional (1234)
+            Entropy of the seed sequence from which the replicate seeds are
+            spawned.
+        """
+        if not isinstance(observer_factories, dict):
+            observer_factories = dict(enumerate(observer_factories))
+
+        self.model_factory = model_factory
+        self.observer_factories = observer_factories
+        self.times = times
+        self.num_replicates = num_replicates
+        self.seed = seed
+
+    def replicate_seeds(self):
+        """Get the seed of each replicate.
+
+        Returns
+        -------
+        list of int
+            Seed passed to the model factory for each replicate
+        """
+        return se.spawn_seeds(self.seed, self.num_replicates)
+
+    def run(self, num_workers=1, sink=None):
+        """Simulate all the replicates.
+
+        Parameters
+        ----------
+        num_workers : int, optional (1)
+            Number of worker processes. If 1, the replicates are run in this
+            process.
+        sink : simsurveillance.ResultSink, optional (None)
+            If given, the results of each replicate are written to the sink
+            by the worker which ran it, rather than being returned, so that
+            memory use does not grow with the number of replicates.
+
+        Returns
+        -------
+        pandas.DataFrame or None
+            Long-format results of all replicates, or None if a sink is
+            given.
+        """
+        tasks = [(self, replicate, seed, sink)
+                 for replicate, seed in enumerate(self.replicate_seeds())]
+
+        if num_workers == 1:
+            results = [_run_replicate(task) for task in tasks]
+
+        else:
+            with concurrent.futures.ProcessPoolExecutor(num_workers) as pool:
+                results = list(pool.map(_run_replicate, tasks))
+
+        if sink is not None:
+            return None
+        return pandas.concat(results, ignore_index=True)
+
+    def run_replicate(self, replicate, seed):
+        """Simulate one replicate.
+
+        Parameters
+        ----------
+        replicate : int
+            Index of the replicate
+        seed : int
+            Seed passed to the model factory
+
+        Returns
+        -------
+        pandas.DataFrame
+            Long-format results of the replicate
+        """
+        model = self.model_factory(seed)
+
+        observers = {name: factory(model)
+                     for name, factory in self.observer_factories.items()}
+        model.add_observers(*observers.values())
+
+        output = model.simulate(self.times).rename(
+            columns={status: status.name for status in InfStatus})
+
+        frames = [_long_format(output, 'model')]
+        sources = set()
+        for name, observer in observers.items():
+            if not isinstance(name, str):
+                # Name unnamed observers after their class
+                source = type(observer).__name__
+                if source in sources:
+                    source += '_{}'.format(name)
+                name = source
+            sources.add(name)
+            frames.append(_long_format(observer.records(), name))
+
+        results = pandas.concat(frames, ignore_index=True)
+        results.insert(0, 'replicate', replicate)
+        return results
+
+
+class ResultSink:
+    """Directory on disk holding the results of each replicate in a file.
+
+    Attributes
+    ----------
+    directory : str
+        Path of the directory
+    file_format : str
+        'csv', or 'parquet' (which requires pyarrow or fastparquet)
+    """
+    def __init__(self, directory, file_format='csv'):
+        """
+        Parameters
+        ----------
+        directory : str
+            Path of the directory, which is created if needed
+        file_format : str, optional ('csv')
+            'csv', or 'parquet' (which requires pyarrow or fastparquet)
+        """
+        if file_format not in ('csv', 'parquet'):
+            raise ValueError('Unknown file format {}'.format(file_format))
+
+        self.directory = directory
+        self.file_format = file_format
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, replicate):
+        return os.path.join(
+            self.directory,
+            'replicate_{:06d}.{}'.format(replicate, self.file_format))
+
+    def write(self, replicate, results):
+        """Write the results of one replicate.
+
+        Parameters
+        ----------
+        replicate : int
+            Index of the replicate
+        results : pandas.DataFrame
+            Long-format results of the replicate
+        """
+        if self.file_format == 'csv':
+            results.to_csv(self._path(replicate), index=False)
+        else:
+            results.to_parquet(self._path(replicate), index=False)
+
+    def __iter__(self):
+        """Iterate over the results of each replicate, in order.
+        """
+        files = sorted(f for f in os.listdir(self.directory)
+                       if f.startswith('replicate_')
+                       and f.endswith(self.file_format))
+        for f in files:
+            path = os.path.join(self.directory, f)
+            if self.file_format == 'csv':
+                yield pandas.read_csv(path)
+            else:
+                yield pandas.read_parquet(path)
+
+    def read(self):
+        """Read the results of all replicates.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Long-format results of all replicates
+        """
+        return pandas.concat(list(self), ignore_index=True)
+
+
+def _long_format(df, source):
+    """Convert a time series DataFrame to long format.
+    """
+    df = df.melt(id_vars='time', var_name='variable', value_name='value')
+    df.insert(0, 'source', source)
+    return df
+
+
+def _run_replicate(task):
+    """Simulate one replicate in a worker process.
+    """
+    ensemble, replicate, seed, sink = task
+    results = ensemble.run_replicate(replicate, seed)
+
+    if sink is not None:
+        sink.write(replicate, results)
+        return None
+    return results
@@ -0,0 +1,182 @@
+"""Columnar record of the status changes in an agent based model.
+"""
+
+import numpy as np
+import pandas
+from simsurveillance import InfectionStatus
+
+
+class EventLog:
+    """Log of the status changes of all persons in a model.
+
+    Each event is stored as one row of three NumPy arrays, holding the time
+    step, the agent id and the value of the new
+    :class:`simsurveillance.InfectionStatus`. The arrays are preallocated,
+    and their capacity is doubled whenever they fill up, so recording an
+    event costs a few bytes and amortized constant time.
+
+    Events are kept in the order in which they were recorded, which is
+    non-decreasing in time during a simulation.
+
+    Attributes
+    ----------
+    size : int
+        Number of events recorded
+    """
+    def __init__(self, capacity=1024):
+        """
+        Parameters
+        ----------
+        capacity : int, optional (1024)
+            Number of events for which space is initially allocated
+        """
+        capacity = max(int(capacity), 1)
+        self._times = np.empty(capacity, dtype=np.int64)
+        self._agent_ids = np.empty(capacity, dtype=np.int64)
+        self._new_statuses = np.empty(capacity, dtype=np.int8)
+        self.size = 0
+
+    def _reserve(self, num):
+        """Make space for num more events.
+        """
+        required = self.size + num
+        capacity = len(self._times)
+        if required <= capacity:
+            return
+
+        while capacity < required:
+            capacity *= 2
+
+        for name in ('_times', '_agent_ids', '_new_statuses'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def record(self, agent_id, new_status, time):
+        """Record the status change of one person.
+
+        Parameters
+        ----------
+        agent_id : int
+            Id of the person
+        new_status : simsurveillance.InfectionStatus
+            Status to which they switched
+        time : int
+            Time step of the change
+        """
+        self._reserve(1)
+        self._times[self.size] = time
+        self._agent_ids[self.size] = agent_id
+        self._new_statuses[self.size] = new_status.value
+        self.size += 1
+
+    def record_many(self, agent_ids, new_status, time):
+        """Record the same status change of many persons.
+
+        Parameters
+        ----------
+        agent_ids : sequence of int
+            Ids of the persons
+        new_status : simsurveillance.InfectionStatus
+            Status to which they switched
+        time : int
+            Time step of the change
+        """
+        num = len(agent_ids)
+        self._reserve(num)
+        end = self.size + num
+        self._times[self.size:end] = time
+        self._agent_ids[self.size:end] = agent_ids
+        self._new_statuses[self.size:end] = new_status.value
+        self.size = end
+
+    @property
+    def times(self):
+        """Time step of each event.
+        """
+        return self._times[:self.size]
+
+    @property
+    def agent_ids(self):
+        """Agent id of each event.
+        """
+        return self._agent_ids[:self.size]
+
+    @property
+    def new_statuses(self):
+        """Value of the new infection status of each event.
+        """
+        return self._new_statuses[:self.size]
+
+    def history(self, agent_id):
+        """Get the status changes of one person.
+
+        Parameters
+        ----------
+        agent_id : int
+            Id of the person
+
+        Returns
+        -------
+        dict
+            Keys are time steps, and values are the status they switched to
+            at that time. If they changed status more than once in a time
+            step, the last change is given.
+        """
+        rows = np.flatnonzero(self.agent_ids == agent_id)
+        return {time: InfectionStatus(status) for time, status in zip(
+            self._times[rows].tolist(), self._new_statuses[rows].tolist())}
+
+    def events_at(self, time):
+        """Get the status changes at one time step.
+
+        Parameters
+        ----------
+        time : int
+            Time step
+
+        Returns
+        -------
+        tuple of numpy.ndarray
+            Agent ids, and values of the new infection status, of the events
+            at that time.
+        """
+        rows = np.flatnonzero(self.times == time)
+        return self._agent_ids[rows], self._new_statuses[rows]
+
+    def to_dataframe(self):
+        """Export the events to a DataFrame.
+
+        Returns
+        -------
+        pandas.DataFrame
+            One row per event, with columns time, agent_id and new_status,
+            where new_status holds the name of the infection status.
+        """
+        values = [status.value for status in InfectionStatus]
+        names = [status.name for status in InfectionStatus]
+        lookup = np.empty(max(values) + 1, dtype=np.int64)
+        lookup[values] = np.arange(len(values))
+
+        return pandas.DataFrame({
+            'time': self.times.copy(),
+            'agent_id': self.agent_ids.copy(),
+            'new_status': pandas.Categorical.from_codes(
+                lookup[self.new_statuses], categories=names),
+        })
+
+    def to_parquet(self, path):
+        """Write the events to a Parquet file.
+
+        Requires pyarrow or fastparquet.
+
+        Parameters
+        ----------
+        path : str
+            Path of the file
+        """
+        self.to_dataframe().to_parquet(path, index=False)
+
+    def __len__(self):
+        return self.size
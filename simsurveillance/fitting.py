@@ -0,0 +1,359 @@
+"""Fitting models to surveillance data by running MCMC chains in parallel.
+"""
+
+import collections
+import concurrent.futures
+import os
+import pickle
+import time
+import numpy as np
+import pints
+import simsurveillance as se
+
+
+FitReport = collections.namedtuple(
+    'FitReport',
+    ['iteration', 'evaluations', 'evaluations_per_second', 'rhat'])
+FitReport.__doc__ = """Progress of an :class:`MCMCFit`, after a block of
+iterations.
+
+Attributes
+----------
+iteration : int
+    Number of iterations completed by each chain
+evaluations : numpy.ndarray
+    Number of evaluations of the log-posterior by each chain so far
+evaluations_per_second : numpy.ndarray
+    Throughput of each chain during the latest block
+rhat : numpy.ndarray or None
+    R-hat of each parameter, computed from the second half of the chains,
+    or None if the chains are too short or there is only one.
+"""
+
+
+class MCMCFit:
+    """Fit of a model to data by several MCMC chains, run in parallel.
+
+    Each chain is advanced by its own single chain pints sampler, through
+    the ask and tell interface. The chains are run in blocks of iterations,
+    spread across a pool of worker processes. After each block, the state of
+    every sampler is gathered, optionally written to a checkpoint file, and
+    the throughput and R-hat of the chains are reported. A fit interrupted
+    part way through resumes from its last checkpoint.
+
+    pints samplers draw from the global numpy random state, so each chain
+    is given its own random state, seeded by
+    :func:`simsurveillance.spawn_seeds` and saved with the sampler. The
+    samples are therefore also the same whether or not the fit was resumed.
+
+    When the chains are run in worker processes the log-posterior must be
+    picklable, as are the models and log-likelihoods of simsurveillance.
+
+    Attributes
+    ----------
+    log_posterior : pints.LogPDF
+        Log-posterior to sample from
+    x0 : numpy.ndarray
+        Starting point of each chain, of shape (num_chains, n_parameters)
+    method : type
+        Class of the single chain pints sampler
+    sigma0 : numpy.ndarray or None
+        Initial covariance or standard deviations of the samplers
+    seed : int
+        Entropy of the seed sequence from which the chain seeds are spawned
+    initial_phase_iterations : int
+        Number of iterations in the initial phase of samplers which have one
+    samples : numpy.ndarray or None
+        Samples of the latest run, of shape (num_chains, num_iterations,
+        n_parameters)
+    reports : list of simsurveillance.FitReport
+        Progress reported after each block of the latest run
+    """
+    def __init__(self, log_posterior, x0, method=pints.HaarioBardenetACMC,
+                 sigma0=None, seed=1234, initial_phase_iterations=200):
+        """
+        Parameters
+        ----------
+        log_posterior : pints.LogPDF
+            Log-posterior to sample from
+        x0 : list
+            Starting point of each chain
+        method : type, optional (pints.HaarioBardenetACMC)
+            Class of a single chain pints sampler
+        sigma0 : list, optional (None)
+            Initial covariance or standard deviations of the samplers
+        seed : int, optional (1234)
+            Entropy of the seed sequence from which the chain seeds are
+            spawned.
+        initial_phase_iterations : int, optional (200)
+            Number of iterations in the initial phase of samplers which
+            have one, such as adaptive samplers.
+        """
+        if not issubclass(method, pints.SingleChainMCMC):
+            raise ValueError('The method must be a single chain pints '
+                             'sampler.')
+
+        self.x0 = np.atleast_2d(np.asarray(x0, dtype=float))
+        if self.x0.shape[1] != log_posterior.n_parameters():
+            raise ValueError('Each starting point must have one value per '
+                             'parameter.')
+
+        self.log_posterior = log_posterior
+        self.method = method
+        self.sigma0 = sigma0
+        self.seed = seed
+        self.initial_phase_iterations = initial_phase_iterations
+        self.samples = None
+        self.reports = []
+
+    @classmethod
+    def from_records(cls, model, log_prior, x0, prevalence=None, cases=None,
+                     sensitivity=1.0, specificity=1.0, ascertainment=1.0,
+                     distribution='poisson', dispersion=None, start_time=0,
+                     **kwargs):
+        """Set up a fit to the records of observers.
+
+        The log-likelihoods of the records are
+        :class:`simsurveillance.PrevalenceLogLikelihood` and
+        :class:`simsurveillance.CasesLogLikelihood`, which are summed if
+        both are given.
+
+        Parameters
+        ----------
+        model : pints.ForwardModel
+            Model with the outputs of simsurveillance.SIRSModel
+        log_prior : pints.LogPrior
+            Prior of the parameters of the model
+        x0 : list
+            Starting point of each chain
+        prevalence : pandas.DataFrame, optional (None)
+            Records of a simsurveillance.PrevalenceSurvey
+        cases : pandas.DataFrame, optional (None)
+            Records of a simsurveillance.SymptomaticTesting
+        sensitivity : float, optional (1.0)
+            Sensitivity of the test of the prevalence survey
+        specificity : float, optional (1.0)
+            Specificity of the test of the prevalence survey
+        ascertainment : float, optional (1.0)
+            Fraction of the infections found by symptomatic testing
+        distribution : str, optional ('poisson')
+            Distribution of the cases, see
+            simsurveillance.CasesLogLikelihood
+        dispersion : float, optional (None)
+            Dispersion of the negative binomial distribution of the cases
+        start_time : float, optional (0)
+            Time at which the model starts from its initial condition
+        kwargs
+            Passed on to the constructor of MCMCFit
+
+        Returns
+        -------
+        simsurveillance.MCMCFit
+            Fit ready to run
+        """
+        log_likelihoods = []
+        if prevalence is not None and len(prevalence) > 0:
+            log_likelihoods.append(se.PrevalenceLogLikelihood(
+                model, prevalence['time'], prevalence['num_tested'],
+                prevalence['num_positive'], sensitivity, specificity,
+                start_time))
+        if cases is not None and len(cases) > 0:
+            log_likelihoods.append(se.CasesLogLikelihood(
+                model, cases['time'], cases['cases'], ascertainment,
+                distribution, dispersion, start_time))
+
+        if not log_likelihoods:
+            raise ValueError('No records to fit.')
+        if len(log_likelihoods) == 1:
+            log_likelihood = log_likelihoods[0]
+        else:
+            log_likelihood = \
+                pints.SumOfIndependentLogLikelihoods(log_likelihoods)
+
+        return cls(pints.LogPosterior(log_likelihood, log_prior), x0,
+                   **kwargs)
+
+    @property
+    def num_chains(self):
+        """Number of chains.
+        """
+        return len(self.x0)
+
+    def chain_seeds(self):
+        """Get the seed of the random state of each chain.
+
+        Returns
+        -------
+        list of int
+            Seed of each chain
+        """
+        return se.spawn_seeds(self.seed, self.num_chains)
+
+    def _initial_state(self):
+        """State of the chains before the first iteration.
+        """
+        samplers = []
+        for x0 in self.x0:
+            sampler = self.method(x0, self.sigma0)
+            if sampler.needs_initial_phase():
+                sampler.set_initial_phase(True)
+            samplers.append(sampler)
+
+        return {
+            'iteration': 0,
+            'samplers': samplers,
+            'random_states': [np.random.RandomState(seed).get_state()
+                              for seed in self.chain_seeds()],
+            'samples': np.zeros((self.num_chains, 0, self.x0.shape[1])),
+            'evaluations': np.zeros(self.num_chains, dtype=np.int64),
+        }
+
+    def _load_checkpoint(self, path):
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+
+        if len(state['samplers']) != self.num_chains or \
+                type(state['samplers'][0]) is not self.method:
+            raise ValueError('The checkpoint {} is of a different fit.'.format(
+                path))
+        return state
+
+    @staticmethod
+    def _save_checkpoint(path, state):
+        # Write to a temporary file first, so that an interruption while
+        # writing does not corrupt the previous checkpoint.
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+
+    def run(self, num_iterations, num_workers=1, checkpoint=None,
+            checkpoint_every=100, verbose=False):
+        """Run the chains.
+
+        Parameters
+        ----------
+        num_iterations : int
+            Total number of iterations of each chain
+        num_workers : int, optional (1)
+            Number of worker processes. If 1, the chains are run in this
+            process.
+        checkpoint : str, optional (None)
+            Path of the checkpoint file. If the file exists, the chains are
+            resumed from it, and it is updated after every block.
+        checkpoint_every : int, optional (100)
+            Number of iterations of each block, after which the chains are
+            checkpointed and their progress reported.
+        verbose : bool, optional (False)
+            Whether to print the progress after every block
+
+        Returns
+        -------
+        numpy.ndarray
+            Samples of shape (num_chains, num_iterations, n_parameters)
+        """
+        if checkpoint is not None and os.path.exists(checkpoint):
+            state = self._load_checkpoint(checkpoint)
+        else:
+            state = self._initial_state()
+
+        self.reports = []
+        pool = None
+        if num_workers > 1:
+            pool = concurrent.futures.ProcessPoolExecutor(num_workers)
+
+        try:
+            while state['iteration'] < num_iterations:
+                start = state['iteration']
+                block = min(checkpoint_every, num_iterations - start)
+                tasks = [(self.log_posterior, sampler, random_state, start,
+                          block, self.initial_phase_iterations)
+                         for sampler, random_state in zip(
+                             state['samplers'], state['random_states'])]
+
+                if pool is None:
+                    results = [_advance_chain(task) for task in tasks]
+                else:
+                    results = list(pool.map(_advance_chain, tasks))
+
+                samplers, random_states, samples, evaluations, elapsed = \
+                    zip(*results)
+                state['iteration'] = start + block
+                state['samplers'] = list(samplers)
+                state['random_states'] = list(random_states)
+                state['samples'] = np.concatenate(
+                    (state['samples'], np.array(samples)), axis=1)
+                state['evaluations'] = state['evaluations'] + evaluations
+
+                if checkpoint is not None:
+                    self._save_checkpoint(checkpoint, state)
+
+                report = FitReport(
+                    state['iteration'], state['evaluations'].copy(),
+                    np.array(evaluations) / np.maximum(elapsed, 1e-9),
+                    self._rhat(state['samples']))
+                self.reports.append(report)
+                if verbose:
+                    _print_report(report)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self.samples = state['samples'][:, :num_iterations]
+        return self.samples
+
+    def _rhat(self, samples):
+        """R-hat of the second half of the samples, if possible.
+        """
+        if self.num_chains < 2 or samples.shape[1] < 4:
+            return None
+        return pints.rhat(samples, warm_up=0.5)
+
+
+def _advance_chain(task):
+    """Run a block of iterations of one chain, possibly in a worker process.
+    """
+    log_posterior, sampler, random_state, start, num_iterations, \
+        initial_phase_iterations = task
+
+    needs_sensitivities = sampler.needs_sensitivities()
+    samples = []
+    evaluations = 0
+
+    # The samplers use the global random state, which is restored afterwards
+    global_state = np.random.get_state()
+    np.random.set_state(random_state)
+    start_time = time.perf_counter()
+    try:
+        while len(samples) < num_iterations:
+            if sampler.needs_initial_phase() and \
+                    start + len(samples) == initial_phase_iterations:
+                sampler.set_initial_phase(False)
+
+            x = sampler.ask()
+            if needs_sensitivities:
+                fx = log_posterior.evaluateS1(x)
+            else:
+                fx = log_posterior(x)
+            evaluations += 1
+
+            reply = sampler.tell(fx)
+            if reply is not None:
+                samples.append(reply[0])
+        elapsed = time.perf_counter() - start_time
+        random_state = np.random.get_state()
+    finally:
+        np.random.set_state(global_state)
+
+    return sampler, random_state, np.array(samples), evaluations, elapsed
+
+
+def _print_report(report):
+    throughput = ', '.join('{:.0f}'.format(e)
+                           for e in report.evaluations_per_second)
+    line = 'Iteration {}: evaluations/s per chain [{}]'.format(
+        report.iteration, throughput)
+    if report.rhat is not None:
+        line += ', R-hat [{}]'.format(
+            ', '.join('{:.3f}'.format(r) for r in report.rhat))
+    print(line)
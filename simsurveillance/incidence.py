@@ -0,0 +1,194 @@
+"""Index of the new infections in an agent based model.
+"""
+
+import numpy as np
+
+
+class IncidenceIndex:
+    """New infections of each time step, split by symptomatic status.
+
+    The model records every batch of new infections in the index. Observers
+    which only need the new cases, such as
+    :class:`simsurveillance.SymptomaticTesting`, can then look up the
+    persons infected at a time step, at a cost proportional to the
+    incidence rather than the prevalence. Only the most recent time steps
+    are retained, so the memory use is bounded.
+
+    Observers needing a longer or different history can subscribe a
+    callback, which is called with each batch of new infections as it is
+    recorded.
+
+    New infections of an array-backed population may be recorded by their
+    agent ids, with :meth:`record_agent_ids`. The
+    :class:`simsurveillance.AgentView` objects of those persons are then
+    only created when the infections are looked up, so recording the many
+    infections of a large epidemic costs little when no observer needs
+    them.
+
+    Attributes
+    ----------
+    window : int
+        Number of most recent time steps for which new infections are
+        retained.
+    """
+    def __init__(self, window=2):
+        """
+        Parameters
+        ----------
+        window : int, optional (2)
+            Number of most recent time steps for which new infections are
+            retained.
+        """
+        self.window = window
+        self._steps = dict()
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """Be notified of new infections.
+
+        Parameters
+        ----------
+        callback : callable
+            Called as ``callback(time, symptomatic, asymptomatic)`` for each
+            batch of new infections, with the lists of newly infected
+            persons who do and do not have symptoms.
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """Stop being notified of new infections.
+
+        Parameters
+        ----------
+        callback : callable
+            Callback previously passed to :meth:`subscribe`
+        """
+        self._subscribers.remove(callback)
+
+    def _step(self, time):
+        """Get the new infections of a time step, creating them if needed,
+        and forgetting those before the window.
+
+        Each step holds the symptomatic and asymptomatic persons, followed
+        by the batches of each recorded by agent id, whose persons have not
+        yet been created.
+        """
+        step = self._steps.get(time)
+        if step is None:
+            step = self._steps[time] = ([], [], [], [])
+            for t in [t for t in self._steps if t <= time - self.window]:
+                del self._steps[t]
+        return step
+
+    @staticmethod
+    def _create_views(step, i):
+        """Create the persons of the symptomatic (i=0) or asymptomatic (i=1)
+        infections recorded by agent id, in the order they were recorded.
+        """
+        for population, agent_ids in step[2 + i]:
+            step[i].extend(population.person(j) for j in agent_ids.tolist())
+        step[2 + i].clear()
+
+    def record(self, persons, symptomatic, time):
+        """Record a batch of new infections.
+
+        Parameters
+        ----------
+        persons : list of simsurveillance.Person
+            Newly infected persons
+        symptomatic : sequence of bool
+            Whether each person has symptoms
+        time : int
+            Time step of the infections
+        """
+        step = self._step(time)
+        self._create_views(step, 0)
+        self._create_views(step, 1)
+
+        new_symptomatic = [p for p, s in zip(persons, symptomatic) if s]
+        new_asymptomatic = [p for p, s in zip(persons, symptomatic) if not s]
+        step[0].extend(new_symptomatic)
+        step[1].extend(new_asymptomatic)
+
+        for callback in self._subscribers:
+            callback(time, new_symptomatic, new_asymptomatic)
+
+    def record_agent_ids(self, population, agent_ids, symptomatic, time):
+        """Record a batch of new infections of an array-backed population.
+
+        Parameters
+        ----------
+        population : simsurveillance.ArrayPopulation
+            Population of the newly infected persons
+        agent_ids : numpy.ndarray
+            Agent ids of the newly infected persons
+        symptomatic : numpy.ndarray
+            Whether each person has symptoms
+        time : int
+            Time step of the infections
+        """
+        if self._subscribers:
+            # Subscribers are given the persons straight away
+            self.record([population.person(i) for i in agent_ids.tolist()],
+                        symptomatic.tolist(), time)
+            return
+
+        symptomatic = np.asarray(symptomatic, dtype=bool)
+        step = self._step(time)
+        step[2].append((population, agent_ids[symptomatic]))
+        step[3].append((population, agent_ids[~symptomatic]))
+
+    def new_infections(self, time, symptomatic=None):
+        """Get the persons newly infected at a time step.
+
+        Parameters
+        ----------
+        time : int
+            Time step. Nothing is returned for time steps before the
+            retained window.
+        symptomatic : bool, optional (None)
+            If True, only those with symptoms, and if False only those
+            without. By default, all the newly infected.
+
+        Returns
+        -------
+        list
+            Persons infected at the time step, in the order in which they
+            were infected.
+        """
+        step = self._steps.get(time, ([], [], [], []))
+        if symptomatic is None:
+            self._create_views(step, 0)
+            self._create_views(step, 1)
+            return step[0] + step[1]
+
+        i = 0 if symptomatic else 1
+        self._create_views(step, i)
+        return list(step[i])
+
+    def num_new_infections(self, time, symptomatic=None):
+        """Count the persons newly infected at a time step, without creating
+        the persons recorded by agent id.
+
+        Parameters
+        ----------
+        time : int
+            Time step. Nothing is counted for time steps before the
+            retained window.
+        symptomatic : bool, optional (None)
+            If True, only those with symptoms, and if False only those
+            without. By default, all the newly infected.
+
+        Returns
+        -------
+        int
+            Number of persons infected at the time step
+        """
+        step = self._steps.get(time)
+        if step is None:
+            return 0
+        categories = [0, 1] if symptomatic is None else \
+            [0 if symptomatic else 1]
+        return sum(len(step[i]) + sum(len(agent_ids)
+                                      for _, agent_ids in step[2 + i])
+                   for i in categories)
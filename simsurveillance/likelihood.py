@@ -0,0 +1,247 @@
+"""Log-likelihoods of surveillance data, for inference with pints.
+"""
+
+import numpy as np
+import pints
+import scipy.special
+
+
+class _SurveillanceLogLikelihood(pints.LogLikelihood):
+    """Base class of the log-likelihoods of data at given times, under a
+    model with the outputs of :class:`simsurveillance.SIRSModel`.
+
+    The model is simulated from the start time, with its initial condition,
+    and evaluated at the data times and one time step before each of them,
+    so that the incidence during the time step before each data time is
+    available.
+    """
+    def __init__(self, model, times, start_time=0):
+        super().__init__()
+
+        self._model = model
+        self._times = np.asarray(times, dtype=float)
+        if np.any(self._times < start_time):
+            raise ValueError('Data times must not be before the start time')
+
+        self._model_times = np.union1d(
+            [start_time],
+            np.concatenate((self._times, np.maximum(self._times - 1,
+                                                    start_time))))
+        self._index = np.searchsorted(self._model_times, self._times)
+        self._previous_index = np.searchsorted(
+            self._model_times, np.maximum(self._times - 1, start_time))
+
+    def n_parameters(self):
+        return self._model.n_parameters()
+
+    def _prevalence(self, y):
+        """Prevalence at the data times.
+        """
+        return y[self._index, 0]
+
+    def _incidence(self, y):
+        """Incidence during the time step before each data time.
+        """
+        cumulative = np.cumsum(y[:, 1])
+        return cumulative[self._index] - cumulative[self._previous_index]
+
+    def _prevalence_S1(self, dy):
+        return dy[self._index, 0]
+
+    def _incidence_S1(self, dy):
+        cumulative = np.cumsum(dy[:, 1], axis=0)
+        return cumulative[self._index] - cumulative[self._previous_index]
+
+    def __call__(self, parameters):
+        y = self._model.simulate(parameters, self._model_times)
+        return self._log_likelihood(y)
+
+    def evaluateS1(self, parameters):
+        """Evaluate the log-likelihood and its derivatives with respect to
+        the parameters, using the sensitivities from the model's
+        ``simulateS1``.
+
+        Parameters
+        ----------
+        parameters : list
+            Parameters of the model
+
+        Returns
+        -------
+        float
+            Log-likelihood
+        numpy.ndarray
+            Derivative of the log-likelihood with respect to each parameter
+        """
+        y, dy = self._model.simulateS1(parameters, self._model_times)
+        return self._log_likelihood(y), self._log_likelihood_S1(y, dy)
+
+
+class PrevalenceLogLikelihood(_SurveillanceLogLikelihood):
+    """Binomial log-likelihood of the results of prevalence surveys.
+
+    The number of positive tests at each survey is binomial, with the
+    number of tests, and the probability that a random person tests
+    positive,
+
+    ``sensitivity * p + (1 - specificity) * (1 - p)``
+
+    where p is the prevalence output of the model.
+
+    Parameters
+    ----------
+    model : pints.ForwardModel
+        Model with the outputs of simsurveillance.SIRSModel, the first of
+        which is the prevalence.
+    times : list
+        Time of each survey, such as PrevalenceSurvey.times
+    num_tested : list of int
+        Number of tests of each survey
+    num_positive : list of int
+        Number of positive tests of each survey
+    sensitivity : float, optional (1.0)
+        Sensitivity of the test
+    specificity : float, optional (1.0)
+        Specificity of the test
+    start_time : float, optional (0)
+        Time at which the model starts from its initial condition
+    """
+    def __init__(self, model, times, num_tested, num_positive,
+                 sensitivity=1.0, specificity=1.0, start_time=0):
+        super().__init__(model, times, start_time)
+
+        self._num_tested = np.asarray(num_tested, dtype=float)
+        self._num_positive = np.asarray(num_positive, dtype=float)
+        if self._num_tested.shape != self._times.shape or \
+                self._num_positive.shape != self._times.shape:
+            raise ValueError('One number of tests and of positive tests is '
+                             'required at each time.')
+
+        self._sensitivity = sensitivity
+        self._specificity = specificity
+
+        self._log_binomial_coefficients = np.sum(
+            scipy.special.gammaln(self._num_tested + 1)
+            - scipy.special.gammaln(self._num_positive + 1)
+            - scipy.special.gammaln(self._num_tested - self._num_positive
+                                    + 1))
+
+    def _unclamped_positive_probability(self, y):
+        prevalence = self._prevalence(y)
+        return self._sensitivity * prevalence \
+            + (1 - self._specificity) * (1 - prevalence)
+
+    def _positive_probability(self, y):
+        return np.clip(self._unclamped_positive_probability(y),
+                       _EPSILON, 1 - _EPSILON)
+
+    def _log_likelihood(self, y):
+        q = self._positive_probability(y)
+        return self._log_binomial_coefficients + np.sum(
+            self._num_positive * np.log(q)
+            + (self._num_tested - self._num_positive) * np.log(1 - q))
+
+    def _log_likelihood_S1(self, y, dy):
+        unclamped = self._unclamped_positive_probability(y)
+        q = np.clip(unclamped, _EPSILON, 1 - _EPSILON)
+        dL_dq = self._num_positive / q \
+            - (self._num_tested - self._num_positive) / (1 - q)
+
+        # The log-likelihood is flat where the probability is clamped
+        dq_dp = np.where(q == unclamped,
+                         self._sensitivity - (1 - self._specificity), 0.0)
+        return (dL_dq * dq_dp) @ self._prevalence_S1(dy)
+
+
+class CasesLogLikelihood(_SurveillanceLogLikelihood):
+    """Poisson or negative binomial log-likelihood of the number of cases
+    found by symptomatic testing.
+
+    The cases reported at each time are those infected during the previous
+    time step, as for simsurveillance.SymptomaticTesting, so their expected
+    number is the ascertainment fraction times the incidence output of the
+    model during that time step.
+
+    Parameters
+    ----------
+    model : pints.ForwardModel
+        Model with the outputs of simsurveillance.SIRSModel, the second of
+        which is the incidence.
+    times : list
+        Time of each count of cases, such as SymptomaticTesting.times
+    cases : list of int
+        Number of cases at each time
+    ascertainment : float, optional (1.0)
+        Fraction of the infections which are found, combining the proportion
+        symptomatic and the test sensitivity.
+    distribution : str, optional ('poisson')
+        'poisson', or 'negative-binomial' for overdispersed counts
+    dispersion : float, optional (None)
+        Size parameter r of the negative binomial distribution, whose
+        variance is ``mu + mu ** 2 / r``. Required for the negative binomial
+        distribution.
+    start_time : float, optional (0)
+        Time at which the model starts from its initial condition
+    """
+    def __init__(self, model, times, cases, ascertainment=1.0,
+                 distribution='poisson', dispersion=None, start_time=0):
+        super().__init__(model, times, start_time)
+
+        if distribution not in ('poisson', 'negative-binomial'):
+            raise ValueError('Unknown distribution {}'.format(distribution))
+        if distribution == 'negative-binomial' and \
+                (dispersion is None or dispersion <= 0):
+            raise ValueError('The negative binomial distribution requires a '
+                             'positive dispersion.')
+
+        self._cases = np.asarray(cases, dtype=float)
+        if self._cases.shape != self._times.shape:
+            raise ValueError('One number of cases is required at each time.')
+
+        self._ascertainment = ascertainment
+        self._distribution = distribution
+        self._dispersion = dispersion
+
+        if distribution == 'poisson':
+            self._constant = -np.sum(scipy.special.gammaln(self._cases + 1))
+        else:
+            r = dispersion
+            self._constant = np.sum(
+                scipy.special.gammaln(self._cases + r)
+                - scipy.special.gammaln(r)
+                - scipy.special.gammaln(self._cases + 1))
+
+    def _unclamped_mean(self, y):
+        return self._ascertainment * self._incidence(y)
+
+    def _mean(self, y):
+        return np.maximum(self._unclamped_mean(y), _EPSILON)
+
+    def _log_likelihood(self, y):
+        mu = self._mean(y)
+        k = self._cases
+
+        if self._distribution == 'poisson':
+            return self._constant + np.sum(k * np.log(mu) - mu)
+
+        r = self._dispersion
+        return self._constant + np.sum(
+            r * np.log(r / (r + mu)) + k * np.log(mu / (r + mu)))
+
+    def _log_likelihood_S1(self, y, dy):
+        unclamped = self._unclamped_mean(y)
+        mu = np.maximum(unclamped, _EPSILON)
+        k = self._cases
+
+        if self._distribution == 'poisson':
+            dL_dmu = k / mu - 1
+        else:
+            dL_dmu = k / mu - (k + self._dispersion) / (self._dispersion + mu)
+
+        # The log-likelihood is flat where the mean is clamped
+        dmu_di = np.where(mu == unclamped, self._ascertainment, 0.0)
+        return (dL_dmu * dmu_di) @ self._incidence_S1(dy)
+
+
+# Smallest probability or mean, to keep the logarithms finite
+_EPSILON = 1e-12
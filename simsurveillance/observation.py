@@ -1,7 +1,9 @@
 """Processes to simulate collecting epidemiological data during a simulation.
 """
 
-import random
+import bisect
+import numpy as np
+import pandas
 import scipy.stats
 from simsurveillance import InfectionStatus as InfStatus
 
@@ -9,6 +11,12 @@ from simsurveillance import InfectionStatus as InfStatus
 class DiseaseTest:
     """Imperfect binary testing process for a disease.
 
+    Persons can be tested one at a time by calling the test, or in batches
+    with :meth:`test_statuses`, :meth:`test_people` and
+    :meth:`test_counts`, which draw all the results at once. Observers pass
+    their own random generator; without one, the results are drawn from the
+    generator of the test.
+
     Attributes
     ----------
     sensitivity : float
@@ -19,8 +27,14 @@ class DiseaseTest:
         Which states count as truly positive for this test.
     cost : float
         Positive number representing the surveillance effort of this test.
+    num_tests_performed : int
+        Number of tests performed so far
+    total_cost : float
+        Surveillance effort of all the tests performed so far
+    rng : numpy.random.Generator
+        Random generator of the results drawn without a given generator
     """
-    def __init__(self, sensitivity=1.0, specificity=1.0):
+    def __init__(self, sensitivity=1.0, specificity=1.0, seed=1234):
         self.sensitivity = sensitivity
         self.specificity = specificity
 
@@ -28,26 +42,137 @@ class DiseaseTest:
 
         self.cost = 1.0
 
-    def __call__(self, person):
+        self.num_tests_performed = 0
+        self.total_cost = 0.0
+
+        self.rng = np.random.default_rng(seed)
+
+    def __call__(self, person, rng=None):
         """Obtain the test result of testing a person.
 
         Parameters
         ----------
         person : simsurveillance.Person
             Person to be tested.
+        rng : numpy.random.Generator, optional (None)
+            Random generator to use, usually that of the observer. By
+            default, the generator of the test.
         """
+        rng = self.rng if rng is None else rng
+        self._record_tests(1)
+
         if person.status in self.positive_states:
-            if random.random() < self.sensitivity:
+            if rng.random() < self.sensitivity:
                 return True
             else:
                 return False
 
         else:
-            if random.random() < self.specificity:
+            if rng.random() < self.specificity:
                 return False
             else:
                 return True
 
+    def test_statuses(self, statuses, rng=None):
+        """Obtain the test results of a batch of persons.
+
+        Makes the same random draws as testing each person in turn.
+
+        Parameters
+        ----------
+        statuses : numpy.ndarray
+            Value of the simsurveillance.InfectionStatus of each person
+            tested, for example a slice of
+            simsurveillance.ArrayPopulation.status.
+        rng : numpy.random.Generator, optional (None)
+            Random generator to use, usually that of the observer. By
+            default, the generator of the test.
+
+        Returns
+        -------
+        numpy.ndarray
+            Whether the test of each person is positive
+        """
+        rng = self.rng if rng is None else rng
+        statuses = np.asarray(statuses)
+        self._record_tests(len(statuses))
+
+        truly_positive = np.isin(
+            statuses, [status.value for status in self.positive_states])
+        draws = rng.random(len(statuses))
+        return np.where(truly_positive,
+                        draws < self.sensitivity,
+                        draws >= self.specificity)
+
+    def test_people(self, persons, rng=None):
+        """Obtain the test results of a batch of persons.
+
+        Parameters
+        ----------
+        persons : list of simsurveillance.Person
+            Persons to be tested.
+        rng : numpy.random.Generator, optional (None)
+            Random generator to use, usually that of the observer. By
+            default, the generator of the test.
+
+        Returns
+        -------
+        numpy.ndarray
+            Whether the test of each person is positive
+        """
+        statuses = np.fromiter((person.status.value for person in persons),
+                               dtype=np.int64)
+        return self.test_statuses(statuses, rng)
+
+    def test_counts(self, num_truly_positive, num_truly_negative, rng=None):
+        """Obtain the number of positive results of testing a batch of
+        persons, given only how many of them are truly positive.
+
+        Parameters
+        ----------
+        num_truly_positive : int
+            Number of truly positive persons tested
+        num_truly_negative : int
+            Number of truly negative persons tested
+        rng : numpy.random.Generator, optional (None)
+            Random generator to use, usually that of the observer. By
+            default, the generator of the test.
+
+        Returns
+        -------
+        int
+            Number of positive tests
+        """
+        rng = self.rng if rng is None else rng
+        self._record_tests(num_truly_positive + num_truly_negative)
+
+        return int(
+            rng.binomial(num_truly_positive, self.sensitivity)
+            + rng.binomial(num_truly_negative, 1 - self.specificity))
+
+    def positive_probability(self, prevalence):
+        """Probability that a random person tests positive.
+
+        Parameters
+        ----------
+        prevalence : float or numpy.ndarray
+            Proportion of the population which is truly positive
+
+        Returns
+        -------
+        float or numpy.ndarray
+            ``sensitivity * prevalence + (1 - specificity) * (1 -
+            prevalence)``
+        """
+        return self.sensitivity * prevalence \
+            + (1 - self.specificity) * (1 - prevalence)
+
+    def _record_tests(self, num):
+        """Account for the effort of performing a number of tests.
+        """
+        self.num_tests_performed += int(num)
+        self.total_cost += num * self.cost
+
 
 class Observer:
     """Observation process of an epidemic.
@@ -56,6 +181,15 @@ class Observer:
     model. It can extract exact information or simulate some testing process
     applied to a randomly or deterministically selected subset of the
     population.
+
+    Attributes
+    ----------
+    model : simsurveillance.AgentModel
+        Model which is observed
+    rng : numpy.random.Generator
+        Random generator of this observer, derived from the model seed
+        independently of the simulation, so that adjusting the observers
+        does not change the simulated epidemic.
     """
 
     def __init__(self, model):
@@ -66,16 +200,52 @@ class Observer:
             Agent based model
         """
         self.model = model
+        self.rng = model.spawn_rng('observation')
 
     def __call__(self, time):
         raise NotImplementedError
 
+    def next_time(self, time):
+        """Get the earliest time step at which this observer must be called.
+
+        The simulation skips the time steps at which no step or observer is
+        due. By default, an observer is due at every time step.
+
+        Parameters
+        ----------
+        time : int
+            Time step from which to look
+
+        Returns
+        -------
+        int or None
+            Time step, not before the given one, at which the observer is
+            next due, or None if it will not be due again.
+        """
+        return time
+
+    def records(self):
+        """Get the data collected by this observer.
+
+        Returns
+        -------
+        pandas.DataFrame
+            One row per observation, with the time step in the 'time' column
+        """
+        raise NotImplementedError
+
 
 class SymptomaticTesting(Observer):
     """Symptomatic cases are tested.
 
     All symptomatic persons, who became infected the previous time step,
-    are given a given disease test.
+    are given a given disease test. They are found from the
+    :class:`simsurveillance.IncidenceIndex` of the model, so the cost is
+    proportional to the number of new cases.
+
+    The observer is only due on the days following symptomatic infections,
+    so the simulation may skip the other days. Their records, with no
+    cases, are filled in.
 
     Attributes
     ----------
@@ -99,28 +269,57 @@ class SymptomaticTesting(Observer):
         self.cases = []
 
         self.start_time = start_time
+        self._idle_since = None
 
-    def __call__(self, time):
+    def next_time(self, time):
+        if time >= self.start_time and self.model.incidence.num_new_infections(
+                time - 1, symptomatic=True) > 0:
+            return time
 
-        if time < self.start_time:
-            return
+        # No cases can be found before the next symptomatic infection
+        if self._idle_since is None:
+            self._idle_since = time
+        return None
 
-        cases = 0
+    def _fill_records(self, end_time):
+        """Record no cases at the time steps, before the given one, which
+        were skipped while the observer was not due.
+        """
+        if self._idle_since is None:
+            return
+        first = max(self._idle_since, self.start_time)
+        if self.times:
+            first = max(first, self.times[-1] + 1)
+        for time in range(first, end_time):
+            self.times.append(time)
+            self.cases.append(0)
 
-        for person in self.model.persons[InfStatus.INFECTED]:
-            if person.symptoms:
+    def __call__(self, time):
+        self._fill_records(time)
+        self._idle_since = None
 
-                if time - 1 in person.transition_history and \
-                     person.transition_history[time-1] is InfStatus.INFECTED:
+        if time < self.start_time:
+            return
 
-                    result = self.test(person)
+        # Only those infected during the previous time step, who still are
+        to_be_tested = [
+            person for person in self.model.incidence.new_infections(
+                time - 1, symptomatic=True)
+            if person.symptoms and person.status is InfStatus.INFECTED
+            and person.last_transition_time == time - 1]
 
-                    if result:
-                        cases += 1
+        cases = 0
+        if to_be_tested:
+            cases = int(np.count_nonzero(
+                self.test.test_people(to_be_tested, self.rng)))
 
         self.times.append(time)
         self.cases.append(cases)
 
+    def records(self):
+        self._fill_records(self.model.time)
+        return pandas.DataFrame({'time': self.times, 'cases': self.cases})
+
 
 class PrevalenceSurvey(Observer):
     """Random survey of the full population to see whether or not they are
@@ -134,8 +333,15 @@ class PrevalenceSurvey(Observer):
         The number of tests which were run
     num_positive : list
         The number of those tests which were positive
+    aggregate : bool
+        Whether to draw the test results from the number of persons of each
+        status, rather than testing individual persons. The number of truly
+        positive persons sampled is hypergeometric, and the number of
+        positive tests binomial, which is the same distribution as testing
+        a random sample of persons, at a cost independent of the number of
+        tests.
     """
-    def __init__(self, model, test, test_days, num_tests):
+    def __init__(self, model, test, test_days, num_tests, aggregate=None):
         """
         Parameters
         ----------
@@ -145,6 +351,10 @@ class PrevalenceSurvey(Observer):
             Which simulation time steps at which to test
         num_tests : list of int
             Number of population to test at each test time step
+        aggregate : bool, optional (None)
+            Whether to draw the test results from the number of persons of
+            each status. By default, only for models without individual
+            persons, such as simsurveillance.SIRSStochasticCountModel.
         """
         super().__init__(model)
 
@@ -153,28 +363,84 @@ class PrevalenceSurvey(Observer):
         self.test_days = test_days
         self.num_tests = num_tests
 
+        # Number of tests on each test day, and the sorted test days
+        self._tests_by_day = dict()
+        for day, num in zip(test_days, num_tests):
+            self._tests_by_day.setdefault(day, num)
+        self._sorted_days = sorted(self._tests_by_day)
+
         self.times = []
         self.num_tested = []
         self.num_positive = []
 
+        if aggregate is None:
+            aggregate = not hasattr(model, 'all_persons')
+        self.aggregate = aggregate
+
+    def next_time(self, time):
+        i = bisect.bisect_left(self._sorted_days, time)
+        if i == len(self._sorted_days):
+            return None
+        return self._sorted_days[i]
+
     def __call__(self, time):
-        if time in self.test_days:
-            idx = self.test_days.index(time)
-            num_to_test_today = self.num_tests[idx]
+        num_to_test_today = self._tests_by_day.get(time)
+        if num_to_test_today is not None:
+
+            if self.aggregate:
+                num_positive = self._aggregate_survey(num_to_test_today)
 
-            to_be_tested = \
-                self.model.all_persons.random_people(num_to_test_today)
+            elif hasattr(self.model, 'population'):
+                # Test the statuses of an array-backed population directly
+                agent_ids = self.model.all_persons.random_agent_ids(
+                    num_to_test_today, self.rng)
+                num_positive = int(np.count_nonzero(self.test.test_statuses(
+                    self.model.population.status[agent_ids], self.rng)))
 
-            num_positive = 0
-            for p in to_be_tested:
-                result = self.test(p)
-                if result:
-                    num_positive += 1
+            else:
+                to_be_tested = self.model.all_persons.random_people(
+                    num_to_test_today, self.rng)
+
+                num_positive = int(np.count_nonzero(
+                    self.test.test_people(to_be_tested, self.rng)))
 
             self.times.append(time)
             self.num_tested.append(num_to_test_today)
             self.num_positive.append(num_positive)
 
+    def records(self):
+        return pandas.DataFrame({'time': self.times,
+                                 'num_tested': self.num_tested,
+                                 'num_positive': self.num_positive})
+
+    def _aggregate_survey(self, num_to_test):
+        """Draw the number of positive tests from the status counts.
+
+        The number of truly positive persons in the sample is hypergeometric,
+        and the number of them, and of the truly negative, testing positive
+        are binomial.
+
+        Parameters
+        ----------
+        num_to_test : int
+            Number of persons tested
+
+        Returns
+        -------
+        int
+            Number of positive tests
+        """
+        num_truly_positive = sum(
+            self.model.counts[status] for status in self.test.positive_states)
+        num_truly_negative = self.model.N - num_truly_positive
+
+        sampled_positive = self.rng.hypergeometric(
+            num_truly_positive, num_truly_negative, num_to_test)
+        sampled_negative = num_to_test - sampled_positive
+
+        return self.test.test_counts(
+            sampled_positive, sampled_negative, self.rng)
+
     def uncertainty(self):
         """Compute posterior estimates of prevalence.
 
@@ -196,3 +462,28 @@ class PrevalenceSurvey(Observer):
             beta_dists.append(posterior)
 
         return beta_dists
+
+
+def statistic_columns(records):
+    """Columns of the records of an observer used as summary statistics,
+    when simulations are compared with observed data.
+
+    These are ``num_positive`` for a :class:`PrevalenceSurvey`, ``cases``
+    for a :class:`SymptomaticTesting`, and otherwise all columns but the
+    time.
+
+    Parameters
+    ----------
+    records : pandas.DataFrame
+        Records of an observer
+
+    Returns
+    -------
+    list of str
+        Names of the columns
+    """
+    if 'num_positive' in records:
+        return ['num_positive']
+    if 'cases' in records:
+        return ['cases']
+    return [c for c in records.columns if c != 'time']
@@ -0,0 +1,328 @@
+"""Sequential Monte Carlo filtering of an epidemic from daily surveillance.
+"""
+
+import collections
+import time
+import numpy as np
+import scipy.special
+import scipy.stats
+import simsurveillance as se
+
+
+FilterStep = collections.namedtuple(
+    'FilterStep',
+    ['time', 'log_likelihood', 'effective_sample_size', 'resampled',
+     'mean_counts', 'mean_parameters', 'elapsed'])
+FilterStep.__doc__ = """One daily update of a :class:`ParticleFilter`.
+
+Attributes
+----------
+time : int
+    Time step reached by the update
+log_likelihood : float
+    Log-likelihood of the day's data given the previous data, estimated
+    from the particles
+effective_sample_size : float
+    Effective sample size of the weighted particles, before resampling
+resampled : bool
+    Whether the particles were resampled
+mean_counts : numpy.ndarray
+    Weighted mean number of susceptible, infected and recovered persons
+mean_parameters : numpy.ndarray
+    Weighted mean transmission, recovery and waning rates
+elapsed : float
+    Time taken by the update, in seconds
+"""
+
+
+class ParticleFilter:
+    """Bootstrap particle filter of a stochastic SIRS epidemic, observed by
+    prevalence surveys and symptomatic testing.
+
+    Each particle is a lightweight state: the number of susceptible,
+    infected and recovered persons, and the transmission, recovery and
+    waning rates. All particles are advanced together, one time step at a
+    time, by a chain binomial approximation of the agent based model, in
+    which
+
+    - new infections are ``Binomial(S, 1 - exp(-transmission_rate * I / N))``
+    - recoveries are ``Binomial(I, 1 - exp(-recovery_rate))``
+    - waning immunities are ``Binomial(R, 1 - exp(-waning_rate))``
+
+    so the cost of an update is proportional to the number of particles and
+    independent of the population size.
+
+    After each step the particles are weighted by the likelihood of the
+    day's data, using the sensitivity and specificity of the tests:
+
+    - the positive tests of a :class:`simsurveillance.PrevalenceSurvey` are
+      ``Binomial(num_tested, q)``, where q is the
+      :meth:`simsurveillance.DiseaseTest.positive_probability` of the
+      prevalence ``I / N``
+    - the cases of a :class:`simsurveillance.SymptomaticTesting` are
+      ``Binomial(new_infections, proportion_symptomatic * sensitivity)``,
+      counting the infections of the previous time step
+
+    and resampled, by systematic resampling, whenever the effective sample
+    size drops below a fraction of the number of particles. Unknown rates
+    may be given one value per particle, for example drawn from a prior;
+    they are then perturbed by a small multiplicative random walk at each
+    resampling, so that they do not collapse onto a few values.
+
+    Attributes
+    ----------
+    N : int
+        Total number of persons
+    time : int
+        Time step of the current particles
+    counts : numpy.ndarray
+        Number of susceptible, infected and recovered persons of each
+        particle, of shape (num_particles, 3)
+    parameters : numpy.ndarray
+        Transmission, recovery and waning rates of each particle, of shape
+        (num_particles, 3)
+    log_weights : numpy.ndarray
+        Normalised log-weight of each particle
+    survey_test : simsurveillance.DiseaseTest
+        Test of the prevalence surveys
+    case_test : simsurveillance.DiseaseTest
+        Test of the symptomatic cases
+    proportion_symptomatic : float
+        Probability that an infection is symptomatic
+    jitter : float
+        Standard deviation of the random walk on the logarithm of the rates
+        at each resampling
+    resample_threshold : float
+        Fraction of the number of particles below which the effective sample
+        size triggers resampling
+    log_likelihood : float
+        Log-likelihood of all the data so far, estimated from the particles
+    history : list of simsurveillance.FilterStep
+        Record of every update
+    rng : numpy.random.Generator
+        Random generator of the filter
+    """
+    def __init__(self, N, initial_infected, parameters, num_particles=1000,
+                 survey_test=None, case_test=None, proportion_symptomatic=None,
+                 jitter=0.0, resample_threshold=0.5, seed=1234):
+        """
+        Parameters
+        ----------
+        N : int
+            Total number of persons
+        initial_infected : int
+            Number of infected persons at time 0, the others being
+            susceptible.
+        parameters : list or numpy.ndarray
+            Transmission, recovery and waning rates, shared by all particles,
+            or of shape (num_particles, 3), one for each particle.
+        num_particles : int, optional (1000)
+            Number of particles
+        survey_test : simsurveillance.DiseaseTest, optional (None)
+            Test of the prevalence surveys. By default, a perfect test.
+        case_test : simsurveillance.DiseaseTest, optional (None)
+            Test of the symptomatic cases. By default, a perfect test.
+        proportion_symptomatic : float, optional (None)
+            Probability that an infection is symptomatic. By default, the
+            default parameter of the agent based model.
+        jitter : float, optional (0.0)
+            Standard deviation of the random walk on the logarithm of the
+            rates at each resampling
+        resample_threshold : float, optional (0.5)
+            Fraction of the number of particles below which the effective
+            sample size triggers resampling
+        seed : int, optional (1234)
+            Random seed
+        """
+        self.N = N
+        self.time = 0
+
+        self.counts = np.zeros((num_particles, 3), dtype=np.int64)
+        self.counts[:, 0] = N - initial_infected
+        self.counts[:, 1] = initial_infected
+
+        self.parameters = np.array(np.broadcast_to(
+            np.asarray(parameters, dtype=float), (num_particles, 3)))
+        self.log_weights = np.full(num_particles, -np.log(num_particles))
+
+        self.survey_test = survey_test or se.DiseaseTest()
+        self.case_test = case_test or se.DiseaseTest()
+        if proportion_symptomatic is None:
+            proportion_symptomatic = \
+                se.ModelParameters().proportion_symptomatic
+        self.proportion_symptomatic = proportion_symptomatic
+
+        self.jitter = jitter
+        self.resample_threshold = resample_threshold
+        self.log_likelihood = 0.0
+        self.history = []
+        self.rng = np.random.default_rng(seed)
+
+    @property
+    def num_particles(self):
+        """Number of particles.
+        """
+        return len(self.counts)
+
+    @property
+    def weights(self):
+        """Normalised weight of each particle.
+        """
+        return np.exp(self.log_weights)
+
+    def _propagate(self):
+        """Advance all particles by one time step.
+
+        Returns
+        -------
+        numpy.ndarray
+            Number of new infections of each particle
+        """
+        S, I, R = self.counts.T
+        transmission_rate, recovery_rate, waning_rate = self.parameters.T
+
+        infections = self.rng.binomial(
+            S, -np.expm1(-transmission_rate * I / self.N))
+        recoveries = self.rng.binomial(I, -np.expm1(-recovery_rate))
+        wanings = self.rng.binomial(R, -np.expm1(-waning_rate))
+
+        self.counts += np.column_stack((
+            wanings - infections, infections - recoveries,
+            recoveries - wanings))
+        return infections
+
+    def _log_likelihoods(self, day_data, infections):
+        """Log-likelihood of the day's data under each particle.
+        """
+        log_likelihoods = np.zeros(self.num_particles)
+        if day_data is None:
+            return log_likelihoods
+
+        if 'num_positive' in day_data:
+            q = self.survey_test.positive_probability(
+                self.counts[:, 1] / self.N)
+            log_likelihoods += scipy.stats.binom.logpmf(
+                day_data['num_positive'], day_data['num_tested'], q)
+
+        if 'cases' in day_data:
+            log_likelihoods += scipy.stats.binom.logpmf(
+                day_data['cases'], infections,
+                self.proportion_symptomatic * self.case_test.sensitivity)
+
+        return log_likelihoods
+
+    def _resample(self):
+        """Systematic resampling, followed by the jitter of the rates.
+        """
+        n = self.num_particles
+        positions = (self.rng.random() + np.arange(n)) / n
+        cumulative = np.cumsum(self.weights)
+        cumulative[-1] = 1.0
+        indices = np.searchsorted(cumulative, positions)
+
+        self.counts = self.counts[indices]
+        self.parameters = self.parameters[indices]
+        self.log_weights = np.full(n, -np.log(n))
+
+        if self.jitter > 0:
+            self.parameters *= np.exp(
+                self.jitter * self.rng.standard_normal(self.parameters.shape))
+
+    def update(self, day_data=None):
+        """Advance the particles to the next time step, and assimilate its
+        data.
+
+        Parameters
+        ----------
+        day_data : dict, optional (None)
+            Data of the next time step, with any of the keys
+            ``num_tested`` and ``num_positive`` of a prevalence survey, and
+            ``cases`` of symptomatic testing, such as a row of the records
+            of those observers. If None, the particles are only advanced.
+
+        Returns
+        -------
+        simsurveillance.FilterStep
+            Summary of the update
+        """
+        start = time.perf_counter()
+
+        infections = self._propagate()
+        self.time += 1
+
+        log_likelihoods = self._log_likelihoods(day_data, infections)
+        log_weights = self.log_weights + log_likelihoods
+        log_increment = scipy.special.logsumexp(log_weights)
+
+        # If no particle can explain the data, the previous weights are kept,
+        # so that the filter can recover from an outlying observation.
+        if np.isfinite(log_increment):
+            self.log_weights = log_weights - log_increment
+        self.log_likelihood += log_increment
+
+        ess = 1 / np.sum(self.weights ** 2)
+        resampled = ess < self.resample_threshold * self.num_particles
+        weights = self.weights
+        mean_counts = weights @ self.counts
+        mean_parameters = weights @ self.parameters
+        if resampled:
+            self._resample()
+
+        step = FilterStep(self.time, float(log_increment), float(ess),
+                          bool(resampled), mean_counts, mean_parameters,
+                          time.perf_counter() - start)
+        self.history.append(step)
+        return step
+
+    def filter_records(self, end_time, prevalence=None, cases=None):
+        """Update the filter with the records of observers, up to a time.
+
+        Parameters
+        ----------
+        end_time : int
+            Time step to which the filter is advanced
+        prevalence : pandas.DataFrame, optional (None)
+            Records of a simsurveillance.PrevalenceSurvey
+        cases : pandas.DataFrame, optional (None)
+            Records of a simsurveillance.SymptomaticTesting
+
+        Returns
+        -------
+        list of simsurveillance.FilterStep
+            Summary of each update
+        """
+        data = collections.defaultdict(dict)
+        for records in (prevalence, cases):
+            if records is None:
+                continue
+            for row in records.to_dict('records'):
+                day = data[int(row.pop('time'))]
+                day.update(row)
+
+        return [self.update(data.get(self.time + 1))
+                for _ in range(self.time, end_time)]
+
+    def quantiles(self, q):
+        """Weighted quantiles of the counts and rates of the particles.
+
+        Parameters
+        ----------
+        q : list of float
+            Quantiles, between 0 and 1
+
+        Returns
+        -------
+        numpy.ndarray
+            Quantiles of the numbers of susceptible, infected and recovered
+            persons, then of the transmission, recovery and waning rates, of
+            shape (len(q), 6)
+        """
+        values = np.column_stack((self.counts, self.parameters))
+        quantiles = np.empty((len(q), values.shape[1]))
+        for j, column in enumerate(values.T):
+            order = np.argsort(column, kind='stable')
+            cumulative = np.cumsum(self.weights[order])
+            indices = np.minimum(np.searchsorted(cumulative, q),
+                                 len(column) - 1)
+            quantiles[:, j] = column[order][indices]
+        return quantiles
@@ -0,0 +1,140 @@
+"""Array-backed storage of the persons in an agent based model.
+"""
+
+import numpy as np
+import simsurveillance as se
+from simsurveillance import InfectionStatus
+
+
+class ArrayPopulation:
+    """Struct-of-arrays storage of all the persons in an agent based model.
+
+    Rather than holding one :class:`simsurveillance.Person` object per
+    agent, the state of each person is stored in NumPy arrays indexed by an
+    integer agent id. Individual persons are accessed through
+    :class:`simsurveillance.AgentView` objects.
+
+    Attributes
+    ----------
+    model : simsurveillance.AgentModel
+        Model to which these persons are attached
+    N : int
+        Number of persons
+    id_dtype : numpy.dtype
+        Integer type used to store agent ids
+    status : numpy.ndarray
+        Value of the current simsurveillance.InfectionStatus of each person
+    symptoms : numpy.ndarray
+        Whether or not each person has symptoms
+    next_transition : numpy.ndarray
+        Time step of the next scheduled status change of each person, or -1
+        if none is scheduled.
+    last_transition : numpy.ndarray
+        Time step of the most recent status change of each person, or -1 if
+        they are still in their initial status.
+    persons : dict
+        Holds persons of each status, in a
+        simsurveillance.ArrayPersonCollection for each infection status.
+    all_persons : simsurveillance.ArrayPersonCollection
+        Holds all the persons, regardless of the infection status.
+    event_log : simsurveillance.EventLog or None
+        Log in which status changes are recorded, if any
+    """
+    def __init__(self, model, N, event_log=None):
+        """
+        Parameters
+        ----------
+        model : simsurveillance.AgentModel
+            Model to which these persons are attached
+        N : int
+            Number of persons, who all start susceptible
+        event_log : simsurveillance.EventLog, optional (None)
+            Log in which to record status changes
+        """
+        self.model = model
+        self.N = N
+        self.event_log = event_log
+        self.id_dtype = np.int32 if N < np.iinfo(np.int32).max \
+            else np.int64
+
+        self.status = np.full(
+            N, InfectionStatus.SUSCEPTIBLE.value, dtype=np.int8)
+        self.symptoms = np.zeros(N, dtype=bool)
+        self.next_transition = np.full(N, -1, dtype=np.int64)
+        self.last_transition = np.full(N, -1, dtype=np.int64)
+
+        everyone = np.arange(N)
+        self.persons = {
+            status: se.ArrayPersonCollection(
+                self,
+                everyone if status is InfectionStatus.SUSCEPTIBLE else ())
+            for status in InfectionStatus
+        }
+        self.all_persons = se.ArrayPersonCollection(self, everyone)
+
+    def person(self, agent_id):
+        """Get one person of the population.
+
+        Parameters
+        ----------
+        agent_id : int
+            Index of the person
+
+        Returns
+        -------
+        simsurveillance.AgentView
+            The person
+        """
+        return se.AgentView(self, agent_id)
+
+    def update_status(self, agent_id, new_status, time):
+        """Change the infection status of one person.
+
+        Parameters
+        ----------
+        agent_id : int
+            Index of the person
+        new_status : simsurveillance.InfectionStatus
+            New status to switch to
+        time : int
+            Time step of the change
+        """
+        old_status = InfectionStatus(self.status[agent_id])
+        self.persons[old_status]._remove_id(agent_id)
+        self.persons[new_status]._add_id(agent_id)
+        self.status[agent_id] = new_status.value
+        self.last_transition[agent_id] = time
+        self.next_transition[agent_id] = -1
+
+        if self.event_log is not None:
+            self.event_log.record(agent_id, new_status, time)
+
+    def update_status_many(self, agent_ids, new_status, time):
+        """Change the infection status of many persons at once.
+
+        Parameters
+        ----------
+        agent_ids : sequence of int
+            Distinct indices of the persons
+        new_status : simsurveillance.InfectionStatus
+            New status to switch to
+        time : int
+            Time step of the change
+        """
+        agent_ids = np.asarray(agent_ids, dtype=self.id_dtype)
+        old_status = self.status[agent_ids]
+
+        # Move the persons of each old status in turn, as
+        # simsurveillance.SIRSAgentModel.update_statuses does
+        for status in InfectionStatus:
+            moving = agent_ids[old_status == status.value]
+            if len(moving):
+                self.persons[status]._remove_ids(moving)
+                self.persons[new_status]._add_ids(moving)
+
+        self.status[agent_ids] = new_status.value
+        self.last_transition[agent_ids] = time
+        self.next_transition[agent_ids] = -1
+
+        if self.event_log is not None:
+            self.event_log.record_many(agent_ids, new_status, time)
@@ -0,0 +1,192 @@
+"""Scheduling of future events in an agent based model.
+"""
+
+import heapq
+import numpy as np
+
+
+class EventScheduler:
+    """Calendar queue of events at integer time steps.
+
+    Each event is an item, usually a person, due at a time step. Events due
+    at the same time step are held together in one bucket, and a heap of the
+    occupied time steps gives the next non-empty bucket. Buckets are
+    discarded as soon as they are drained or emptied, and each time step is
+    held at most once in the heap, so memory does not grow with repeated
+    scheduling and cancelling of events.
+
+    Each item has at most one pending event. Scheduling an item which
+    already has an event moves that event to the new time.
+    """
+    def __init__(self):
+        """Initialize an empty scheduler.
+        """
+        self._buckets = dict()
+        self._event_times = dict()
+        self._heap = []
+        self._heap_times = set()
+
+    def schedule(self, item, time):
+        """Schedule an event.
+
+        Parameters
+        ----------
+        item : object
+            Item, such as a simsurveillance.Person, to which the event
+            happens
+        time : int
+            Time step at which the event is due
+        """
+        if item in self._event_times:
+            self.cancel(item)
+
+        bucket = self._buckets.get(time)
+        if bucket is None:
+            bucket = self._buckets[time] = dict()
+            self._push_time(time)
+
+        bucket[item] = None
+        self._event_times[item] = time
+
+    def schedule_many(self, items, times):
+        """Schedule the events of many items at once.
+
+        Equivalent to calling :meth:`schedule` for each item in turn, but
+        the items are grouped by time step and each bucket is filled in one
+        operation.
+
+        Parameters
+        ----------
+        items : sequence
+            Distinct items to which the events happen
+        times : sequence of int
+            Time step at which the event of each item is due
+        """
+        items = list(items)
+        times = np.asarray(times, dtype=np.int64)
+        if len(items) != len(times):
+            raise ValueError('Each item requires one time step')
+        if not items:
+            return
+
+        for item in self._event_times.keys() & items:
+            self.cancel(item)
+
+        # Stable sort so that items keep their order within each bucket
+        order = np.argsort(times, kind='stable')
+        sorted_times = times[order]
+        group_starts = np.flatnonzero(
+            np.diff(sorted_times, prepend=sorted_times[0] - 1))
+        group_ends = np.append(group_starts[1:], len(items))
+
+        order = order.tolist()
+        for start, end, time in zip(group_starts.tolist(),
+                                    group_ends.tolist(),
+                                    sorted_times[group_starts].tolist()):
+            group = dict.fromkeys([items[i] for i in order[start:end]])
+
+            bucket = self._buckets.get(time)
+            if bucket is None:
+                self._buckets[time] = group
+                self._push_time(time)
+            else:
+                bucket.update(group)
+
+            self._event_times.update(dict.fromkeys(group, time))
+
+    def cancel(self, item):
+        """Cancel the pending event of an item.
+
+        Parameters
+        ----------
+        item : object
+            Item whose event is cancelled
+
+        Returns
+        -------
+        bool
+            Whether the item had a pending event
+        """
+        time = self._event_times.pop(item, None)
+        if time is None:
+            return False
+
+        bucket = self._buckets[time]
+        del bucket[item]
+        if not bucket:
+            del self._buckets[time]
+        return True
+
+    def pop_due(self, time):
+        """Remove and return all events due at a time step.
+
+        Parameters
+        ----------
+        time : int
+            Time step
+
+        Returns
+        -------
+        list
+            Items whose events were due, in the order they were scheduled
+        """
+        bucket = self._buckets.pop(time, None)
+        if bucket is None:
+            return []
+
+        for item in bucket:
+            del self._event_times[item]
+        self._discard_stale_times()
+        return list(bucket)
+
+    def next_time(self):
+        """Get the earliest time step at which any event is due.
+
+        Returns
+        -------
+        int or None
+            Time step of the next event, or None if there are no pending
+            events.
+        """
+        self._discard_stale_times()
+
+        if self._heap:
+            return self._heap[0]
+        return None
+
+    def _push_time(self, time):
+        """Add a time step to the heap, unless it is already held there.
+
+        A bucket emptied by :meth:`cancel` leaves its time in the heap, so
+        recreating the bucket must not push the time again.
+        """
+        if time not in self._heap_times:
+            self._heap_times.add(time)
+            heapq.heappush(self._heap, time)
+
+    def _discard_stale_times(self):
+        """Drop times without a bucket from the top of the heap.
+        """
+        while self._heap and self._heap[0] not in self._buckets:
+            self._heap_times.discard(heapq.heappop(self._heap))
+
+    def time_of(self, item):
+        """Get the time step of the pending event of an item.
+
+        Parameters
+        ----------
+        item : object
+            Item with a pending event
+
+        Returns
+        -------
+        int
+            Time step at which the event is due
+        """
+        return self._event_times[item]
+
+    def __len__(self):
+        return len(self._event_times)
+
+    def __contains__(self, item):
+        return item in self._event_times
@@ -0,0 +1,30 @@
+"""Seeds of independent simulations.
+"""
+
+import numpy as np
+
+
+def spawn_seeds(seed, num_seeds):
+    """Spawn the seeds of independent simulations from one seed.
+
+    The seeds are drawn in order from the children of one
+    numpy.random.SeedSequence, so each simulation gets the same seed
+    whichever process runs it, and results do not depend on the number of
+    worker processes.
+
+    Parameters
+    ----------
+    seed : int or numpy.random.SeedSequence
+        Seed from which the seeds are spawned. A SeedSequence remembers the
+        children it spawned, so calling again with it gives new seeds.
+    num_seeds : int
+        Number of seeds
+
+    Returns
+    -------
+    list of int
+        Seed of each simulation
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return [int(s.generate_state(1)[0]) for s in seed.spawn(num_seeds)]
@@ -0,0 +1,442 @@
+"""Simulating very large populations in shards, across worker processes.
+"""
+
+import multiprocessing
+import traceback
+import numpy as np
+import pandas
+import simsurveillance as se
+from simsurveillance import InfectionStatus as InfStatus
+
+
+class ShardTransmissionStep(se.TransmissionStep):
+    """Infects the susceptible persons of one shard of a population, from
+    the number of infectious persons in the whole population.
+
+    In the batched :class:`simsurveillance.TransmissionStep`, each
+    susceptible person receives a Poisson number of contacts with mean
+    ``transmission_rate * I / N``, and is infected if they receive at least
+    one. The persons are therefore infected independently of each other,
+    and the number infected in a shard holding S of the susceptible persons
+    is ``Binomial(S, 1 - exp(-transmission_rate * I / N))``, where I and N
+    are the number infectious and the size of the whole population. This
+    step draws that number with :meth:`draw_number_infected`, and infects
+    randomly chosen susceptible persons of its shard.
+
+    Attributes
+    ----------
+    num_infectious : int
+        Number of infectious persons in the whole population, at the start
+        of the time step, set by the coordinator of the shards.
+    population_size : int
+        Number of persons in the whole population
+    """
+    def __init__(self, model, population_size):
+        super().__init__(model)
+        self.num_infectious = 0
+        self.population_size = population_size
+
+    def __call__(self, time):
+        num_susceptible = len(self.model.persons[InfStatus.SUSCEPTIBLE])
+
+        num_to_infect = self.draw_number_infected(
+            self.rng, num_susceptible,
+            self.model.params.transmission_rate * self.num_infectious
+            / self.population_size)
+
+        persons_to_infect = self.model.persons[InfStatus.SUSCEPTIBLE]\
+            .random_people(num_to_infect, self.rng)
+        self.model.infect_people(persons_to_infect, time)
+        self.num_infected = num_to_infect
+
+    def next_time(self, time):
+        # Whether transmission is possible depends on the whole population,
+        # so it is decided by the coordinator.
+        return None
+
+
+class ShardedSIRSModel(se.SteppedModel):
+    """Stochastic agent based model of SIRS, with the population split
+    into shards simulated by worker processes.
+
+    Transmission depends on the rest of the population only through the
+    number of infectious persons, so each shard is a
+    :class:`simsurveillance.SIRSArrayAgentModel` of a slice of the
+    population, with its own transitions scheduler, in which a
+    :class:`ShardTransmissionStep` replaces the transmission step. Each
+    worker process owns some of the shards. At every time step, the
+    coordinator broadcasts the number infectious in the whole population,
+    each worker advances its shards by one time step, and replies with the
+    number of persons of each status, so only a few numbers are exchanged.
+
+    Every person is infected, recovers and loses immunity with the same
+    probabilities as in :class:`simsurveillance.SIRSAgentModel`, so the
+    model is statistically equivalent to it, although the random draws
+    differ. Each shard has its own seed, spawned from the model seed by
+    :func:`simsurveillance.spawn_seeds`.
+
+    There are two kinds of observers:
+
+    - observers of the whole population, added by :meth:`add_observers`,
+      are called by the coordinator, and may only use the number of persons
+      of each status, as does a :class:`simsurveillance.PrevalenceSurvey`,
+      which draws its results from them by default
+    - observers of the shards, added by :meth:`add_shard_observers` as
+      factories, are created in every shard, and their records are summed
+      over the shards at each time, as for the cases of
+      :class:`simsurveillance.SymptomaticTesting`
+
+    The shards are created, with the parameters of the model, when the
+    infection is initialized or the model is first simulated. The worker
+    processes are kept until :meth:`close` is called, so a model may be
+    simulated in stages. With the default 'fork' start method of Linux, the
+    observer factories are inherited by the workers, elsewhere they must be
+    picklable, for example functions defined at module level.
+
+    Attributes
+    ----------
+    N : int
+        Total number of persons
+    num_shards : int
+        Number of shards of the population
+    num_workers : int
+        Number of worker processes. If 1, the shards are simulated in this
+        process.
+    params : simsurveillance.ModelParameters
+        Storing parameter values
+    counts : dict
+        Number of persons of each infection status in the whole population
+    observers : list of simsurveillance.Observer
+        Observers of the whole population
+    shard_observer_factories : list of callable
+        Called with the model of each shard, return a new observer of it.
+    time : int
+        Next time step to simulate
+    num_infected : int
+        Number infected during the most recent time step
+    rng : numpy.random.Generator
+        Random generator of the coordinator
+    """
+    def __init__(self, N, num_shards=None, num_workers=None, seed=1234):
+        """
+        Parameters
+        ----------
+        N : int
+            Total number of persons to simulate.
+        num_shards : int, optional (None)
+            Number of shards of the population. By default, one per worker.
+        num_workers : int, optional (None)
+            Number of worker processes. By default, one per CPU. If 1, the
+            shards are simulated in this process.
+        seed : int, optional (1234)
+            Random seed, from which the seeds of the shards and of the
+            observers are derived.
+        """
+        if num_workers is None:
+            num_workers = multiprocessing.cpu_count()
+        if num_shards is None:
+            num_shards = num_workers
+        if num_shards < num_workers:
+            raise ValueError('Each worker process must own at least one '
+                             'shard.')
+
+        super().__init__(seed)
+
+        self.N = N
+        self.num_shards = num_shards
+        self.num_workers = num_workers
+        self.params = se.ModelParameters()
+        self.counts = {status: 0 for status in InfStatus}
+        self.counts[InfStatus.SUSCEPTIBLE] = N
+        self.shard_observer_factories = []
+        self.num_infected = 0
+
+        self._shard_seeds = se.spawn_seeds(
+            self.seed_sequences['simulation'], num_shards)
+
+        self._shard_sizes = [N // num_shards + (i < N % num_shards)
+                             for i in range(num_shards)]
+        self._shard_counts = np.zeros((num_shards, 3), dtype=np.int64)
+        self._shard_counts[:, 0] = self._shard_sizes
+        self._shard_next_times = [None] * num_shards
+        self._groups = None
+        self._workers = None
+        self._closed = False
+        self._final_records = None
+
+    def add_shard_observers(self, *factories):
+        """Add observation processes of every shard.
+
+        Parameters
+        ----------
+        factories : callable
+            Each is called with the model of each shard, and returns a new
+            observer of it, whose records can be summed over the shards.
+        """
+        if self._groups is not None:
+            raise RuntimeError('Shard observers must be added before the '
+                               'shards are created.')
+        self.shard_observer_factories.extend(factories)
+
+    def shard_seeds(self):
+        """Get the seed of each shard.
+
+        Returns
+        -------
+        list of int
+            Seed of the model of each shard
+        """
+        return list(self._shard_seeds)
+
+    def _start(self):
+        """Create the shards, in worker processes if there are several.
+        """
+        if self._closed:
+            raise RuntimeError('The shards have been closed.')
+        if self._groups is not None:
+            return
+
+        specs = [(size, seed, dict(vars(self.params)), self.N,
+                  self.shard_observer_factories)
+                 for size, seed in zip(self._shard_sizes, self.shard_seeds())]
+        self._groups = [
+            (indices.tolist(), [specs[i] for i in indices]) for indices in
+            np.array_split(np.arange(self.num_shards), self.num_workers)]
+
+        if self.num_workers == 1:
+            self._groups = [_ShardGroup(*group) for group in self._groups]
+        else:
+            self._workers = [_Worker(*group) for group in self._groups]
+
+    def _call(self, method, *args):
+        """Call a method of every group of shards, and gather the result
+        of each shard, in order.
+        """
+        self._start()
+        if self._workers is None:
+            results = [getattr(group, method)(*args)
+                       for group in self._groups]
+        else:
+            for worker in self._workers:
+                worker.send(method, args)
+            results = [worker.receive() for worker in self._workers]
+        return [result for group in results for result in group]
+
+    def _update_counts(self):
+        for status, count in zip(InfStatus, self._shard_counts.sum(axis=0)):
+            self.counts[status] = int(count)
+
+    def initialize_infection(self, num_infect, time=0):
+        """Start an infection with the given number of infect, randomly
+        selected, from amongst the susceptible of the whole population.
+
+        Parameters
+        ----------
+        num_infect : int
+            Number to infect
+        time : int, optional (0)
+            Time step.
+        """
+        self._start()
+
+        # The number infected in each shard is multivariate hypergeometric,
+        # as for a random selection of the whole population.
+        allocation = self.rng.multivariate_hypergeometric(
+            self._shard_counts[:, 0], num_infect)
+        self._shard_counts[:] = self._call(
+            'initialize_infection', allocation, time)
+        self._update_counts()
+        self.num_infected += num_infect
+
+    def _next_time(self, time):
+        """Get the earliest time step, not before the given one, at which
+        any shard or observer is due.
+        """
+        next_times = list(self._shard_next_times) + \
+            [observer.next_time(time) for observer in self.observers]
+        if self.counts[InfStatus.INFECTED] > 0 and \
+                self.counts[InfStatus.SUSCEPTIBLE] > 0 and \
+                self.params.transmission_rate > 0:
+            next_times.append(time)
+        return min((t for t in next_times if t is not None), default=None)
+
+    def _record_output(self, output, time):
+        """Record simulation outputs at a time step.
+        """
+        output['time'].append(time)
+        for status in InfStatus:
+            output[status].append(self.counts[status])
+        output['transmissions'].append(self.num_infected)
+
+    def _advance(self, time):
+        results = self._call(
+            'advance', time, self.counts[InfStatus.INFECTED])
+        counts, num_infected, self._shard_next_times = zip(*results)
+        self._shard_counts[:] = counts
+        self._update_counts()
+        self.num_infected = sum(num_infected)
+
+    def _clear_transmissions(self):
+        self.num_infected = 0
+
+    def shard_records(self):
+        """Get the data collected by the observers of the shards.
+
+        Returns
+        -------
+        list of pandas.DataFrame
+            Records of the observers made by each factory, summed over the
+            shards at each time.
+        """
+        if self._final_records is not None:
+            return self._final_records
+        if self._groups is None:
+            return [pandas.DataFrame() for _ in self.shard_observer_factories]
+
+        by_shard = self._call('records', self.time)
+        merged = []
+        for i in range(len(self.shard_observer_factories)):
+            records = pandas.concat([shard[i] for shard in by_shard])
+            merged.append(records.groupby('time', as_index=False).sum())
+        return merged
+
+    def close(self):
+        """Stop the worker processes.
+
+        The records of the observers of the shards are gathered first, and
+        remain available from :meth:`shard_records`, but the model cannot be
+        simulated further.
+        """
+        if self._closed:
+            return
+        try:
+            self._final_records = self.shard_records()
+        except RuntimeError:
+            # The records of failed workers are lost
+            pass
+
+        if self._workers is not None:
+            for worker in self._workers:
+                worker.close()
+            self._workers = None
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _ShardGroup:
+    """The shards owned by one worker process.
+    """
+    def __init__(self, indices, specs):
+        self.indices = indices
+        self.models = []
+        for size, seed, params, population_size, factories in specs:
+            model = se.SIRSArrayAgentModel(size, seed, record_events=False)
+            model.params.set_parameters(params)
+            model.transmission_step = ShardTransmissionStep(
+                model, population_size)
+            model.steps[0] = model.transmission_step
+            model.add_observers(*[factory(model) for factory in factories])
+            self.models.append(model)
+
+    @staticmethod
+    def _counts(model):
+        return [len(model.persons[status]) for status in InfStatus]
+
+    def initialize_infection(self, allocation, time):
+        for model, num_infect in zip(self.models, allocation[self.indices]):
+            model.initialize_infection(int(num_infect), time)
+        return [self._counts(model) for model in self.models]
+
+    def advance(self, time, num_infectious):
+        """Simulate one time step of every shard.
+        """
+        results = []
+        for model in self.models:
+            model.transmission_step.num_infectious = num_infectious
+            for observer in model.observers:
+                observer(time)
+            for step in model.steps:
+                step(time)
+            model.time = time + 1
+
+            results.append((self._counts(model),
+                            model.transmission_step.num_infected,
+                            model._next_time(time + 1)))
+        return results
+
+    def records(self, time):
+        # The shards are not advanced at the time steps skipped by the
+        # coordinator, up to its next time step to simulate.
+        for model in self.models:
+            model.time = max(model.time, time)
+        return [[observer.records() for observer in model.observers]
+                for model in self.models]
+
+
+class _Worker:
+    """Worker process owning a group of shards, driven through a pipe.
+    """
+    def __init__(self, indices, specs):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_serve, args=(child_connection, indices, specs),
+            daemon=True)
+        self.process.start()
+        child_connection.close()
+
+    def send(self, method, args):
+        try:
+            self.connection.send((method, args))
+        except OSError as error:
+            raise RuntimeError(
+                'A shard worker has stopped: {}'.format(error)) from error
+
+    def receive(self):
+        try:
+            status, result = self.connection.recv()
+        except (EOFError, OSError) as error:
+            raise RuntimeError('A shard worker has stopped, with exit code '
+                               '{}.'.format(self.process.exitcode)) \
+                from error
+        if status == 'error':
+            raise RuntimeError('A shard worker failed:\n' + result)
+        return result
+
+    def close(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join()
+        self.connection.close()
+
+
+def _serve(connection, indices, specs):
+    """Run the commands of the coordinator on a group of shards, until told
+    to stop.
+    """
+    try:
+        group = _ShardGroup(indices, specs)
+    except Exception:
+        group = None
+        error = traceback.format_exc()
+
+    while True:
+        command = connection.recv()
+        if command is None:
+            break
+
+        method, args = command
+        if group is None:
+            connection.send(('error', error))
+            continue
+        try:
+            connection.send(('ok', getattr(group, method)(*args)))
+        except Exception:
+            connection.send(('error', traceback.format_exc()))
+    connection.close()
@@ -4,8 +4,8 @@ These classes are used to represent the different mechanisms in
 the agent based model, simulated at each given time step.
 """
 
-import random
 import numpy as np
+import simsurveillance as se
 from simsurveillance import InfectionStatus
 
 
@@ -16,9 +16,12 @@ class ModelStep:
     ----------
     model : simsurveillance.AgentModel
         Model to which this step is attached.
+    rng : numpy.random.Generator
+        Random generator of this step, derived from the model seed.
     """
     def __init__(self, model):
         self.model = model
+        self.rng = model.spawn_rng()
 
     def __call__(self, time):
         """Run this step at the indicated time point.
@@ -30,48 +33,112 @@ class ModelStep:
         """
         raise NotImplementedError
 
+    def next_time(self, time):
+        """Get the earliest time step at which this step may change the
+        model.
+
+        The simulation skips the time steps at which no step or observer is
+        due. By default, a step is due at every time step.
+
+        Parameters
+        ----------
+        time : int
+            Time step from which to look
+
+        Returns
+        -------
+        int or None
+            Time step, not before the given one, at which the step is next
+            due, or None if it cannot change the model again.
+        """
+        return time
+
 
 class InfectionProgressionStep(ModelStep):
     """Transition persons from I to R, or from R to S.
     """
 
     def __call__(self, time):
-        for person in self.model.transitions[time]:
-
-            self.model.transitions[time].remove(person)
-
-            if person.status is InfectionStatus.INFECTED:
-                self._recover_people([person], time)
-
-            elif person.status is InfectionStatus.RECOVERED:
-                person.update_status(InfectionStatus.SUSCEPTIBLE, time)
+        # Status changes may schedule further changes for the same time
+        # step, so drain until none are left.
+        due = self.model.transitions.pop_due(time)
+        while due:
+            recovering = []
+            waning = []
+            for person in due:
+                if person.status is InfectionStatus.INFECTED:
+                    recovering.append(person)
+
+                elif person.status is InfectionStatus.RECOVERED:
+                    waning.append(person)
+
+            self._recover_people(recovering, time)
+            self.model.update_statuses(
+                waning, InfectionStatus.SUSCEPTIBLE, time)
+
+            due = self.model.transitions.pop_due(time)
+
+    def next_time(self, time):
+        next_event_time = self.model.transitions.next_time()
+        if next_event_time is None:
+            return None
+        return max(next_event_time, time)
 
     def _recover_people(self, persons, time):
         """Move the given people to the R (recovered) status.
-        """
-        for person in persons:
 
-            person.update_status(InfectionStatus.RECOVERED, time)
+        The waning times of all the people are drawn together, and
+        scheduled in one batch.
+        """
+        if not persons:
+            return
 
+        self.model.update_statuses(persons, InfectionStatus.RECOVERED, time)
+        for person in persons:
             person.symptoms = False
 
-            # Now they are Recovered.
-            # Check when they will become susceptible again (waning).
-            next_status_change = \
-                random.expovariate(self.model.params.waning_rate)
-
-            next_status_change = round(next_status_change)
+        # Now they are Recovered.
+        # Check when they will become susceptible again (waning).
+        next_status_change = self.model.draw_delays(
+            self.model.params.waning_rate, len(persons), self.rng)
 
-            self.model.transitions[time + next_status_change].append(person)
+        self.model.schedule_transitions(persons, time + next_status_change)
 
 
 class TransmissionStep(ModelStep):
     """Infects persons from S to I, based on transmission from other
     infectious.
+
+    Each infectious person infects a Poisson distributed number of the
+    susceptibles, with rate proportional to the number of susceptibles who
+    have not yet been infected during the time step.
+
+    By default, the new infections of a time step are drawn in one batch.
+    The force of infection is computed once, and every infectious person
+    makes a Poisson number of contacts with the susceptibles present at the
+    start of the time step. A contact infects its target, unless they were
+    already infected by an earlier contact, so that each infection depletes
+    the susceptibles available to the following ones. Each susceptible
+    then escapes infection independently, and the number infected is drawn
+    at once from a binomial distribution, see
+    :meth:`draw_number_infected`. The newly infected are chosen in a single
+    selection from the susceptibles.
+
+    Attributes
+    ----------
+    num_infected : int
+        Number infected during the most recent time step
+    batched : bool
+        Whether to draw the infections in one batch. If False, the
+        infections of each infectious person are drawn in turn, as in the
+        original per-infector implementation. The draws come from the
+        generator of the step, so runs made with the former global numpy
+        random state cannot be reproduced.
     """
-    def __init__(self, model):
+    def __init__(self, model, batched=True):
         super().__init__(model)
         self.num_infected = 0
+        self.batched = batched
 
     def _transmission_rate(self, num_susceptible):
         r = self.model.params.transmission_rate * num_susceptible \
@@ -79,7 +146,57 @@ class TransmissionStep(ModelStep):
         return r
 
     def _compute_number_to_infect(self, initial_rate):
-        return np.random.poisson(initial_rate)
+        return self.rng.poisson(initial_rate)
+
+    def _compute_batch_number_to_infect(self, num_infectious,
+                                        num_susceptible):
+        """Draw the total number of infections of the time step.
+
+        Parameters
+        ----------
+        num_infectious : int
+            Number of infectious persons
+        num_susceptible : int
+            Number of susceptibles at the start of the time step
+
+        Returns
+        -------
+        int
+            Number of susceptibles infected during the time step
+        """
+        return self.draw_number_infected(
+            self.rng, num_susceptible,
+            self.model.params.transmission_rate * num_infectious
+            / self.model.N)
+
+    @staticmethod
+    def draw_number_infected(rng, num_susceptible, force_of_infection):
+        """Draw the number of susceptibles infected in one time step.
+
+        Each susceptible receives a Poisson number of contacts with mean
+        the force of infection, and is infected if they receive at least
+        one, so the number infected is
+        ``Binomial(num_susceptible, 1 - exp(-force_of_infection))``.
+
+        Parameters
+        ----------
+        rng : numpy.random.Generator
+            Random generator to draw from
+        num_susceptible : int
+            Number of susceptibles at the start of the time step
+        force_of_infection : float
+            Mean number of contacts received by each susceptible, usually
+            ``transmission_rate * I / N``
+
+        Returns
+        -------
+        int
+            Number of susceptibles infected
+        """
+        if num_susceptible == 0 or force_of_infection <= 0:
+            return 0
+        return int(rng.binomial(num_susceptible,
+                                -np.expm1(-force_of_infection)))
 
     def __call__(self, time):
         num_infected_this_time_step = \
@@ -92,6 +209,40 @@ class TransmissionStep(ModelStep):
         # accessed to keep track of incidence.
         self.num_infected = 0
 
+        if not self.batched:
+            self._per_infector_transmission(
+                time,
+                num_infected_this_time_step,
+                num_susceptible_this_time_step)
+            return
+
+        if num_infected_this_time_step == 0:
+            return
+
+        num_to_infect = self._compute_batch_number_to_infect(
+            num_infected_this_time_step, num_susceptible_this_time_step)
+
+        persons_to_infect = \
+            self.model.persons[InfectionStatus.SUSCEPTIBLE]\
+                .random_people(num_to_infect, self.rng)
+
+        self.model.infect_people(persons_to_infect, time)
+
+        self.num_infected = num_to_infect
+
+    def next_time(self, time):
+        # Transmission is only possible while both infectious and
+        # susceptible persons are present.
+        if len(self.model.persons[InfectionStatus.INFECTED]) == 0 or \
+                self._transmission_rate(
+                    len(self.model.persons[InfectionStatus.SUSCEPTIBLE])) <= 0:
+            return None
+        return time
+
+    def _per_infector_transmission(self, time, num_infected_this_time_step,
+                                   num_susceptible_this_time_step):
+        """Draw the infections caused by each infectious person in turn.
+        """
         for _ in range(num_infected_this_time_step):
             rate_to_infect = \
                 self._transmission_rate(num_susceptible_this_time_step)
@@ -108,9 +259,188 @@ class TransmissionStep(ModelStep):
 
             persons_to_infect = \
                 self.model.persons[InfectionStatus.SUSCEPTIBLE]\
-                    .random_people(num_to_infect)
+                    .random_people(num_to_infect, self.rng)
 
             self.model.infect_people(persons_to_infect, time)
 
             self.num_infected += num_to_infect
             num_susceptible_this_time_step -= num_to_infect
+
+
+class CompartmentStep(ModelStep):
+    """Advance the number of persons of each status by one time step, then
+    move randomly chosen persons to match.
+
+    Used by :class:`simsurveillance.HybridSIRSModel` while the number of
+    infected persons is large, in place of the transmission and infection
+    progression steps. No individual transitions are scheduled, so the cost
+    of a time step grows only with the number of status changes, all of
+    which are made in bulk on the arrays of the
+    :class:`simsurveillance.ArrayPopulation` of the model.
+
+    With ``method='tau'``, the numbers of each status change are drawn as
+    one leap of a whole time step, with the same distribution as in the
+    agent based model:
+
+    - new infections are ``Binomial(S, 1 - exp(-transmission_rate * I / N))``,
+      the number of susceptibles reached by the contacts of the
+      :class:`TransmissionStep`
+    - recoveries are ``Binomial(I, 1 - exp(-recovery_rate))``, and waning
+      immunities ``Binomial(R, 1 - exp(-waning_rate))``, since the
+      delays of the persons who remain in a status beyond the time step of
+      their last change are geometric
+    - the newly infected or recovered persons whose delay rounds to zero
+      change status again in the same time step
+
+    With ``method='ode'``, the numbers of status changes are instead the
+    flows of the :class:`simsurveillance.SIRSModel` over the time step,
+    rounded to whole persons, so the dynamics are deterministic apart from
+    the choice of persons, the symptoms and the observers. The flows are
+    those of continuous time, in which no infection recovers within the
+    time step it began, so the epidemic grows faster than with the time
+    steps of the agent based model.
+
+    New infections are recorded in the incidence index of the model, with
+    their symptoms, and all status changes in its event log, so the
+    observers are unaffected by the representation.
+
+    Attributes
+    ----------
+    method : str
+        'tau' for binomial leaps, or 'ode' for the differential equation
+        model
+    """
+    def __init__(self, model, method='tau'):
+        super().__init__(model)
+        if method not in ('tau', 'ode'):
+            raise ValueError('Unknown compartment method {}'.format(method))
+        self.method = method
+        self._ode_model = se.SIRSModel(N=model.N)
+
+    def __call__(self, time):
+        model = self.model
+        persons = model.persons
+        counts = [len(persons[status]) for status in InfectionStatus]
+
+        if self.method == 'tau':
+            num_infections, num_recoveries, num_wanings = \
+                self._draw_changes(counts)
+        else:
+            num_infections, num_recoveries, num_wanings = \
+                self._ode_changes(counts)
+
+        # Choose everyone from the statuses at the start of the time step,
+        # before anyone is moved.
+        infected = persons[InfectionStatus.SUSCEPTIBLE].random_agent_ids(
+            num_infections, self.rng)
+        recovering = persons[InfectionStatus.INFECTED].random_agent_ids(
+            num_recoveries, self.rng)
+        waning = persons[InfectionStatus.RECOVERED].random_agent_ids(
+            num_wanings, self.rng)
+
+        self._infect(infected, time)
+        self._recover(recovering, time)
+        self._wane(waning, time)
+
+        if self.method == 'tau':
+            # Delays drawn in this time step round to zero with probability
+            # 1 - exp(-rate / 2), and are then drained at once, as by the
+            # InfectionProgressionStep.
+            params = model.params
+            recovered_now = infected[self.rng.random(len(infected))
+                                     < -np.expm1(-params.recovery_rate / 2)]
+            self._recover(recovered_now, time)
+
+            recovered = np.concatenate((recovering, recovered_now))
+            self._wane(recovered[self.rng.random(len(recovered))
+                                 < -np.expm1(-params.waning_rate / 2)], time)
+
+        model.transmission_step.num_infected = int(num_infections)
+
+    def next_time(self, time):
+        if len(self.model.persons[InfectionStatus.INFECTED]) == 0 and \
+                len(self.model.persons[InfectionStatus.RECOVERED]) == 0:
+            return None
+        return time
+
+    def _draw_changes(self, counts):
+        """Draw the number of infections, recoveries and waning immunities
+        of a time step, from the number of persons of each status.
+        """
+        S, I, R = counts
+        params = self.model.params
+        return (
+            se.TransmissionStep.draw_number_infected(
+                self.rng, S, params.transmission_rate * I / self.model.N),
+            self.rng.binomial(I, -np.expm1(-params.recovery_rate)),
+            self.rng.binomial(R, -np.expm1(-params.waning_rate)),
+        )
+
+    def _ode_changes(self, counts):
+        """Compute the number of infections, recoveries and waning
+        immunities of a time step from the differential equation model.
+        """
+        S, I, R = counts
+        params = self.model.params
+        N = self.model.N
+        self._ode_model.set_init_condition([S / N, I / N, R / N])
+        y = self._ode_model.simulate(
+            [params.transmission_rate, params.recovery_rate,
+             params.waning_rate], [0, 1])
+        end_S, end_I, _ = self._ode_model.final_state
+
+        # The flows follow from the changes of S and I over the time step
+        infections = y[1, 1]
+        recoveries = infections - (end_I - I)
+        wanings = end_S - S + infections
+        return (
+            int(np.clip(np.rint(infections), 0, S)),
+            int(np.clip(np.rint(recoveries), 0, I)),
+            int(np.clip(np.rint(wanings), 0, R)),
+        )
+
+    def _infect(self, agent_ids, time):
+        """Infect persons, drawing their symptoms.
+        """
+        model = self.model
+        model.population.update_status_many(
+            agent_ids, InfectionStatus.INFECTED, time)
+
+        symptomatic = self.rng.random(len(agent_ids)) \
+            < model.params.proportion_symptomatic
+        model.population.symptoms[agent_ids] = symptomatic
+        model.incidence.record_agent_ids(
+            model.population, agent_ids, symptomatic, time)
+
+    def _recover(self, agent_ids, time):
+        self.model.population.update_status_many(
+            agent_ids, InfectionStatus.RECOVERED, time)
+        self.model.population.symptoms[agent_ids] = False
+
+    def _wane(self, agent_ids, time):
+        self.model.population.update_status_many(
+            agent_ids, InfectionStatus.SUSCEPTIBLE, time)
+
+
+class RepresentationSwitchStep(ModelStep):
+    """Switch a :class:`simsurveillance.HybridSIRSModel` between individual
+    persons and compartments, according to the number of infected persons.
+
+    It is the last step of the model, so the switch is made at the end of a
+    time step, and the new representation applies from the next one. It is
+    never due itself, as the number infected only changes when other steps
+    are run.
+    """
+    def __call__(self, time):
+        model = self.model
+        num_infected = len(model.persons[InfectionStatus.INFECTED])
+
+        if model.representation == 'agents' and \
+                num_infected >= model.threshold:
+            model.switch_representation('compartments', time + 1)
+        elif model.representation == 'compartments' and \
+                num_infected < model.lower_threshold:
+            model.switch_representation('agents', time + 1)
+
+    def next_time(self, time):
+        return None
@@ -0,0 +1,242 @@
+"""Stochastic models of epidemic simulation, tracking only counts.
+"""
+
+import numpy as np
+import simsurveillance as se
+from simsurveillance import InfectionStatus as InfStatus
+
+
+class SIRSStochasticCountModel(se.SteppedModel):
+    """Stochastic model of SIRS, tracking the number of persons of each
+    status.
+
+    The well-mixed SIRS dynamics of the agent based model are simulated as
+    a continuous time Markov chain with the events
+
+    - infection, S to I, at rate ``transmission_rate * S * I / N``
+    - recovery, I to R, at rate ``recovery_rate * I``
+    - waning, R to S, at rate ``waning_rate * R``
+
+    With ``method='ssa'``, every event is simulated exactly with the
+    Gillespie stochastic simulation algorithm, so the cost scales with the
+    number of events. With ``method='tau'``, the number of each event in
+    a leap of time is drawn from a Poisson distribution, using the adaptive
+    tau selection of Cao, Gillespie and Petzold (2006), so the cost is
+    roughly constant per time step. Where leaps would be too short to be
+    worthwhile, exact steps are taken instead.
+
+    Only observers working from the number of persons of each status, such
+    as :class:`simsurveillance.PrevalenceSurvey`, may be attached. As for the
+    agent based model, the simulation skips the time steps at which no
+    event can happen and no observer is due, and continues from
+    :attr:`time`.
+
+    Attributes
+    ----------
+    N : int
+        Total number of persons
+    params : simsurveillance.ModelParameters
+        Storing parameter values
+    counts : dict
+        Number of persons of each infection status
+    observers : list of simsurveillance.Observer
+        The observation processes that will be called each time step of the
+        simulation.
+    method : str
+        'ssa' for the exact algorithm, or 'tau' for tau-leaping
+    epsilon : float
+        Error control parameter of tau-leaping, bounding the relative change
+        of the propensities in each leap.
+    num_infected : int
+        Number infected during the most recent time step
+    rng : numpy.random.Generator
+        Random generator of the simulation
+    time : int
+        Next time step to simulate
+    """
+    # Change in (S, I, R) caused by infection, recovery and waning
+    _stoichiometry = np.array([[-1, 1, 0], [0, -1, 1], [1, 0, -1]])
+
+    # Highest order of the events in which each of S, I, R are consumed
+    _highest_order = np.array([2, 2, 1])
+
+    def __init__(self, N, seed=1234, method='ssa', epsilon=0.03):
+        """Create a new SIRS count model.
+
+        Parameters
+        ----------
+        N : int
+            Total number of persons to simulate.
+        seed : int, optional (1234)
+            Random seed.
+        method : str, optional ('ssa')
+            'ssa' for the exact algorithm, or 'tau' for tau-leaping
+        epsilon : float, optional (0.03)
+            Error control parameter of tau-leaping.
+        """
+        if method not in ('ssa', 'tau'):
+            raise ValueError('Unknown simulation method {}'.format(method))
+
+        super().__init__(seed)
+
+        self.N = N
+        self.params = se.ModelParameters()
+        self.counts = {status: 0 for status in InfStatus}
+        self.counts[InfStatus.SUSCEPTIBLE] = N
+        self.method = method
+        self.epsilon = epsilon
+        self.num_infected = 0
+        self._ssa_draws = []
+
+    def initialize_infection(self, num_infect):
+        """Start an infection with the given number of infect.
+
+        Parameters
+        ----------
+        num_infect : int
+            Number to infect
+        """
+        self.counts[InfStatus.SUSCEPTIBLE] -= num_infect
+        self.counts[InfStatus.INFECTED] += num_infect
+        self.num_infected += num_infect
+
+    def _rates(self, state):
+        """Compute the rates of infection, recovery and waning.
+        """
+        S, I, R = state
+        return np.array([
+            self.params.transmission_rate * S * I / self.N,
+            self.params.recovery_rate * I,
+            self.params.waning_rate * R,
+        ])
+
+    def _ssa(self, state, time, end_time, max_events=None):
+        """Simulate events exactly from time until end_time, or until
+        max_events have happened.
+
+        Returns
+        -------
+        float
+            Time reached
+        """
+        S, I, R = (int(x) for x in state)
+        transmission_rate = self.params.transmission_rate / self.N
+        recovery_rate = self.params.recovery_rate
+        waning_rate = self.params.waning_rate
+
+        num_events = 0
+        while max_events is None or num_events < max_events:
+            infection = transmission_rate * S * I
+            recovery = recovery_rate * I
+            total_rate = infection + recovery + waning_rate * R
+            if total_rate <= 0:
+                time = end_time
+                break
+
+            waiting_time, uniform = self._next_ssa_draws()
+            time += waiting_time / total_rate
+            if time > end_time:
+                # No event before end_time. As the process is memoryless,
+                # the next step may start afresh from end_time.
+                time = end_time
+                break
+
+            uniform *= total_rate
+            if uniform < infection:
+                S -= 1
+                I += 1
+                self.num_infected += 1
+            elif uniform < infection + recovery:
+                I -= 1
+                R += 1
+            else:
+                R -= 1
+                S += 1
+            num_events += 1
+
+        state[:] = S, I, R
+        return time
+
+    def _next_ssa_draws(self):
+        """Get a standard exponential and a uniform random number.
+
+        The random numbers are drawn in blocks, as drawing them one at a time
+        dominates the cost of the exact algorithm.
+        """
+        if not self._ssa_draws:
+            self._ssa_draws = list(zip(
+                self.rng.standard_exponential(1024).tolist(),
+                self.rng.random(1024).tolist()))
+            self._ssa_draws.reverse()
+        return self._ssa_draws.pop()
+
+    def _select_tau(self, state, rates):
+        """Select the length of a leap (Cao, Gillespie and Petzold, 2006).
+        """
+        mean_change = self._stoichiometry.T @ rates
+        variance_change = (self._stoichiometry ** 2).T @ rates
+
+        bound = np.maximum(self.epsilon * state / self._highest_order, 1.0)
+
+        with np.errstate(divide='ignore'):
+            tau = np.minimum(bound / np.abs(mean_change),
+                             bound ** 2 / variance_change)
+        return np.min(tau)
+
+    def _advance_state(self, state, time, end_time):
+        """Advance the state from time until end_time.
+        """
+        while time < end_time:
+            rates = self._rates(state)
+            total_rate = rates.sum()
+            if total_rate <= 0:
+                return
+
+            if self.method == 'ssa':
+                time = self._ssa(state, time, end_time)
+                continue
+
+            tau = self._select_tau(state, rates)
+
+            if tau < 10 / total_rate:
+                # A leap would cover only a few events, so step exactly
+                time = self._ssa(state, time, end_time, max_events=100)
+                continue
+
+            tau = min(tau, end_time - time)
+            while True:
+                num_events = self.rng.poisson(rates * tau)
+                new_state = state + self._stoichiometry.T @ num_events
+                if np.all(new_state >= 0):
+                    break
+                tau /= 2
+
+            state[:] = new_state
+            self.num_infected += int(num_events[0])
+            time += tau
+
+    def _state(self):
+        return np.array([self.counts[status] for status in InfStatus])
+
+    def _next_time(self, time):
+        next_times = [observer.next_time(time) for observer in self.observers]
+        if self._rates(self._state()).sum() > 0:
+            next_times.append(time)
+        return min((t for t in next_times if t is not None), default=None)
+
+    def _advance(self, time):
+        state = self._state()
+        self.num_infected = 0
+        self._advance_state(state, time, time + 1)
+
+        for status, count in zip(InfStatus, state):
+            self.counts[status] = int(count)
+
+    def _record_output(self, output, time):
+        output['time'].append(time)
+        for status in InfStatus:
+            output[status].append(self.counts[status])
+        output['transmissions'].append(self.num_infected)
+
+    def _clear_transmissions(self):
+        self.num_infected = 0
@@ -0,0 +1,73 @@
+"""Comparison of the epidemics simulated by two models, shared by the tests
+of models which should agree in distribution.
+"""
+
+import numpy as np
+import scipy.stats
+import simsurveillance
+
+
+def epidemic_summaries(output):
+    """Summaries of the output of a simulation.
+    """
+    infected = output[simsurveillance.InfectionStatus.INFECTED].to_numpy()
+    return {'peak infected': infected.max(),
+            'peak time': infected.argmax(),
+            'total transmissions': output['transmissions'].sum()}
+
+
+def replicate_summaries(model_factory, seeds, times):
+    """Simulate a model with each seed, and gather the summaries of the
+    outputs.
+
+    Parameters
+    ----------
+    model_factory : callable
+        Called with a seed, returns a new model ready to simulate.
+    seeds : list of int
+        Seed of each replicate
+    times : list
+        Time points of the simulations
+
+    Returns
+    -------
+    dict
+        Value of each summary in each replicate
+    """
+    replicates = [epidemic_summaries(model_factory(seed).simulate(times))
+                  for seed in seeds]
+    return {key: np.array([r[key] for r in replicates])
+            for key in replicates[0]}
+
+
+def assert_same_distribution(test_case, model_factory, other_factory,
+                             seeds, times, alpha=0.001, other_seeds=None,
+                             summaries=None):
+    """Check that two models agree in distribution, by a two-sample
+    Kolmogorov-Smirnov test of each summary of their outputs.
+
+    Parameters
+    ----------
+    test_case : unittest.TestCase
+        Test case making the assertions
+    model_factory, other_factory : callable
+        Called with a seed, return a new model of each kind, ready to
+        simulate.
+    seeds : list of int
+        Seed of each replicate
+    times : list
+        Time points of the simulations
+    alpha : float, optional (0.001)
+        Smallest p-value accepted
+    other_seeds : list of int, optional (None)
+        Seed of each replicate of the other model. By default, seeds.
+    summaries : list of str, optional (None)
+        Summaries to compare. By default, all of them.
+    """
+    values = replicate_summaries(model_factory, seeds, times)
+    other = replicate_summaries(
+        other_factory, seeds if other_seeds is None else other_seeds, times)
+    for key in summaries or values:
+        with test_case.subTest(summary=key):
+            test_case.assertGreater(
+                scipy.stats.ks_2samp(values[key], other[key]).pvalue, alpha)
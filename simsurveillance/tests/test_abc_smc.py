@@ -0,0 +1,197 @@
+"""Test abc_smc.py
+"""
+
+import unittest
+import numpy as np
+import pints
+import scipy.stats
+import simsurveillance
+
+
+def model_factory(parameters, seed):
+    model = simsurveillance.SIRSAgentModel(300, seed=seed,
+                                           record_events=False)
+    model.params.set_parameters(dict(zip(
+        ['transmission_rate', 'recovery_rate', 'waning_rate'], parameters)))
+    model.initialize_infection(10)
+    return model
+
+
+def prevalence_survey_factory(model):
+    return simsurveillance.PrevalenceSurvey(
+        model, simsurveillance.DiseaseTest(), list(range(5, 31, 5)),
+        [50] * 6, aggregate=True)
+
+
+def symptomatic_testing_factory(model):
+    return simsurveillance.SymptomaticTesting(
+        model, simsurveillance.DiseaseTest(), start_time=1)
+
+
+class TestKernels(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.particles = rng.normal(size=(50, 2)) * [1, 0.1]
+        self.weights = np.full(50, 1 / 50)
+        self.proposals = rng.normal(size=(5, 2))
+
+    def test_multivariate_normal(self):
+        kernel = simsurveillance.MultivariateNormalKernel()
+        kernel.fit(self.particles, self.weights)
+        self.assertTrue(np.allclose(
+            kernel.covariance, 2 * np.cov(self.particles.T)))
+
+        density = kernel.density(self.proposals, self.particles)
+        self.assertEqual(density.shape, (5, 50))
+        expected = scipy.stats.multivariate_normal(
+            self.particles[3], kernel.covariance).pdf(self.proposals)
+        self.assertTrue(np.allclose(density[:, 3], expected))
+
+        perturbed = kernel.perturb(
+            np.zeros((20000, 2)), np.random.default_rng(2))
+        self.assertLess(
+            np.linalg.norm(np.cov(perturbed.T) - kernel.covariance)
+            / np.linalg.norm(kernel.covariance), 0.05)
+
+    def test_uniform(self):
+        kernel = simsurveillance.UniformKernel(scale=0.5)
+        kernel.fit(self.particles, self.weights)
+        self.assertTrue(np.allclose(
+            kernel.half_widths, 0.5 * np.ptp(self.particles, axis=0)))
+
+        perturbed = kernel.perturb(
+            self.particles, np.random.default_rng(2))
+        density = kernel.density(perturbed, self.particles)
+        self.assertTrue(np.all(np.diag(density) > 0))
+        self.assertAlmostEqual(
+            density[0, 0], 1 / np.prod(2 * kernel.half_widths))
+
+        far = self.particles[:1] + 2 * kernel.half_widths
+        self.assertEqual(kernel.density(far, self.particles[:1])[0, 0], 0)
+
+
+class TestABCSMC(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.times = list(range(31))
+        cls.true_parameters = [0.6, 0.2, 0.02]
+
+        model = model_factory(cls.true_parameters, 1)
+        observers = [prevalence_survey_factory(model),
+                     symptomatic_testing_factory(model)]
+        model.add_observers(*observers)
+        model.simulate(cls.times)
+        cls.observed = [observer.records() for observer in observers]
+
+        cls.log_prior = pints.UniformLogPrior([0.1, 0.05, 0], [1, 0.5, 0.1])
+
+    def abc(self, **kwargs):
+        return simsurveillance.ABCSMC(
+            model_factory,
+            [prevalence_survey_factory, symptomatic_testing_factory],
+            self.observed, self.times, self.log_prior, **kwargs)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            simsurveillance.ABCSMC(
+                model_factory, [prevalence_survey_factory], self.observed,
+                self.times, self.log_prior)
+        with self.assertRaises(ValueError):
+            self.abc(scales=[1])
+
+    def test_distance(self):
+        abc = self.abc()
+        self.assertEqual(abc.distance(self.true_parameters, 1), (0, False))
+
+        parameters = [0.9, 0.1, 0.05]
+        distance, stopped = abc.distance(parameters, 2)
+        self.assertGreater(distance, 0)
+        self.assertFalse(stopped)
+
+        # The distance is computed as defined
+        model = model_factory(parameters, 2)
+        observers = [prevalence_survey_factory(model),
+                     symptomatic_testing_factory(model)]
+        model.add_observers(*observers)
+        model.simulate(self.times)
+        expected = 0
+        for j, (observer, column) in enumerate(
+                zip(observers, ['num_positive', 'cases'])):
+            expected += np.sum(
+                ((observer.records()[column] - self.observed[j][column])
+                 / abc.scales[j]) ** 2)
+        self.assertAlmostEqual(distance, np.sqrt(expected))
+
+        # Stopped early, with a partial distance above the tolerance
+        partial, stopped = abc.distance(parameters, 2, distance / 2)
+        self.assertTrue(stopped)
+        self.assertGreater(partial, distance / 2)
+        self.assertLessEqual(partial, distance)
+
+        # Not stopped if the tolerance is never exceeded
+        self.assertEqual(abc.distance(parameters, 2, distance),
+                         (distance, False))
+
+    def test_run(self):
+        abc = self.abc()
+        particles, weights = abc.run(num_particles=20, num_generations=3,
+                                     batch_size=10)
+
+        self.assertEqual(len(abc.generations), 3)
+        self.assertEqual(particles.shape, (20, 3))
+        self.assertAlmostEqual(np.sum(weights), 1)
+
+        tolerances = [g.tolerance for g in abc.generations]
+        self.assertEqual(tolerances, sorted(tolerances, reverse=True))
+        for generation in abc.generations:
+            self.assertTrue(np.all(
+                generation.distances <= generation.tolerance))
+            self.assertEqual(generation.acceptance_rate,
+                             20 / generation.num_simulations)
+            self.assertGreater(generation.simulations_per_second, 0)
+
+        self.assertEqual(abc.generations[0].num_simulations, 20)
+        self.assertEqual(abc.generations[0].num_stopped_early, 0)
+        self.assertGreater(abc.generations[-1].num_stopped_early, 0)
+
+        # Particles stay within the prior
+        self.assertTrue(np.all(np.isfinite(
+            [self.log_prior(p) for p in particles])))
+
+    def test_run_workers(self):
+        particles, _ = self.abc().run(num_particles=10, num_generations=2)
+        parallel, _ = self.abc().run(num_particles=10, num_generations=2,
+                                     num_workers=2)
+        self.assertTrue(np.array_equal(particles, parallel))
+
+    def test_stopping(self):
+        abc = self.abc(kernel=simsurveillance.UniformKernel())
+        abc.run(num_particles=10, num_generations=5, min_tolerance=1e6)
+        self.assertEqual(len(abc.generations), 2)
+
+        abc = self.abc()
+        abc.run(num_particles=10, num_generations=5, max_simulations=10)
+        self.assertLess(len(abc.generations), 5)
+        self.assertLess(len(abc.generations[-1].particles), 10)
+        for generation in abc.generations:
+            self.assertLessEqual(generation.num_simulations, 10)
+
+        with self.assertRaises(ValueError):
+            self.abc().run(num_particles=10, max_simulations=0)
+
+    def test_proposals_outside_prior(self):
+        class ShiftingKernel(simsurveillance.MultivariateNormalKernel):
+            def perturb(self, particles, rng):
+                return particles + 10
+
+        abc = self.abc(kernel=ShiftingKernel(), max_proposal_rounds=3)
+        with self.assertRaisesRegex(RuntimeError,
+                                    'ShiftingKernel.*UniformLogPrior'):
+            abc.run(num_particles=10, num_generations=2)
+        self.assertEqual(len(abc.generations), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,17 +1,36 @@
 """Test the classes of the agent_model.py
 """
 
+import math
 import unittest
 import unittest.mock
 
+import numpy as np
+import pandas
 import simsurveillance
 
+from equivalence import assert_same_distribution, replicate_summaries
+
 
 class TestAgentModel(unittest.TestCase):
 
     def test_init(self):
         simsurveillance.AgentModel()
 
+    def test_spawn_rng(self):
+        m = simsurveillance.AgentModel(seed=3)
+        draws = [m.spawn_rng().random(),
+                 m.spawn_rng().random(),
+                 m.spawn_rng('observation').random()]
+        self.assertEqual(len(set(draws)), 3)
+
+        # Generators are spawned in the same sequence for the same seed
+        m = simsurveillance.AgentModel(seed=3)
+        self.assertEqual(m.spawn_rng().random(), draws[0])
+
+        with self.assertRaises(KeyError):
+            m.spawn_rng('unknown')
+
     def test_simulate(self):
         m = simsurveillance.AgentModel()
         with self.assertRaises(NotImplementedError):
@@ -53,6 +72,12 @@ class TestSIRSAgentModel(unittest.TestCase):
                       mock_infection_step,
                       mock_observer):
 
+        # Mocked steps and observers are due at every time step
+        for mock_object in [mock_transmission_step.return_value,
+                            mock_infection_step.return_value,
+                            mock_observer]:
+            mock_object.next_time.side_effect = lambda t: t
+
         m = simsurveillance.SIRSAgentModel(10)
         m.add_observers(mock_observer)
 
@@ -63,6 +88,441 @@ class TestSIRSAgentModel(unittest.TestCase):
         self.assertTrue(mock_infection_step.called)
         self.assertTrue(mock_observer.called)
 
+    def test_simulate_skips_time_steps(self):
+        class CountingStep(simsurveillance.ModelStep):
+            def __init__(self, model):
+                super().__init__(model)
+                self.times = []
+
+            def __call__(self, time):
+                self.times.append(time)
+
+            def next_time(self, time):
+                return None
+
+        class DailyObserver(simsurveillance.Observer):
+            def __call__(self, time):
+                pass
+
+        params = {'transmission_rate': 0.5,
+                  'recovery_rate': 0.5,
+                  'waning_rate': 0.01}
+        times = [0, 3, 3, 50, 51, 52, 300, 1000]
+
+        outputs = []
+        for observers in [[], [DailyObserver]]:
+            m = simsurveillance.SIRSAgentModel(50, seed=3)
+            m.params.set_parameters(params)
+            m.initialize_infection(2)
+            counting_step = CountingStep(m)
+            m.steps.append(counting_step)
+            m.add_observers(*[obs(m) for obs in observers])
+
+            outputs.append(m.simulate(times))
+
+        # Simulating every time step gives exactly the same output
+        self.assertTrue(outputs[0].equals(outputs[1]))
+        self.assertEqual(list(outputs[0]['time']),
+                         [0, 3, 50, 51, 52, 300, 1000])
+        self.assertEqual(len(counting_step.times), 1001)
+
+        # Without the daily observer, time steps are skipped after the
+        # recovery of everyone.
+        m = simsurveillance.SIRSAgentModel(50, seed=3)
+        m.params.set_parameters(params)
+        m.initialize_infection(2)
+        counting_step = CountingStep(m)
+        m.steps.append(counting_step)
+        m.simulate(times)
+        self.assertLess(len(counting_step.times), 1001)
+        self.assertEqual(sorted(set(counting_step.times)),
+                         counting_step.times)
+
+    def test_simulate_fills_transmissions(self):
+        # Everyone is infected at the first time step and immediately
+        # recovers, but is still counted in the transmissions of the next
+        # time step.
+        m = simsurveillance.SIRSAgentModel(10)
+        m.params.set_parameters({'transmission_rate': 1e10,
+                                 'recovery_rate': 1e10,
+                                 'waning_rate': 1e-10})
+        m.initialize_infection(3)
+
+        df = m.simulate([0, 1, 2, 5])
+        self.assertEqual(list(df['transmissions']), [3, 7, 0, 0])
+        self.assertEqual(
+            list(df[simsurveillance.InfectionStatus.RECOVERED]),
+            [0, 10, 10, 10])
+
+    def test_counts(self):
+        InfStatus = simsurveillance.InfectionStatus
+        m = simsurveillance.SIRSAgentModel(10)
+        m.initialize_infection(3)
+        self.assertEqual(m.counts, {InfStatus.SUSCEPTIBLE: 7,
+                                    InfStatus.INFECTED: 3,
+                                    InfStatus.RECOVERED: 0})
+
+    def test_update_statuses(self):
+        InfStatus = simsurveillance.InfectionStatus
+        m = simsurveillance.SIRSAgentModel(5)
+        persons = list(m.persons[InfStatus.SUSCEPTIBLE])
+        m.update_statuses(persons[:3], InfStatus.INFECTED, 1)
+        m.update_statuses(persons[2:4], InfStatus.RECOVERED, 2)
+
+        self.assertEqual([p.status for p in persons],
+                         [InfStatus.INFECTED, InfStatus.INFECTED,
+                          InfStatus.RECOVERED, InfStatus.RECOVERED,
+                          InfStatus.SUSCEPTIBLE])
+        self.assertEqual(persons[2].last_transition_time, 2)
+        self.assertEqual(m.event_log.history(persons[2].agent_id),
+                         {1: InfStatus.INFECTED, 2: InfStatus.RECOVERED})
+        self.assertEqual(list(m.persons[InfStatus.RECOVERED]),
+                         [persons[3], persons[2]])
+        self.assertEqual(len(m.persons[InfStatus.SUSCEPTIBLE]), 1)
+
+    def test_event_log(self):
+        InfStatus = simsurveillance.InfectionStatus
+        for model_class in [simsurveillance.SIRSAgentModel,
+                            simsurveillance.SIRSArrayAgentModel]:
+            m = model_class(100, seed=2)
+            m.params.set_parameters({'transmission_rate': 0.5,
+                                     'recovery_rate': 0.2,
+                                     'waning_rate': 0.1})
+            m.initialize_infection(10)
+            m.simulate(list(range(50)))
+
+            # Replaying the events gives the final statuses
+            status = [InfStatus.SUSCEPTIBLE] * 100
+            for agent_id, new_status in zip(m.event_log.agent_ids,
+                                            m.event_log.new_statuses):
+                status[agent_id] = InfStatus(new_status)
+            for p in m.all_persons:
+                self.assertIs(status[p.agent_id], p.status)
+
+            self.assertTrue(
+                all(m.event_log.times[1:] >= m.event_log.times[:-1]))
+            # The initial infections come first
+            agent_ids, new_statuses = m.event_log.events_at(0)
+            self.assertGreaterEqual(len(agent_ids), 10)
+            self.assertTrue(
+                all(new_statuses[:10] == InfStatus.INFECTED.value))
+
+            m = model_class(100, record_events=False)
+            m.initialize_infection(10)
+            m.simulate([0, 1, 2])
+            self.assertIsNone(m.event_log)
+
+    def test_infect_people(self):
+        m = simsurveillance.SIRSAgentModel(4000)
+        m.params.set_parameters({'transmission_rate': 0.5,
+                                 'recovery_rate': 0.1,
+                                 'waning_rate': 0.01,
+                                 'proportion_symptomatic': 0.3})
+        persons = list(m.persons[simsurveillance.InfectionStatus.SUSCEPTIBLE])
+        m.infect_people(persons, 2)
+
+        self.assertEqual(
+            len(m.persons[simsurveillance.InfectionStatus.INFECTED]), 4000)
+
+        # Recovery delays are exponential, rounded to whole time steps
+        delays = [m.transitions.time_of(p) - 2 for p in persons]
+        self.assertEqual(min(delays), 0)
+        self.assertAlmostEqual(sum(delays) / 4000, 10, delta=0.5)
+        self.assertAlmostEqual(
+            delays.count(0) / 4000, 1 - math.exp(-0.05), delta=0.02)
+
+        symptomatic = sum(p.symptoms for p in persons)
+        self.assertAlmostEqual(symptomatic / 4000, 0.3, delta=0.03)
+
+        # Infecting nobody does nothing
+        m.infect_people([], 3)
+        self.assertEqual(len(m.transitions), 4000)
+
+    def test_simulate_reproducible(self):
+        def simulate(seed, observe=False):
+            m = simsurveillance.SIRSAgentModel(200, seed=seed)
+            m.params.set_parameters({'transmission_rate': 0.4,
+                                     'recovery_rate': 0.1,
+                                     'waning_rate': 0.02})
+            m.initialize_infection(5)
+            if observe:
+                m.add_observers(
+                    simsurveillance.SymptomaticTesting(
+                        m, simsurveillance.DiseaseTest(0.9, 0.95)),
+                    simsurveillance.PrevalenceSurvey(
+                        m, simsurveillance.DiseaseTest(0.9, 0.95),
+                        list(range(0, 60, 3)), [50] * 20))
+            return m.simulate(list(range(60)))
+
+        df = simulate(7)
+        self.assertTrue(df.equals(simulate(7)))
+        self.assertFalse(df.equals(simulate(8)))
+
+        # Observers draw from their own streams, so the epidemic is unchanged
+        self.assertTrue(df.equals(simulate(7, observe=True)))
+
+
+class TestSnapshots(unittest.TestCase):
+
+    def model(self, model_class):
+        m = model_class(500, seed=5)
+        m.params.set_parameters({'transmission_rate': 0.5,
+                                 'recovery_rate': 0.2,
+                                 'waning_rate': 0.05})
+        m.initialize_infection(10)
+        m.add_observers(
+            simsurveillance.SymptomaticTesting(
+                m, simsurveillance.DiseaseTest(0.9, 0.9)),
+            simsurveillance.PrevalenceSurvey(
+                m, simsurveillance.DiseaseTest(0.9, 0.9), [10, 30, 50],
+                [50] * 3))
+        return m
+
+    def assertSameRecords(self, m1, m2):
+        for o1, o2 in zip(m1.observers, m2.observers):
+            self.assertTrue(o1.records().equals(o2.records()))
+
+    def test_simulate_in_stages(self):
+        for model_class in [simsurveillance.SIRSAgentModel,
+                            simsurveillance.SIRSArrayAgentModel]:
+            m = self.model(model_class)
+            full = m.simulate(list(range(60)))
+            self.assertEqual(m.time, 60)
+
+            staged = self.model(model_class)
+            first = staged.simulate(list(range(25)))
+            self.assertEqual(staged.time, 25)
+            second = staged.simulate(list(range(60)))
+            self.assertEqual(list(second['time']), list(range(25, 60)))
+
+            self.assertTrue(full.equals(
+                pandas.concat([first, second], ignore_index=True)))
+            self.assertSameRecords(m, staged)
+
+    def test_snapshot(self):
+        for model_class in [simsurveillance.SIRSAgentModel,
+                            simsurveillance.SIRSArrayAgentModel]:
+            m = self.model(model_class)
+            m.simulate(list(range(25)))
+            restored = simsurveillance.AgentModel.restore(m.snapshot())
+
+            self.assertIsInstance(restored, model_class)
+            self.assertEqual(restored.time, 25)
+            self.assertEqual(restored.counts, m.counts)
+            self.assertIs(restored.observers[0].model, restored)
+            self.assertSameRecords(m, restored)
+
+            # The copy continues exactly as the original, independently
+            future = m.simulate(list(range(25, 60)))
+            self.assertTrue(
+                restored.simulate(list(range(25, 60))).equals(future))
+            self.assertSameRecords(m, restored)
+            self.assertEqual(restored.event_log.size, m.event_log.size)
+
+    def test_fork(self):
+        m = self.model(simsurveillance.SIRSArrayAgentModel)
+        m.simulate(list(range(25)))
+
+        forks = m.fork(2)
+        self.assertEqual(len(forks), 2)
+        self.assertIsNot(forks[0].population, forks[1].population)
+        outputs = [f.simulate(list(range(25, 60))) for f in forks]
+        self.assertTrue(outputs[0].equals(outputs[1]))
+
+        # Reseeded forks share the history, but not the future
+        forks = m.fork(3, reseed=True, seed=1)
+        outputs = [f.simulate(list(range(25, 60))) for f in forks]
+        for output in outputs:
+            self.assertTrue(output.iloc[0].equals(outputs[0].iloc[0]))
+        self.assertFalse(outputs[0].equals(outputs[1]))
+
+        again = m.fork(3, reseed=True, seed=1)
+        self.assertTrue(
+            again[2].simulate(list(range(25, 60))).equals(outputs[2]))
+
+    def test_reseed(self):
+        m = self.model(simsurveillance.SIRSAgentModel)
+        m.reseed(3)
+        draws = [m.rng.random()] + [step.rng.random() for step in m.steps] \
+            + [observer.rng.random() for observer in m.observers]
+        self.assertEqual(len(set(draws)), len(draws))
+
+        m.reseed(3)
+        self.assertEqual(m.rng.random(), draws[0])
+
+
+class TestSIRSArrayAgentModel(unittest.TestCase):
+
+    def test_init(self):
+        m = simsurveillance.SIRSArrayAgentModel(10)
+
+        self.assertEqual(
+            10, len(m.persons[simsurveillance.InfectionStatus.SUSCEPTIBLE]))
+        self.assertEqual(10, m.N)
+        self.assertIs(m.persons, m.population.persons)
+
+    def test_initialize_infection(self):
+        m = simsurveillance.SIRSArrayAgentModel(10)
+        m.params.set_parameters({'recovery_rate': 1})
+        m.initialize_infection(5)
+
+        self.assertEqual(
+            5, len(m.persons[simsurveillance.InfectionStatus.INFECTED]))
+
+        infected = m.persons[simsurveillance.InfectionStatus.INFECTED][0]
+        self.assertGreaterEqual(
+            m.population.next_transition[infected.agent_id], 0)
+
+    def test_simulate(self):
+        # Same random numbers are used as for the object-based model, so the
+        # simulations should match exactly.
+        outputs = []
+        for model_class in [simsurveillance.SIRSAgentModel,
+                            simsurveillance.SIRSArrayAgentModel]:
+            m = model_class(200, seed=7)
+            m.params.set_parameters({'transmission_rate': 0.5,
+                                     'recovery_rate': 0.2,
+                                     'waning_rate': 0.1})
+            m.initialize_infection(5)
+
+            test = simsurveillance.DiseaseTest(0.9, 0.95)
+            symptomatic_testing = simsurveillance.SymptomaticTesting(m, test)
+            survey = simsurveillance.PrevalenceSurvey(
+                m, test, [5, 10], [20, 20])
+            m.add_observers(symptomatic_testing, survey)
+
+            df = m.simulate(list(range(0, 40, 2)))
+            outputs.append(
+                (df, symptomatic_testing.cases, survey.num_positive))
+
+        self.assertTrue(outputs[0][0].equals(outputs[1][0]))
+        self.assertEqual(outputs[0][1], outputs[1][1])
+        self.assertEqual(outputs[0][2], outputs[1][2])
+
+
+class TestHybridSIRSModel(unittest.TestCase):
+
+    def model(self, seed=1, N=2000, **kwargs):
+        m = simsurveillance.HybridSIRSModel(N, seed=seed, **kwargs)
+        m.params.set_parameters({'transmission_rate': 1.0,
+                                 'recovery_rate': 0.3,
+                                 'waning_rate': 0.01})
+        m.initialize_infection(5)
+        test = simsurveillance.DiseaseTest(0.9, 0.95)
+        m.add_observers(
+            simsurveillance.SymptomaticTesting(m, test, start_time=1),
+            simsurveillance.PrevalenceSurvey(
+                m, test, list(range(0, 100, 5)), [100] * 20))
+        return m
+
+    def test_init(self):
+        m = simsurveillance.HybridSIRSModel(100, threshold=20)
+        self.assertEqual(m.threshold, 20)
+        self.assertEqual(m.lower_threshold, 10)
+        self.assertEqual(m.representation, 'agents')
+        self.assertEqual(m.switches, [(0, 'agents')])
+        self.assertEqual(m.steps, [m.transmission_step,
+                                   m.infection_progression_step,
+                                   m.switch_step])
+        self.assertEqual(m.compartment_step.method, 'tau')
+
+        with self.assertRaises(ValueError):
+            simsurveillance.HybridSIRSModel(100, 20, lower_threshold=30)
+        with self.assertRaises(ValueError):
+            m.switch_representation('ode', 1)
+
+    def test_simulate_below_threshold(self):
+        # Without reaching the threshold, the model is the agent based model
+        hybrid = self.model(threshold=10 ** 6)
+        agents = simsurveillance.SIRSArrayAgentModel(2000, seed=1)
+        agents.params = hybrid.params
+        agents.initialize_infection(5)
+        agents.add_observers(*[type(o)(agents, o.test, *args) for o, args in
+                               zip(hybrid.observers,
+                                   [(1,), (list(range(0, 100, 5)),
+                                           [100] * 20)])])
+
+        output = hybrid.simulate(list(range(100)))
+        self.assertTrue(output.equals(agents.simulate(list(range(100)))))
+        for o1, o2 in zip(hybrid.observers, agents.observers):
+            self.assertTrue(o1.records().equals(o2.records()))
+        self.assertEqual(hybrid.switches, [(0, 'agents')])
+
+    def test_simulate(self):
+        for method in ['tau', 'ode']:
+            m = self.model(threshold=100, method=method)
+            output = m.simulate(list(range(100)))
+
+            # The model switches to compartments and back as the epidemic
+            # grows and fades
+            self.assertEqual(
+                [representation for _, representation in m.switches],
+                ['agents', 'compartments', 'agents'])
+            _, start, end = [time for time, _ in m.switches]
+            infected = output[simsurveillance.InfectionStatus.INFECTED]
+            self.assertGreaterEqual(infected[start], 100)
+            self.assertLess(infected[end], 50)
+            self.assertTrue(np.all(infected[start:end] >= 50))
+            self.assertTrue(np.all(output[list(
+                simsurveillance.InfectionStatus)].sum(axis=1) == 2000))
+
+            # Everyone infected or recovered has a scheduled transition
+            self.assertEqual(
+                len(m.transitions),
+                len(m.persons[simsurveillance.InfectionStatus.INFECTED])
+                + len(m.persons[simsurveillance.InfectionStatus.RECOVERED]))
+
+            # The observers are called throughout
+            cases, survey = [o.records() for o in m.observers]
+            self.assertEqual(list(cases['time']), list(range(1, 100)))
+            self.assertGreater(cases['cases'][start + 1:end].sum(), 0)
+            self.assertEqual(list(survey['time']), list(range(0, 100, 5)))
+
+    def test_distribution(self):
+        # The hybrid and agent based models agree in distribution
+        assert_same_distribution(
+            self, lambda seed: self.model(seed, N=1000, threshold=10 ** 6),
+            lambda seed: self.model(seed, N=1000, threshold=50),
+            range(30), list(range(60)), other_seeds=range(1000, 1030))
+
+    def test_distribution_ode(self):
+        # The flows of the differential equation model reach the same
+        # number of transmissions, but grow faster than the time steps of
+        # the agent based model, so the peak is higher and earlier
+        def agents(seed):
+            return self.model(seed, N=1000, threshold=10 ** 6)
+
+        def ode(seed):
+            return self.model(seed, N=1000, threshold=50, method='ode')
+
+        times = list(range(60))
+        assert_same_distribution(
+            self, agents, ode, range(30), times,
+            other_seeds=range(1000, 1030), summaries=['total transmissions'])
+
+        summaries = replicate_summaries(agents, range(30), times)
+        ode_summaries = replicate_summaries(ode, range(1000, 1030), times)
+        self.assertGreater(np.median(ode_summaries['peak infected']),
+                           np.median(summaries['peak infected']))
+        self.assertLess(np.median(ode_summaries['peak time']),
+                        np.median(summaries['peak time']))
+
+    def test_snapshot(self):
+        m = self.model(threshold=100)
+        m.simulate(list(range(20)))
+        self.assertEqual(m.representation, 'compartments')
+
+        restored = simsurveillance.AgentModel.restore(m.snapshot())
+        future = m.simulate(list(range(20, 100)))
+        self.assertTrue(restored.simulate(list(range(20, 100))).equals(future))
+        self.assertEqual(restored.switches, m.switches)
+
+        m.reseed(3)
+        steps = [m.compartment_step, m.transmission_step,
+                 m.infection_progression_step]
+        draws = [step.rng.random() for step in steps]
+        self.assertEqual(len(set(draws)), len(draws))
+
 
 if __name__ == '__main__':
     unittest.main()
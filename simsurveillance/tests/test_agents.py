@@ -12,15 +12,56 @@ class TestPerson(unittest.TestCase):
         p = simsurveillance.Person(mock_agent_model)
         self.assertIs(p.status, simsurveillance.InfectionStatus.SUSCEPTIBLE)
         self.assertIs(p.model, mock_agent_model)
+        self.assertIsNone(p.agent_id)
+        self.assertEqual(p.last_transition_time, -1)
 
     @unittest.mock.patch('simsurveillance.AgentModel')
     def test_update_status(self, mock_agent_model):
-        p = simsurveillance.Person(mock_agent_model)
+        p = simsurveillance.Person(mock_agent_model, 3)
+        p.update_status(simsurveillance.InfectionStatus.RECOVERED, 5)
+        self.assertIs(p.status, simsurveillance.InfectionStatus.RECOVERED)
+        self.assertEqual(p.last_transition_time, 5)
+
+        mock_agent_model.event_log.record.assert_called_once_with(
+            3, simsurveillance.InfectionStatus.RECOVERED, 5)
+
+        # Without an event log
+        mock_agent_model.event_log = None
+        p.update_status(simsurveillance.InfectionStatus.SUSCEPTIBLE, 6)
+        self.assertEqual(p.last_transition_time, 6)
+
+
+class TestAgentView(unittest.TestCase):
+
+    @unittest.mock.patch('simsurveillance.AgentModel')
+    def test_init(self, mock_agent_model):
+        population = simsurveillance.ArrayPopulation(mock_agent_model, 5)
+        p = simsurveillance.AgentView(population, 2)
+        self.assertIs(p.status, simsurveillance.InfectionStatus.SUSCEPTIBLE)
+        self.assertIs(p.model, mock_agent_model)
+        self.assertFalse(p.symptoms)
+        self.assertEqual(p.last_transition_time, -1)
+
+    @unittest.mock.patch('simsurveillance.AgentModel')
+    def test_update_status(self, mock_agent_model):
+        population = simsurveillance.ArrayPopulation(mock_agent_model, 5)
+        p = simsurveillance.AgentView(population, 2)
         p.update_status(simsurveillance.InfectionStatus.RECOVERED, 5)
         self.assertIs(p.status, simsurveillance.InfectionStatus.RECOVERED)
 
-        self.assertEqual(p.transition_history[5],
-                         simsurveillance.InfectionStatus.RECOVERED)
+        self.assertEqual(p.last_transition_time, 5)
+
+        # Other views of the same person see the change
+        self.assertIs(population.person(2).status,
+                      simsurveillance.InfectionStatus.RECOVERED)
+
+    @unittest.mock.patch('simsurveillance.AgentModel')
+    def test_symptoms(self, mock_agent_model):
+        population = simsurveillance.ArrayPopulation(mock_agent_model, 5)
+        p = simsurveillance.AgentView(population, 2)
+        p.symptoms = True
+        self.assertTrue(population.person(2).symptoms)
+        self.assertFalse(population.person(1).symptoms)
 
 
 if __name__ == '__main__':
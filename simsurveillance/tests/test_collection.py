@@ -2,6 +2,7 @@
 """
 
 import unittest
+import numpy as np
 import simsurveillance
 
 
@@ -30,6 +31,68 @@ class TestPersonCollection(unittest.TestCase):
         collection.remove_person(person)
         self.assertEqual(len(collection), 0)
 
+    def test_add_many(self):
+        collection = simsurveillance.PersonCollection()
+        persons = [simsurveillance.Person(None) for _ in range(3)]
+        collection.add_person(persons[1])
+
+        collection.add_many([persons[0], persons[1], persons[2], persons[0]])
+        self.assertEqual(list(collection),
+                         [persons[1], persons[0], persons[2]])
+
+        collection.remove_person(persons[1])
+        self.assertEqual(list(collection), [persons[2], persons[0]])
+
+    def test_remove_many(self):
+        collection = simsurveillance.PersonCollection()
+        persons = [simsurveillance.Person(None) for _ in range(6)]
+        collection.add_many(persons)
+
+        # Gaps are filled with the remaining persons from the end, in order
+        collection.remove_many([persons[4], persons[0], persons[2]])
+        self.assertEqual(list(collection),
+                         [persons[3], persons[1], persons[5]])
+        for i, person in enumerate(collection):
+            self.assertEqual(collection.persons_map[person], i)
+
+        collection.remove_many([])
+        self.assertEqual(len(collection), 3)
+
+        with self.assertRaises(KeyError):
+            collection.remove_many([persons[1], persons[0]])
+        self.assertEqual(len(collection), 3)
+
+        collection.remove_many(list(collection))
+        self.assertEqual(len(collection), 0)
+
+    def test_move_many(self):
+        source = simsurveillance.PersonCollection()
+        destination = simsurveillance.PersonCollection()
+        persons = [simsurveillance.Person(None) for _ in range(4)]
+        source.add_many(persons)
+
+        source.move_many(persons[:2], destination)
+        self.assertEqual(list(source), [persons[2], persons[3]])
+        self.assertEqual(list(destination), persons[:2])
+
+    def test_sample_and_pop(self):
+        collection = simsurveillance.PersonCollection()
+        persons = [simsurveillance.Person(None) for _ in range(10)]
+        collection.add_many(persons)
+
+        sample = collection.sample_and_pop(4, np.random.default_rng(1))
+        self.assertEqual(len(sample), 4)
+        self.assertEqual(len(set(sample)), 4)
+        self.assertEqual(len(collection), 6)
+        for person in sample:
+            self.assertNotIn(person, collection)
+
+        # Same people as random_people with the same generator
+        collection = simsurveillance.PersonCollection()
+        collection.add_many(persons)
+        self.assertEqual(
+            collection.random_people(4, np.random.default_rng(1)), sample)
+
     def test_random_persons(self):
         collection = simsurveillance.PersonCollection()
         person1 = simsurveillance.Person(None)
@@ -39,8 +102,9 @@ class TestPersonCollection(unittest.TestCase):
         collection.add_person(person2)
         collection.add_person(person3)
 
+        rng = np.random.default_rng(2)
         for _ in range(100):
-            selected_people = collection.random_people(2)
+            selected_people = collection.random_people(2, rng)
             self.assertEqual(len(selected_people), 2)
             self.assertIsNot(selected_people[0], selected_people[1])
             self.assertIn(selected_people[0], [person1, person2, person3])
@@ -63,6 +127,19 @@ class TestPersonCollection(unittest.TestCase):
         self.assertTrue(person1 in collection)
         self.assertFalse(person2 in collection)
 
+    def test_default_rng(self):
+        # Without a generator, the collection draws reproducibly from its own
+        persons = [simsurveillance.Person(None) for _ in range(5)]
+        samples = []
+        for _ in range(2):
+            collection = simsurveillance.PersonCollection()
+            collection.add_many(persons)
+            collection.shuffle()
+            samples.append([list(collection), collection.random_people(2),
+                            collection.sample_and_pop(2)])
+        self.assertEqual(samples[0], samples[1])
+        self.assertEqual(len(collection), 3)
+
     def test_shuffle(self):
         collection = simsurveillance.PersonCollection()
         person1 = simsurveillance.Person(None)
@@ -73,13 +150,178 @@ class TestPersonCollection(unittest.TestCase):
         collection.add_person(person3)
 
         person1_not_first = 0
+        rng = np.random.default_rng(2)
         for _ in range(100):
-            collection.shuffle()
+            collection.shuffle(rng)
             if collection[0] is not person1:
                 person1_not_first += 1
 
         self.assertGreater(person1_not_first, 0)
 
 
+class TestArrayPersonCollection(unittest.TestCase):
+
+    def setUp(self):
+        self.population = simsurveillance.ArrayPopulation(None, 5)
+
+    def test_init(self):
+        collection = simsurveillance.ArrayPersonCollection(
+            self.population, [3, 1])
+        self.assertEqual(len(collection), 2)
+        self.assertEqual(collection[0].agent_id, 3)
+        self.assertEqual(collection[1].agent_id, 1)
+
+    def test_add_person(self):
+        collection = simsurveillance.ArrayPersonCollection(self.population)
+
+        person = self.population.person(2)
+        collection.add_person(person)
+        self.assertEqual(collection[0].agent_id, 2)
+
+        # Test adding an existing person
+        collection.add_person(person)
+        self.assertEqual(len(collection), 1)
+
+    def test_remove_person(self):
+        collection = simsurveillance.ArrayPersonCollection(
+            self.population, [0, 1, 2])
+
+        collection.remove_person(self.population.person(0))
+        self.assertEqual(len(collection), 2)
+        self.assertEqual(collection[0].agent_id, 2)
+        self.assertEqual(collection[1].agent_id, 1)
+
+        collection.remove_person(self.population.person(1))
+        self.assertEqual(len(collection), 1)
+        self.assertEqual(collection[-1].agent_id, 2)
+
+        with self.assertRaises(KeyError):
+            collection.remove_person(self.population.person(1))
+
+    def test_add_many(self):
+        collection = simsurveillance.ArrayPersonCollection(
+            self.population, [1])
+
+        collection.add_many(
+            [self.population.person(i) for i in [0, 1, 2, 0]])
+        self.assertEqual([p.agent_id for p in collection], [1, 0, 2])
+        self.assertEqual(list(collection.positions[:3]), [1, 0, 2])
+
+    def test_remove_many(self):
+        population = simsurveillance.ArrayPopulation(None, 6)
+        collection = simsurveillance.ArrayPersonCollection(
+            population, range(6))
+
+        # Gaps are filled as in PersonCollection.remove_many
+        collection.remove_many([population.person(i) for i in [4, 0, 2]])
+        self.assertEqual([p.agent_id for p in collection], [3, 1, 5])
+        self.assertEqual(list(collection.positions), [-1, 1, -1, 0, -1, 2])
+
+        collection.remove_many([])
+        self.assertEqual(len(collection), 3)
+
+        with self.assertRaises(KeyError):
+            collection.remove_many([population.person(i) for i in [1, 0]])
+        self.assertEqual(len(collection), 3)
+
+    def test_move_many(self):
+        source = simsurveillance.ArrayPersonCollection(
+            self.population, range(4))
+        destination = simsurveillance.ArrayPersonCollection(self.population)
+
+        source.move_many([self.population.person(i) for i in [0, 1]],
+                         destination)
+        self.assertEqual([p.agent_id for p in source], [2, 3])
+        self.assertEqual([p.agent_id for p in destination], [0, 1])
+
+    def test_random_agent_ids(self):
+        collection = simsurveillance.ArrayPersonCollection(
+            self.population, [4, 0, 2])
+        agent_ids = collection.random_agent_ids(2, np.random.default_rng(3))
+        self.assertEqual(len(set(agent_ids)), 2)
+        self.assertTrue(set(agent_ids) <= {4, 0, 2})
+
+        self.assertEqual(
+            [p.agent_id for p in collection.random_people(
+                2, np.random.default_rng(3))],
+            list(agent_ids))
+
+    def test_sample_and_pop(self):
+        population = simsurveillance.ArrayPopulation(None, 10)
+        collection = simsurveillance.ArrayPersonCollection(
+            population, range(10))
+
+        sample = collection.sample_and_pop(4, np.random.default_rng(1))
+        self.assertEqual(len(set(sample)), 4)
+        self.assertEqual(len(collection), 6)
+        for person in sample:
+            self.assertNotIn(person, collection)
+
+        collection = simsurveillance.ArrayPersonCollection(
+            population, range(10))
+        self.assertEqual(
+            collection.random_people(4, np.random.default_rng(1)), sample)
+
+    def test_random_persons(self):
+        collection = simsurveillance.ArrayPersonCollection(
+            self.population, [0, 1, 2])
+
+        rng = np.random.default_rng(2)
+        for _ in range(100):
+            selected_people = collection.random_people(2, rng)
+            self.assertEqual(len(selected_people), 2)
+            self.assertNotEqual(selected_people[0].agent_id,
+                                selected_people[1].agent_id)
+            self.assertIn(selected_people[0].agent_id, [0, 1, 2])
+            self.assertIn(selected_people[1].agent_id, [0, 1, 2])
+
+    def test_iter(self):
+        collection = simsurveillance.ArrayPersonCollection(
+            self.population, [4, 1])
+        self.assertEqual([p.agent_id for p in collection], [4, 1])
+
+    def test_contains(self):
+        collection = simsurveillance.ArrayPersonCollection(
+            self.population, [4])
+
+        self.assertTrue(self.population.person(4) in collection)
+        self.assertFalse(self.population.person(3) in collection)
+
+    def test_getitem(self):
+        collection = simsurveillance.ArrayPersonCollection(
+            self.population, [4])
+        with self.assertRaises(IndexError):
+            collection[1]
+
+    def test_default_rng(self):
+        # Without a generator, the collection draws reproducibly from its own
+        samples = []
+        for _ in range(2):
+            collection = simsurveillance.ArrayPersonCollection(
+                self.population, [0, 1, 2, 3, 4])
+            collection.shuffle()
+            samples.append([list(collection.random_agent_ids(3)),
+                            [p.agent_id for p in collection.random_people(2)],
+                            [p.agent_id
+                             for p in collection.sample_and_pop(2)]])
+        self.assertEqual(samples[0], samples[1])
+        self.assertEqual(len(collection), 3)
+
+    def test_shuffle(self):
+        collection = simsurveillance.ArrayPersonCollection(
+            self.population, [0, 1, 2])
+
+        person0_not_first = 0
+        rng = np.random.default_rng(2)
+        for _ in range(100):
+            collection.shuffle(rng)
+            if collection[0].agent_id != 0:
+                person0_not_first += 1
+            self.assertEqual(
+                collection.positions[collection[0].agent_id], 0)
+
+        self.assertGreater(person0_not_first, 0)
+
+
 if __name__ == '__main__':
     unittest.main()
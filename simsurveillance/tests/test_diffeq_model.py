@@ -2,6 +2,8 @@
 """
 
 import unittest
+import unittest.mock
+import numpy as np
 import pints
 import simsurveillance
 
@@ -39,6 +41,181 @@ class TestSIRSModel(unittest.TestCase):
 
         self.assertEqual(y.shape, (len(self.test_times), 2))
 
+    def test_simulate_output(self):
+        m = simsurveillance.SIRSModel(init_condition=self.test_init_cond,
+                                      N=500)
+        self.assertIsNone(m.output_df)
+        self.assertIsNone(m.final_state)
+
+        y = m.simulate(self.test_params, self.test_times)
+        df = m.output_df
+        np.testing.assert_array_equal(
+            m.final_state, df[['S', 'I', 'R']].iloc[-1])
+
+        # Prevalence, and the incidence between time points
+        np.testing.assert_allclose(y[:, 0], df['I'] / 500)
+        np.testing.assert_allclose(
+            y[:, 1], [0] + list(np.diff(df['infections'])))
+        self.assertEqual(y[0, 1], 0)
+
+        # Built once, until the next simulation
+        self.assertIs(m.output_df, df)
+        m.simulate([0.2, 0.01, 0.005], self.test_times)
+        self.assertIsNot(m.output_df, df)
+        self.assertGreater(m.output_df['infections'].iloc[-1],
+                           df['infections'].iloc[-1])
+
+    def test_n_outputs(self):
+        m = simsurveillance.SIRSModel()
+        self.assertEqual(m.n_outputs(), 2)
+
+        # Usable in a pints problem
+        problem = pints.MultiOutputProblem(
+            m, self.test_times, np.zeros((len(self.test_times), 2)))
+        self.assertEqual(problem.n_outputs(), 2)
+
+    def test_set_method(self):
+        m = simsurveillance.SIRSModel(init_condition=self.test_init_cond)
+        y = m.simulate(self.test_params, self.test_times)
+
+        for method in ['Radau', 'BDF', 'LSODA']:
+            m.set_method(method)
+            np.testing.assert_allclose(
+                m.simulate(self.test_params, self.test_times), y,
+                rtol=1e-3, atol=1e-6)
+
+        with self.assertRaises(ValueError):
+            m.set_method('Euler')
+
+    def test_simulateS1(self):
+        params = np.array([0.4, 0.1, 0.02])
+        times = np.arange(0, 60.0)
+
+        for method in ['RK45', 'BDF']:
+            m = simsurveillance.SIRSModel(
+                init_condition=self.test_init_cond, N=1000, method=method)
+            y, dy = m.simulateS1(params, times)
+
+            self.assertEqual(y.shape, (60, 2))
+            self.assertEqual(dy.shape, (60, 2, 3))
+            np.testing.assert_allclose(
+                y, m.simulate(params, times), rtol=1e-3, atol=1e-2)
+
+            # Compare with central finite differences
+            for k in range(3):
+                h = 1e-6 * params[k]
+                step = np.zeros(3)
+                step[k] = h
+                fd = (m.simulate(params + step, times)
+                      - m.simulate(params - step, times)) / (2 * h)
+                np.testing.assert_allclose(
+                    dy[:, :, k], fd, atol=1e-2 * np.max(np.abs(fd)))
+
+        # Usable for the gradients of a pints problem
+        problem = pints.MultiOutputProblem(m, times, y)
+        _, dy_problem = problem.evaluateS1(params)
+        np.testing.assert_allclose(dy_problem, dy)
+
+    def test_simulate_batch(self):
+        m = simsurveillance.SIRSModel(init_condition=self.test_init_cond,
+                                      N=1000)
+        parameters = np.array([[0.4, 0.1, 0.02],
+                               [0.9, 0.3, 0.001],
+                               [0.1, 0.2, 0.05],
+                               [2.0, 0.05, 0.01]])
+        times = np.arange(0, 80.0)
+
+        y = m.simulate_batch(parameters, times)
+        self.assertEqual(y.shape, (4, 80, 2))
+        for p, y_p in zip(parameters, y):
+            np.testing.assert_allclose(
+                y_p, m.simulate(p, times), rtol=1e-3, atol=2e-2)
+        np.testing.assert_array_equal(y[:, 0, 1], 0)
+
+        # Irregular time points, starting after 0
+        y = m.simulate_batch(parameters[:2], self.test_times)
+        for p, y_p in zip(parameters[:2], y):
+            np.testing.assert_allclose(
+                y_p, m.simulate(p, self.test_times), rtol=1e-3, atol=2e-2)
+
+        # A single parameter vector and a single time point
+        self.assertEqual(m.simulate_batch([0.4, 0.1, 0.02], [3]).shape,
+                         (1, 1, 2))
+
+    def test_cache(self):
+        params = [0.4, 0.1, 0.02]
+        times = np.arange(0, 50.0)
+        uncached = simsurveillance.SIRSModel(
+            init_condition=self.test_init_cond, N=100)
+        expected = uncached.simulate(params, times)
+        self.assertEqual(uncached.cache_info().maxsize, 0)
+
+        m = simsurveillance.SIRSModel(
+            init_condition=self.test_init_cond, N=100, cache_size=2)
+        np.testing.assert_allclose(
+            m.simulate(params, times), expected, rtol=1e-6, atol=1e-6)
+        self.assertEqual(m.cache_info(), (0, 1, 2, 1))
+
+        with unittest.mock.patch('scipy.integrate.solve_ivp') as solve:
+            # Repeated calls, and new time points within the solved range
+            np.testing.assert_allclose(
+                m.simulate(params, times), expected, rtol=1e-6, atol=1e-6)
+            y = m.simulate(params, [0, 12.5, 30])
+            self.assertEqual(solve.call_count, 0)
+        self.assertEqual(m.cache_info().hits, 2)
+        np.testing.assert_allclose(
+            y, uncached.simulate(params, [0, 12.5, 30]), rtol=1e-4)
+
+        # The output DataFrame follows the cached solution
+        self.assertEqual(list(m.output_df['time']), [0, 12.5, 30])
+
+        # Shared between population sizes
+        m.set_population_size(200)
+        np.testing.assert_allclose(
+            m.simulate(params, times)[:, 1], 2 * expected[:, 1], rtol=1e-6)
+        self.assertEqual(m.cache_info().hits, 3)
+
+        # Beyond the solved range, or another initial condition
+        m.simulate(params, np.arange(0, 60.0))
+        m.set_init_condition([0.9, 0.1, 0.0])
+        m.simulate(params, times)
+        self.assertEqual(m.cache_info(), (3, 3, 2, 2))
+
+        # The least recently used solution is evicted
+        m.simulate([0.5, 0.1, 0.02], times)
+        m.set_init_condition(self.test_init_cond)
+        m.simulate(params, times)
+        self.assertEqual(m.cache_info(), (3, 5, 2, 2))
+
+        m.set_cache_size(1)
+        self.assertEqual(m.cache_info().currsize, 1)
+        m.clear_cache()
+        self.assertEqual(m.cache_info(), (0, 0, 1, 0))
+
+    def test_jacobian(self):
+        from simsurveillance import diffeq_model
+
+        rates = (0.4, 0.1, 0.02)
+        y = np.array([0.6, 0.3, 0.1, 0.5])
+        z = np.linspace(0.1, 1.6, 16)
+
+        def sensitivity_rhs(z):
+            sensitivities = z[4:].reshape(4, 3)
+            return np.concatenate((
+                diffeq_model._rhs(z[:4], *rates),
+                (diffeq_model._jacobian(z[:4], *rates) @ sensitivities
+                 + diffeq_model._parameter_jacobian(z[:4])).ravel()))
+
+        for fun, jac, x in [
+                (lambda y: diffeq_model._rhs(y, *rates),
+                 lambda y: diffeq_model._jacobian(y, *rates), y),
+                (sensitivity_rhs,
+                 lambda z: diffeq_model._sensitivity_jacobian(z, *rates), z)]:
+            h = 1e-7
+            fd = np.array([(fun(x + h * e) - fun(x - h * e)) / (2 * h)
+                           for e in np.eye(len(x))]).T
+            np.testing.assert_allclose(jac(x), fd, atol=1e-6)
+
     def test_set_population_size(self):
         # test changing the population size
         m = simsurveillance.SIRSModel(init_condition=self.test_init_cond)
@@ -0,0 +1,185 @@
+"""Test emulation.py
+"""
+
+import unittest
+import numpy as np
+import scipy.optimize
+import simsurveillance
+
+
+def model_factory(parameters, seed):
+    model = simsurveillance.SIRSAgentModel(200, seed=seed,
+                                           record_events=False)
+    model.params.set_parameters(dict(zip(
+        ['transmission_rate', 'recovery_rate', 'waning_rate'], parameters)))
+    model.initialize_infection(10)
+    return model
+
+
+def prevalence_survey_factory(model):
+    return simsurveillance.PrevalenceSurvey(
+        model, simsurveillance.DiseaseTest(), [5, 10, 15], [50, 50, 50])
+
+
+def symptomatic_testing_factory(model):
+    return simsurveillance.SymptomaticTesting(
+        model, simsurveillance.DiseaseTest(), start_time=14)
+
+
+def quadratic(parameters, seed):
+    x = np.asarray(parameters)
+    noise = np.random.default_rng(seed).normal(0, 0.01, 2)
+    return np.array([x[0] ** 2 + x[1], 2 * x[1]]) + noise
+
+
+class TestSimulationSummaries(unittest.TestCase):
+
+    def test_call(self):
+        simulator = simsurveillance.SimulationSummaries(
+            model_factory,
+            [prevalence_survey_factory, symptomatic_testing_factory],
+            list(range(16)))
+
+        statistics = simulator([0.5, 0.2, 0.02], 1)
+        self.assertEqual(statistics.shape, (3 + 2, ))
+        self.assertTrue(np.all(statistics >= 0))
+        self.assertTrue(np.array_equal(
+            statistics, simulator([0.5, 0.2, 0.02], 1)))
+
+        simulator = simsurveillance.SimulationSummaries(
+            model_factory, [prevalence_survey_factory], list(range(16)),
+            statistics=lambda observers: [sum(observers[0].num_positive)])
+        self.assertEqual(simulator([0.5, 0.2, 0.02], 1).shape, (1, ))
+
+
+class TestODESummaries(unittest.TestCase):
+
+    def test_call(self):
+        model = simsurveillance.SIRSModel([0.99, 0.01, 0.0], N=1000)
+        summaries = simsurveillance.ODESummaries(
+            model, [5, 10], [100, 200], [3, 4], sensitivity=0.9,
+            specificity=0.95, ascertainment=0.25)
+
+        parameters = [0.5, 0.2, 0.02]
+        statistics = summaries(parameters)
+        self.assertEqual(statistics.shape, (4, ))
+
+        output = model.simulate(parameters, np.arange(11))
+        expected_prevalence = output[[5, 10], 0]
+        self.assertTrue(np.allclose(
+            statistics[:2],
+            [100, 200] * (0.9 * expected_prevalence
+                          + 0.05 * (1 - expected_prevalence)),
+            rtol=1e-4))
+        self.assertTrue(np.allclose(
+            statistics[2:], 0.25 * output[[3, 4], 1], rtol=1e-4))
+
+        batch = summaries([parameters, [0.3, 0.1, 0.01]])
+        self.assertEqual(batch.shape, (2, 4))
+        self.assertTrue(np.allclose(batch[0], statistics))
+
+        with self.assertRaises(ValueError):
+            simsurveillance.ODESummaries(model, [5, 10], [100])
+
+
+class TestGaussianProcessEmulator(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(1)
+        cls.parameters = rng.random((40, 2))
+        cls.statistics = np.array(
+            [quadratic(p, seed) for seed, p in enumerate(cls.parameters)])
+
+    def test_predict(self):
+        emulator = simsurveillance.GaussianProcessEmulator([0, 0], [1, 1])
+        with self.assertRaises(RuntimeError):
+            emulator.predict([[0.5, 0.5]])
+
+        emulator.fit(self.parameters, self.statistics)
+        test_parameters = np.random.default_rng(2).random((10, 2))
+        mean, variance = emulator.predict(test_parameters)
+        self.assertEqual(mean.shape, (10, 2))
+        self.assertEqual(variance.shape, (10, 2))
+
+        expected = np.column_stack((
+            test_parameters[:, 0] ** 2 + test_parameters[:, 1],
+            2 * test_parameters[:, 1]))
+        self.assertLess(np.max(np.abs(mean - expected)), 0.05)
+
+        # The noise variance is about that of the simulator
+        _, noise_free = emulator.predict(test_parameters, False)
+        self.assertTrue(np.all(noise_free < variance))
+        self.assertTrue(np.all(variance - noise_free < 0.05 ** 2))
+
+    def test_gradient(self):
+        emulator = simsurveillance.GaussianProcessEmulator(
+            [0, 0], [1, 1]).fit(self.parameters, self.statistics)
+        x = np.log([0.3, 0.7, 1.5, 0.01])
+        error = scipy.optimize.check_grad(
+            lambda x: emulator._negative_log_marginal_likelihood(x)[0],
+            lambda x: emulator._negative_log_marginal_likelihood(x)[1], x)
+        self.assertLess(error, 1e-3)
+
+    def test_low_fidelity(self):
+        # A low-fidelity model off by a scale factor, which the regression
+        # corrects
+        def low_fidelity(parameters):
+            return 0.5 * np.column_stack((
+                parameters[:, 0] ** 2 + parameters[:, 1],
+                2 * parameters[:, 1]))
+
+        emulator = simsurveillance.GaussianProcessEmulator(
+            [0, 0], [1, 1], low_fidelity).fit(
+                self.parameters[:10], self.statistics[:10])
+        mean, _ = emulator.predict([[0.5, 0.5]])
+        self.assertTrue(np.allclose(mean, [[0.75, 1.0]], atol=0.02))
+
+
+class TestHistoryMatching(unittest.TestCase):
+
+    def setUp(self):
+        self.observed = quadratic([0.6, 0.3], 0)
+        self.history_matching = simsurveillance.HistoryMatching(
+            quadratic, self.observed, [0, 0], [1, 1])
+
+    def test_run(self):
+        history_matching = self.history_matching
+        with self.assertRaises(RuntimeError):
+            history_matching.abc()
+
+        non_implausible = history_matching.run(
+            num_waves=3, design_size=20, num_candidates=5000)
+        self.assertEqual(history_matching.num_simulations, 60)
+        self.assertEqual(len(history_matching.waves), 3)
+
+        fractions = [wave.non_implausible_fraction
+                     for wave in history_matching.waves]
+        self.assertLess(fractions[-1], 0.05)
+        self.assertGreater(len(non_implausible), 0)
+        self.assertTrue(np.all(
+            history_matching.implausibility(non_implausible)
+            <= history_matching.threshold))
+
+        # The truth is not ruled out
+        self.assertLessEqual(
+            history_matching.implausibility([0.6, 0.3])[0], 3)
+
+        samples = history_matching.abc(num_samples=100)
+        self.assertEqual(samples.shape, (100, 2))
+        self.assertTrue(np.allclose(samples.mean(axis=0), [0.6, 0.3],
+                                    atol=0.05))
+        self.assertEqual(history_matching.num_simulations, 60)
+
+    def test_run_workers(self):
+        self.history_matching.run(num_waves=1, design_size=10)
+        parallel = simsurveillance.HistoryMatching(
+            quadratic, self.observed, [0, 0], [1, 1])
+        parallel.run(num_waves=1, design_size=10, num_workers=2)
+        self.assertTrue(np.array_equal(
+            self.history_matching.waves[0].statistics,
+            parallel.waves[0].statistics))
+
+
+if __name__ == '__main__':
+    unittest.main()
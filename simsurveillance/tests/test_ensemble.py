@@ -0,0 +1,99 @@
+"""Test the classes of the ensemble.py
+"""
+
+import tempfile
+import unittest
+import simsurveillance
+
+
+def model_factory(seed):
+    model = simsurveillance.SIRSAgentModel(100, seed=seed)
+    model.params.set_parameters({'transmission_rate': 0.5,
+                                 'recovery_rate': 0.2})
+    model.initialize_infection(5)
+    return model
+
+
+def symptomatic_testing_factory(model):
+    return simsurveillance.SymptomaticTesting(
+        model, simsurveillance.DiseaseTest())
+
+
+def prevalence_survey_factory(model):
+    return simsurveillance.PrevalenceSurvey(
+        model, simsurveillance.DiseaseTest(0.9, 0.9), [5, 10], [20, 20])
+
+
+class TestEnsemble(unittest.TestCase):
+
+    def setUp(self):
+        self.ensemble = simsurveillance.Ensemble(
+            model_factory,
+            [symptomatic_testing_factory, prevalence_survey_factory,
+             prevalence_survey_factory],
+            [0, 5, 10],
+            num_replicates=4)
+
+    def test_replicate_seeds(self):
+        seeds = self.ensemble.replicate_seeds()
+        self.assertEqual(len(seeds), 4)
+        self.assertEqual(len(set(seeds)), 4)
+        self.assertEqual(seeds, self.ensemble.replicate_seeds())
+
+    def test_run(self):
+        results = self.ensemble.run()
+
+        self.assertEqual(
+            list(results.columns),
+            ['replicate', 'source', 'time', 'variable', 'value'])
+        self.assertEqual(set(results['replicate']), {0, 1, 2, 3})
+        self.assertEqual(
+            set(results['source']),
+            {'model', 'SymptomaticTesting', 'PrevalenceSurvey',
+             'PrevalenceSurvey_2'})
+
+        model_output = results[(results['source'] == 'model')
+                               & (results['replicate'] == 0)]
+        self.assertEqual(
+            set(model_output['variable']),
+            {'SUSCEPTIBLE', 'INFECTED', 'RECOVERED', 'transmissions'})
+        self.assertEqual(len(model_output), 3 * 4)
+
+    def test_run_named_observers(self):
+        ensemble = simsurveillance.Ensemble(
+            model_factory, {'survey': prevalence_survey_factory}, [0, 5],
+            num_replicates=2)
+        results = ensemble.run()
+        self.assertEqual(set(results['source']), {'model', 'survey'})
+
+    def test_run_parallel(self):
+        # The same results whatever the number of workers
+        serial = self.ensemble.run()
+        parallel = self.ensemble.run(num_workers=2)
+        self.assertTrue(serial.equals(parallel))
+
+    def test_run_sink(self):
+        serial = self.ensemble.run()
+
+        with tempfile.TemporaryDirectory() as directory:
+            sink = simsurveillance.ResultSink(directory)
+            self.assertIsNone(self.ensemble.run(num_workers=2, sink=sink))
+
+            self.assertEqual(len(list(sink)), 4)
+            results = sink.read()
+
+        self.assertEqual(len(results), len(serial))
+        self.assertTrue(
+            (results['value'].values == serial['value'].values).all())
+
+
+class TestResultSink(unittest.TestCase):
+
+    def test_init(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(ValueError):
+                simsurveillance.ResultSink(directory, file_format='xlsx')
+
+
+if __name__ == '__main__':
+    unittest.main()
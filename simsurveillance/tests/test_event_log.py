@@ -0,0 +1,76 @@
+"""Test event_log.py
+"""
+
+import unittest
+import numpy as np
+import simsurveillance
+from simsurveillance import InfectionStatus as InfStatus
+
+
+class TestEventLog(unittest.TestCase):
+
+    def test_init(self):
+        log = simsurveillance.EventLog()
+        self.assertEqual(len(log), 0)
+        self.assertEqual(len(log.times), 0)
+
+    def test_record(self):
+        log = simsurveillance.EventLog(capacity=2)
+        log.record(3, InfStatus.INFECTED, 1)
+        log.record_many([4, 5, 6], InfStatus.INFECTED, 2)
+        log.record(3, InfStatus.RECOVERED, 4)
+        log.record_many([], InfStatus.RECOVERED, 4)
+
+        # The arrays grow as needed
+        self.assertEqual(len(log), 5)
+        self.assertEqual(list(log.times), [1, 2, 2, 2, 4])
+        self.assertEqual(list(log.agent_ids), [3, 4, 5, 6, 3])
+        self.assertEqual(list(log.new_statuses),
+                         [InfStatus.INFECTED.value] * 4
+                         + [InfStatus.RECOVERED.value])
+
+    def test_history(self):
+        log = simsurveillance.EventLog()
+        log.record(3, InfStatus.INFECTED, 1)
+        log.record(4, InfStatus.INFECTED, 1)
+        log.record(3, InfStatus.RECOVERED, 4)
+        log.record(3, InfStatus.SUSCEPTIBLE, 4)
+
+        self.assertEqual(log.history(3), {1: InfStatus.INFECTED,
+                                          4: InfStatus.SUSCEPTIBLE})
+        self.assertEqual(log.history(7), {})
+
+    def test_events_at(self):
+        log = simsurveillance.EventLog()
+        log.record_many([4, 5], InfStatus.INFECTED, 2)
+        log.record(1, InfStatus.RECOVERED, 2)
+        log.record(4, InfStatus.RECOVERED, 3)
+
+        agent_ids, new_statuses = log.events_at(2)
+        self.assertEqual(list(agent_ids), [4, 5, 1])
+        self.assertEqual(list(new_statuses), [InfStatus.INFECTED.value] * 2
+                         + [InfStatus.RECOVERED.value])
+
+        agent_ids, new_statuses = log.events_at(5)
+        self.assertEqual(len(agent_ids), 0)
+
+    def test_to_dataframe(self):
+        log = simsurveillance.EventLog()
+        log.record_many([4, 5], InfStatus.INFECTED, 2)
+        log.record(4, InfStatus.RECOVERED, 3)
+
+        df = log.to_dataframe()
+        self.assertEqual(list(df.columns), ['time', 'agent_id', 'new_status'])
+        self.assertEqual(list(df['time']), [2, 2, 3])
+        self.assertEqual(list(df['agent_id']), [4, 5, 4])
+        self.assertEqual(list(df['new_status']),
+                         ['INFECTED', 'INFECTED', 'RECOVERED'])
+
+        # The DataFrame does not change with the log
+        log.record(5, InfStatus.RECOVERED, 3)
+        self.assertEqual(len(df), 3)
+        self.assertTrue(np.all(df['time'] == [2, 2, 3]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""Test fitting.py
+"""
+
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas
+import pints
+import simsurveillance
+
+
+class TestMCMCFit(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.model = simsurveillance.SIRSModel(
+            init_condition=[0.99, 0.01, 0.0], N=10000)
+        cls.params = [0.4, 0.1, 0.02]
+        times = np.arange(5, 60, 5)
+
+        output = cls.model.simulate(cls.params, np.arange(60))
+        cls.prevalence = pandas.DataFrame({
+            'time': times,
+            'num_tested': 200,
+            'num_positive': np.rint(200 * output[times, 0]).astype(int)})
+        cls.cases = pandas.DataFrame({
+            'time': times,
+            'cases': np.rint(output[times, 1]).astype(int)})
+
+        cls.log_prior = pints.UniformLogPrior([0, 0, 0], [2, 1, 1])
+        cls.x0 = [[0.38, 0.11, 0.02], [0.42, 0.09, 0.025],
+                  [0.4, 0.1, 0.018]]
+
+    def fit(self, **kwargs):
+        return simsurveillance.MCMCFit.from_records(
+            self.model, self.log_prior, self.x0, prevalence=self.prevalence,
+            cases=self.cases, initial_phase_iterations=20, **kwargs)
+
+    def test_from_records(self):
+        fit = self.fit()
+        self.assertEqual(fit.num_chains, 3)
+        self.assertIsInstance(
+            fit.log_posterior.log_likelihood(),
+            pints.SumOfIndependentLogLikelihoods)
+
+        fit = simsurveillance.MCMCFit.from_records(
+            self.model, self.log_prior, self.x0, cases=self.cases)
+        self.assertIsInstance(fit.log_posterior.log_likelihood(),
+                              simsurveillance.CasesLogLikelihood)
+
+        with self.assertRaises(ValueError):
+            simsurveillance.MCMCFit.from_records(
+                self.model, self.log_prior, self.x0)
+
+    def test_invalid(self):
+        posterior = self.fit().log_posterior
+        with self.assertRaises(ValueError):
+            simsurveillance.MCMCFit(posterior, self.x0,
+                                    method=pints.DifferentialEvolutionMCMC)
+        with self.assertRaises(ValueError):
+            simsurveillance.MCMCFit(posterior, [[0.4, 0.1]])
+
+    def test_run(self):
+        fit = self.fit()
+        samples = fit.run(60, checkpoint_every=20)
+
+        self.assertEqual(samples.shape, (3, 60, 3))
+        self.assertEqual(len(fit.reports), 3)
+        self.assertEqual([r.iteration for r in fit.reports], [20, 40, 60])
+        self.assertTrue(np.all(fit.reports[-1].evaluations == 60))
+        self.assertTrue(np.all(fit.reports[-1].evaluations_per_second > 0))
+        self.assertEqual(fit.reports[-1].rhat.shape, (3, ))
+
+        # The chains stay near the true parameters
+        self.assertTrue(np.allclose(
+            np.mean(samples[:, 30:], axis=(0, 1)), self.params, rtol=0.2))
+
+        # Reproducible, and the global random state is left alone
+        np.random.seed(1)
+        expected = np.random.random()
+        np.random.seed(1)
+        self.assertTrue(np.array_equal(self.fit().run(60), samples))
+        self.assertEqual(np.random.random(), expected)
+
+    def test_run_workers(self):
+        samples = self.fit().run(30, checkpoint_every=10)
+        parallel = self.fit().run(30, num_workers=2, checkpoint_every=10)
+        self.assertTrue(np.array_equal(samples, parallel))
+
+    def test_sensitivities(self):
+        fit = self.fit(method=pints.MALAMCMC, sigma0=[1e-4, 1e-4, 1e-5])
+        samples = fit.run(10)
+        self.assertEqual(samples.shape, (3, 10, 3))
+        self.assertTrue(np.all(np.isfinite(samples)))
+
+    def test_checkpoint(self):
+        expected = self.fit().run(60, checkpoint_every=20)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'fit.pickle')
+
+            # Interrupted after 40 iterations, then resumed
+            fit = self.fit()
+            fit.run(40, checkpoint=path, checkpoint_every=20)
+            self.assertTrue(os.path.exists(path))
+
+            fit = self.fit()
+            samples = fit.run(60, checkpoint=path, checkpoint_every=20)
+            self.assertEqual(len(fit.reports), 1)
+            self.assertTrue(np.array_equal(samples, expected))
+
+            # Asking for fewer iterations returns those already run
+            samples = self.fit().run(30, checkpoint=path)
+            self.assertTrue(np.array_equal(samples, expected[:, :30]))
+
+            # A checkpoint of another fit is refused
+            with self.assertRaises(ValueError):
+                self.fit(method=pints.MetropolisRandomWalkMCMC).run(
+                    60, checkpoint=path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""Test incidence.py
+"""
+
+import unittest
+import numpy as np
+import simsurveillance
+
+
+class TestIncidenceIndex(unittest.TestCase):
+
+    def test_init(self):
+        index = simsurveillance.IncidenceIndex()
+        self.assertEqual(index.window, 2)
+        self.assertEqual(index.new_infections(0), [])
+
+    def test_record(self):
+        index = simsurveillance.IncidenceIndex()
+        index.record(['a', 'b', 'c'], [True, False, True], 1)
+        index.record(['d'], [False], 1)
+
+        self.assertEqual(index.new_infections(1), ['a', 'c', 'b', 'd'])
+        self.assertEqual(index.new_infections(1, symptomatic=True),
+                         ['a', 'c'])
+        self.assertEqual(index.new_infections(1, symptomatic=False),
+                         ['b', 'd'])
+        self.assertEqual(index.new_infections(2), [])
+
+        # Only the most recent time steps are retained
+        index.record(['e'], [True], 2)
+        self.assertEqual(index.new_infections(1, symptomatic=True),
+                         ['a', 'c'])
+        index.record(['f'], [True], 4)
+        self.assertEqual(index.new_infections(1), [])
+        self.assertEqual(index.new_infections(2), [])
+        self.assertEqual(index.new_infections(4), ['f'])
+
+    def test_subscribe(self):
+        index = simsurveillance.IncidenceIndex()
+        calls = []
+
+        def callback(time, symptomatic, asymptomatic):
+            calls.append((time, symptomatic, asymptomatic))
+
+        index.subscribe(callback)
+        index.record(['a', 'b'], [True, False], 1)
+        index.record([], [], 2)
+        self.assertEqual(calls, [(1, ['a'], ['b']), (2, [], [])])
+
+        index.unsubscribe(callback)
+        index.record(['c'], [True], 3)
+        self.assertEqual(len(calls), 2)
+
+    def test_record_agent_ids(self):
+        population = simsurveillance.ArrayPopulation(None, 10)
+        index = simsurveillance.IncidenceIndex()
+        index.record([population.person(0)], [False], 1)
+        index.record_agent_ids(
+            population, np.array([3, 4, 5]), np.array([True, False, True]), 1)
+        index.record([population.person(6)], [True], 1)
+
+        self.assertEqual(
+            [p.agent_id for p in index.new_infections(1, symptomatic=True)],
+            [3, 5, 6])
+        self.assertEqual([p.agent_id for p in index.new_infections(1)],
+                         [3, 5, 6, 0, 4])
+
+        # Subscribers are given the persons
+        calls = []
+        index.subscribe(lambda *args: calls.append(args))
+        index.record_agent_ids(
+            population, np.array([7, 8]), np.array([False, True]), 2)
+        self.assertEqual(calls, [(2, [population.person(8)],
+                                  [population.person(7)])])
+        self.assertEqual(index.new_infections(2, symptomatic=False),
+                         [population.person(7)])
+
+    def test_model(self):
+        model = simsurveillance.SIRSAgentModel(20)
+        model.params.set_parameters({'transmission_rate': 0.5,
+                                     'recovery_rate': 0.1,
+                                     'waning_rate': 0.1,
+                                     'proportion_symptomatic': 0.5})
+        model.initialize_infection(10, time=3)
+
+        new_infections = model.incidence.new_infections(3)
+        self.assertEqual(
+            set(new_infections),
+            set(model.persons[simsurveillance.InfectionStatus.INFECTED]))
+        for person in model.incidence.new_infections(3, symptomatic=True):
+            self.assertTrue(person.symptoms)
+        for person in model.incidence.new_infections(3, symptomatic=False):
+            self.assertFalse(person.symptoms)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+"""Test likelihood.py
+"""
+
+import unittest
+import numpy as np
+import scipy.stats
+import simsurveillance
+
+
+class LikelihoodTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.model = simsurveillance.SIRSModel(
+            init_condition=[0.99, 0.01, 0.0], N=10000)
+        cls.params = np.array([0.4, 0.1, 0.02])
+        cls.times = np.array([5, 10, 11, 20, 35])
+
+    def assertGradient(self, log_likelihood):
+        value, gradient = log_likelihood.evaluateS1(self.params)
+        self.assertAlmostEqual(value, log_likelihood(self.params), delta=0.1)
+        self.assertEqual(gradient.shape, (3, ))
+
+        for k in range(3):
+            h = 1e-5 * self.params[k]
+            step = np.zeros(3)
+            step[k] = h
+            fd = (log_likelihood(self.params + step)
+                  - log_likelihood(self.params - step)) / (2 * h)
+            self.assertAlmostEqual(
+                gradient[k], fd, delta=1e-2 * max(abs(fd), 1))
+
+
+class TestPrevalenceLogLikelihood(LikelihoodTestCase):
+
+    def test_call(self):
+        num_tested = [100, 200, 50, 500, 100]
+        num_positive = [3, 12, 4, 80, 10]
+        log_likelihood = simsurveillance.PrevalenceLogLikelihood(
+            self.model, self.times, num_tested, num_positive,
+            sensitivity=0.9, specificity=0.95)
+        self.assertEqual(log_likelihood.n_parameters(), 3)
+
+        # Compare with a loop over the surveys
+        times = np.arange(0, 36)
+        prevalence = self.model.simulate(self.params, times)[self.times, 0]
+        expected = sum(
+            scipy.stats.binom.logpmf(k, n, 0.9 * p + 0.05 * (1 - p))
+            for n, k, p in zip(num_tested, num_positive, prevalence))
+        self.assertAlmostEqual(
+            log_likelihood(self.params), expected, delta=1e-3)
+
+    def test_evaluateS1(self):
+        log_likelihood = simsurveillance.PrevalenceLogLikelihood(
+            self.model, self.times, [100, 200, 50, 500, 100],
+            [3, 12, 4, 80, 10], sensitivity=0.9, specificity=0.95)
+        self.assertGradient(log_likelihood)
+
+        # Probability clamped away from 0 at every time
+        log_likelihood = simsurveillance.PrevalenceLogLikelihood(
+            self.model, self.times, [100, 200, 50, 500, 100],
+            [3, 12, 4, 80, 10], sensitivity=1e-13, specificity=1.0)
+        value, gradient = log_likelihood.evaluateS1(self.params)
+        self.assertAlmostEqual(value, log_likelihood(self.params))
+        np.testing.assert_array_equal(gradient, 0)
+
+    def test_bad_input(self):
+        with self.assertRaises(ValueError):
+            simsurveillance.PrevalenceLogLikelihood(
+                self.model, self.times, [100, 200], [3, 12])
+        with self.assertRaises(ValueError):
+            simsurveillance.PrevalenceLogLikelihood(
+                self.model, [-1, 2], [1, 1], [0, 0])
+
+
+class TestCasesLogLikelihood(LikelihoodTestCase):
+
+    def test_call(self):
+        cases = [20, 40, 35, 60, 5]
+        times = np.arange(0, 36)
+        y = self.model.simulate(self.params, times)
+        mean = 0.3 * y[self.times, 1]
+
+        log_likelihood = simsurveillance.CasesLogLikelihood(
+            self.model, self.times, cases, ascertainment=0.3)
+        expected = np.sum(scipy.stats.poisson.logpmf(cases, mean))
+        self.assertAlmostEqual(
+            log_likelihood(self.params), expected, delta=1e-2)
+
+        log_likelihood = simsurveillance.CasesLogLikelihood(
+            self.model, self.times, cases, ascertainment=0.3,
+            distribution='negative-binomial', dispersion=5)
+        expected = np.sum(scipy.stats.nbinom.logpmf(
+            cases, 5, 5 / (5 + mean)))
+        self.assertAlmostEqual(
+            log_likelihood(self.params), expected, delta=1e-2)
+
+    def test_evaluateS1(self):
+        cases = [20, 40, 35, 60, 5]
+        for kwargs in [{}, {'distribution': 'negative-binomial',
+                            'dispersion': 5}]:
+            log_likelihood = simsurveillance.CasesLogLikelihood(
+                self.model, self.times, cases, ascertainment=0.3, **kwargs)
+            self.assertGradient(log_likelihood)
+
+            # Mean clamped away from 0 at every time
+            log_likelihood = simsurveillance.CasesLogLikelihood(
+                self.model, self.times, cases, ascertainment=1e-15, **kwargs)
+            value, gradient = log_likelihood.evaluateS1(self.params)
+            self.assertAlmostEqual(value, log_likelihood(self.params))
+            np.testing.assert_array_equal(gradient, 0)
+
+    def test_bad_input(self):
+        with self.assertRaises(ValueError):
+            simsurveillance.CasesLogLikelihood(
+                self.model, self.times, [1, 2, 3, 4, 5],
+                distribution='binomial')
+        with self.assertRaises(ValueError):
+            simsurveillance.CasesLogLikelihood(
+                self.model, self.times, [1, 2, 3, 4, 5],
+                distribution='negative-binomial')
+        with self.assertRaises(ValueError):
+            simsurveillance.CasesLogLikelihood(
+                self.model, self.times, [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,8 @@
 """
 
 import unittest
+import numpy as np
+import pandas
 import simsurveillance
 
 
@@ -16,15 +18,16 @@ class TestDiseaseTest(unittest.TestCase):
     @unittest.mock.patch('simsurveillance.Person')
     def test_call(self, mock_person):
         # Test a perfect test with a truly positive person
+        rng = np.random.default_rng(5)
         mock_person.status = simsurveillance.InfectionStatus.INFECTED
         test = simsurveillance.DiseaseTest()
-        result = test(mock_person)
+        result = test(mock_person, rng)
         self.assertTrue(result)
 
         # Test a perfect test with a truly negative person
         mock_person.status = simsurveillance.InfectionStatus.SUSCEPTIBLE
         test = simsurveillance.DiseaseTest()
-        result = test(mock_person)
+        result = test(mock_person, rng)
         self.assertFalse(result)
 
         # Test imperfect tests
@@ -32,7 +35,7 @@ class TestDiseaseTest(unittest.TestCase):
         test = simsurveillance.DiseaseTest(0.75, 1.0)
         positive_tests = 0
         for _ in range(10000):
-            if test(mock_person):
+            if test(mock_person, rng):
                 positive_tests += 1
         self.assertGreater(positive_tests, 7000)
         self.assertLess(positive_tests, 8000)
@@ -41,11 +44,99 @@ class TestDiseaseTest(unittest.TestCase):
         test = simsurveillance.DiseaseTest(1.0, 0.85)
         positive_tests = 0
         for _ in range(10000):
-            if test(mock_person):
+            if test(mock_person, rng):
                 positive_tests += 1
         self.assertGreater(positive_tests, 1000)
         self.assertLess(positive_tests, 2000)
 
+        # Test drawing from a given generator
+        results = [
+            [test(mock_person, np.random.default_rng(1)) for _ in range(20)]
+            for _ in range(2)]
+        self.assertEqual(results[0], results[1])
+
+    def test_default_rng(self):
+        # The single person call works without a generator, drawing
+        # reproducibly from the generator of the test
+        person = unittest.mock.Mock(
+            status=simsurveillance.InfectionStatus.INFECTED)
+        results = []
+        for _ in range(2):
+            test = simsurveillance.DiseaseTest(0.5, 0.5, seed=3)
+            results.append([test(person) for _ in range(20)]
+                           + list(test.test_statuses(np.ones(5, dtype=int)))
+                           + [test.test_counts(10, 10)])
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(test.num_tests_performed, 45)
+
+    def test_test_statuses(self):
+        InfStatus = simsurveillance.InfectionStatus
+        test = simsurveillance.DiseaseTest(0.7, 0.8)
+        statuses = np.array([InfStatus.INFECTED.value] * 500
+                            + [InfStatus.SUSCEPTIBLE.value] * 300
+                            + [InfStatus.RECOVERED.value] * 200)
+
+        results = test.test_statuses(statuses, np.random.default_rng(4))
+        self.assertEqual(results.dtype, bool)
+        self.assertEqual(len(results), 1000)
+
+        # Same results as testing each person in turn
+        rng = np.random.default_rng(4)
+        for status, result in zip(statuses, results):
+            person = unittest.mock.Mock(status=InfStatus(status))
+            self.assertEqual(test(person, rng), result)
+
+        self.assertAlmostEqual(np.mean(results[:500]), 0.7, delta=0.06)
+        self.assertAlmostEqual(np.mean(results[500:]), 0.2, delta=0.06)
+
+        self.assertEqual(
+            len(test.test_statuses(np.array([], dtype=int), rng)), 0)
+
+    def test_test_people(self):
+        model = simsurveillance.SIRSAgentModel(10)
+        model.initialize_infection(4)
+        test = simsurveillance.DiseaseTest()
+
+        results = test.test_people(list(model.all_persons), model.rng)
+        self.assertEqual(
+            list(results),
+            [p.status is simsurveillance.InfectionStatus.INFECTED
+             for p in model.all_persons])
+
+    def test_test_counts(self):
+        test = simsurveillance.DiseaseTest()
+        self.assertEqual(
+            test.test_counts(30, 70, np.random.default_rng(1)), 30)
+
+        test = simsurveillance.DiseaseTest(0.5, 0.9)
+        rng = np.random.default_rng(1)
+        num_positive = [test.test_counts(100, 100, rng) for _ in range(1000)]
+        self.assertAlmostEqual(np.mean(num_positive), 60, delta=1)
+
+    def test_cost(self):
+        test = simsurveillance.DiseaseTest()
+        test.cost = 2.5
+        person = unittest.mock.Mock(
+            status=simsurveillance.InfectionStatus.INFECTED)
+
+        rng = np.random.default_rng(1)
+        test(person, rng)
+        test.test_statuses(np.ones(10, dtype=int), rng)
+        test.test_people([person] * 3, rng)
+        test.test_counts(100, 1000, rng)
+
+        self.assertEqual(test.num_tests_performed, 1114)
+        self.assertEqual(test.total_cost, 2785.0)
+
+    def test_positive_probability(self):
+        test = simsurveillance.DiseaseTest(0.8, 0.9)
+        self.assertAlmostEqual(test.positive_probability(0), 0.1)
+        self.assertAlmostEqual(test.positive_probability(1), 0.8)
+        self.assertTrue(np.allclose(
+            test.positive_probability(np.array([0.25, 0.5])),
+            [0.275, 0.45]))
+        self.assertEqual(test.num_tests_performed, 0)
+
 
 class TestObserver(unittest.TestCase):
 
@@ -60,6 +151,17 @@ class TestObserver(unittest.TestCase):
         with self.assertRaises(NotImplementedError):
             observer(2)
 
+    @unittest.mock.patch('simsurveillance.AgentModel')
+    def test_next_time(self, model):
+        observer = simsurveillance.Observer(model)
+        self.assertEqual(observer.next_time(2), 2)
+
+    @unittest.mock.patch('simsurveillance.AgentModel')
+    def test_records(self, model):
+        observer = simsurveillance.Observer(model)
+        with self.assertRaises(NotImplementedError):
+            observer.records()
+
 
 class TestSymptomaticTesting(unittest.TestCase):
 
@@ -73,10 +175,15 @@ class TestSymptomaticTesting(unittest.TestCase):
     def test_call(self):
         test = simsurveillance.DiseaseTest()
         model = simsurveillance.SIRSAgentModel(10)
+        model.params.set_parameters({'transmission_rate': 0.5,
+                                     'recovery_rate': 1e-10,
+                                     'waning_rate': 0.1,
+                                     'proportion_symptomatic': 1.0})
 
-        model.all_persons[0].update_status(
-            simsurveillance.InfectionStatus.INFECTED, 2)
-        model.all_persons[0].symptoms = True
+        model.infect_people(model.all_persons[:3], 2)
+        model.all_persons[1].symptoms = False
+        model.all_persons[2].update_status(
+            simsurveillance.InfectionStatus.RECOVERED, 2)
 
         symptomatic_testing = simsurveillance.SymptomaticTesting(model, test)
         symptomatic_testing(3)
@@ -85,6 +192,78 @@ class TestSymptomaticTesting(unittest.TestCase):
         self.assertEqual(symptomatic_testing.times, [3, 4])
         self.assertEqual(symptomatic_testing.cases, [1, 0])
 
+        records = symptomatic_testing.records()
+        self.assertEqual(list(records['time']), [3, 4])
+        self.assertEqual(list(records['cases']), [1, 0])
+
+    def test_call_matches_full_scan(self):
+        InfStatus = simsurveillance.InfectionStatus
+
+        class FullScanTesting(simsurveillance.SymptomaticTesting):
+            # Look through every infected person instead
+            def __call__(self, time):
+                self.times.append(time)
+                self.cases.append(sum(
+                    p.symptoms and p.last_transition_time == time - 1
+                    for p in self.model.persons[InfStatus.INFECTED]))
+
+        model = simsurveillance.SIRSAgentModel(500)
+        model.params.set_parameters({'transmission_rate': 0.6,
+                                     'recovery_rate': 0.3,
+                                     'waning_rate': 0.1})
+        model.initialize_infection(5)
+        test = simsurveillance.DiseaseTest()
+        symptomatic_testing = simsurveillance.SymptomaticTesting(model, test)
+        full_scan = FullScanTesting(model, test)
+        model.add_observers(symptomatic_testing, full_scan)
+        model.simulate(list(range(60)))
+
+        self.assertGreater(sum(symptomatic_testing.cases), 0)
+        self.assertEqual(symptomatic_testing.cases, full_scan.cases)
+
+    def test_next_time(self):
+        model = simsurveillance.SIRSAgentModel(10)
+        model.params.set_parameters({'proportion_symptomatic': 1.0})
+        symptomatic_testing = simsurveillance.SymptomaticTesting(
+            model, simsurveillance.DiseaseTest(), start_time=5)
+
+        # Only due on the day after symptomatic infections
+        self.assertIsNone(symptomatic_testing.next_time(7))
+        model.infect_people(model.all_persons[:2], 6)
+        self.assertEqual(symptomatic_testing.next_time(7), 7)
+        self.assertIsNone(symptomatic_testing.next_time(8))
+
+        # Not before the start time
+        model.infect_people(model.all_persons[2:4], 2)
+        self.assertIsNone(symptomatic_testing.next_time(3))
+
+    def test_skipped_days(self):
+        records = []
+        visited = []
+        for next_time in [lambda time: None, lambda time: time]:
+            model = simsurveillance.SIRSAgentModel(200, seed=3)
+            model.params.set_parameters({'transmission_rate': 0.0,
+                                         'recovery_rate': 0.2,
+                                         'waning_rate': 0.1})
+            model.initialize_infection(10, time=4)
+            symptomatic_testing = simsurveillance.SymptomaticTesting(
+                model, simsurveillance.DiseaseTest(), start_time=1)
+            model.add_observers(symptomatic_testing)
+
+            # Counts the visited time steps, and is due at every time step
+            # in the second model
+            visited.append([])
+            model.steps.append(unittest.mock.Mock(
+                side_effect=visited[-1].append, next_time=next_time))
+            model.simulate(list(range(30)))
+            records.append(symptomatic_testing.records())
+
+        self.assertLess(len(visited[0]), 15)
+        self.assertEqual(len(visited[1]), 30)
+        self.assertGreater(records[0]['cases'].sum(), 0)
+        self.assertEqual(list(records[0]['time']), list(range(1, 30)))
+        self.assertTrue(records[0].equals(records[1]))
+
 
 class TestPrevalenceSurvey(unittest.TestCase):
 
@@ -125,6 +304,11 @@ class TestPrevalenceSurvey(unittest.TestCase):
         self.assertEqual(survey.times, [4, 5])
         self.assertEqual(survey.num_tested, [1, 2])
 
+        records = survey.records()
+        self.assertEqual(list(records.columns),
+                         ['time', 'num_tested', 'num_positive'])
+        self.assertEqual(list(records['num_tested']), [1, 2])
+
         found_positive = False
         for _ in range(1000):
             survey(5)
@@ -132,6 +316,81 @@ class TestPrevalenceSurvey(unittest.TestCase):
                 found_positive = True
         self.assertTrue(found_positive)
 
+    def test_aggregate(self):
+        model = simsurveillance.SIRSAgentModel(10)
+        test = simsurveillance.DiseaseTest()
+        self.assertFalse(simsurveillance.PrevalenceSurvey(
+            model, test, self.test_days, self.num_tests).aggregate)
+        self.assertTrue(simsurveillance.PrevalenceSurvey(
+            model, test, self.test_days, self.num_tests,
+            aggregate=True).aggregate)
+
+        count_model = simsurveillance.SIRSStochasticCountModel(10)
+        self.assertTrue(simsurveillance.PrevalenceSurvey(
+            count_model, test, self.test_days, self.num_tests).aggregate)
+
+        # Same distribution of positive tests as testing persons
+        model = simsurveillance.SIRSAgentModel(200)
+        model.update_statuses(
+            model.all_persons[:60], simsurveillance.InfectionStatus.INFECTED,
+            0)
+        test = simsurveillance.DiseaseTest(0.8, 0.9)
+
+        num_positive = []
+        for aggregate in [False, True]:
+            survey = simsurveillance.PrevalenceSurvey(
+                model, test, [1], [50], aggregate=aggregate)
+            for _ in range(2000):
+                survey(1)
+            num_positive.append(np.array(survey.num_positive))
+
+        # 50 * (0.3 * 0.8 + 0.7 * 0.1) positive tests expected
+        for x in num_positive:
+            self.assertAlmostEqual(np.mean(x), 15.5, delta=0.3)
+        self.assertAlmostEqual(
+            np.var(num_positive[0]) / np.var(num_positive[1]), 1, delta=0.1)
+
+    def test_call_array_model(self):
+        InfStatus = simsurveillance.InfectionStatus
+        test = simsurveillance.DiseaseTest()
+        for model_class in [simsurveillance.SIRSAgentModel,
+                            simsurveillance.SIRSArrayAgentModel]:
+            model = model_class(100)
+            model.initialize_infection(30)
+            survey = simsurveillance.PrevalenceSurvey(
+                model, test, [0], [100])
+            survey(0)
+            self.assertEqual(survey.num_positive, [30])
+
+            # Same samples from both kinds of model
+            model.update_statuses(
+                list(model.all_persons)[:40], InfStatus.RECOVERED, 0)
+            model.update_statuses(
+                list(model.all_persons)[:20], InfStatus.INFECTED, 0)
+            survey = simsurveillance.PrevalenceSurvey(
+                model, simsurveillance.DiseaseTest(0.9, 0.9), [0], [50])
+            for _ in range(5):
+                survey(0)
+            if model_class is simsurveillance.SIRSAgentModel:
+                expected = survey.num_positive
+            else:
+                self.assertEqual(survey.num_positive, expected)
+
+    @unittest.mock.patch('simsurveillance.DiseaseTest')
+    @unittest.mock.patch('simsurveillance.AgentModel')
+    def test_next_time(self, model, test):
+        survey = simsurveillance.PrevalenceSurvey(
+            model, test, self.test_days, self.num_tests)
+        self.assertEqual(survey.next_time(2), 4)
+        self.assertEqual(survey.next_time(5), 5)
+        self.assertIsNone(survey.next_time(6))
+
+        # Unsorted test days
+        survey = simsurveillance.PrevalenceSurvey(
+            model, test, [9, 3, 6], [1, 1, 1])
+        self.assertEqual(survey.next_time(4), 6)
+        self.assertEqual(survey.next_time(0), 3)
+
     def test_uncertainty(self):
         test = simsurveillance.DiseaseTest()
         model = simsurveillance.SIRSAgentModel(10)
@@ -146,5 +405,23 @@ class TestPrevalenceSurvey(unittest.TestCase):
         self.assertTrue(0 < posterior[1].median() < 1)
 
 
+class TestStatisticColumns(unittest.TestCase):
+
+    def test_statistic_columns(self):
+        model = simsurveillance.SIRSAgentModel(10)
+        test = simsurveillance.DiseaseTest()
+        survey = simsurveillance.PrevalenceSurvey(model, test, [1], [5])
+        testing = simsurveillance.SymptomaticTesting(model, test)
+        self.assertEqual(
+            simsurveillance.statistic_columns(survey.records()),
+            ['num_positive'])
+        self.assertEqual(
+            simsurveillance.statistic_columns(testing.records()), ['cases'])
+
+        records = pandas.DataFrame({'time': [1, 2], 'a': [0, 1], 'b': [2, 3]})
+        self.assertEqual(
+            simsurveillance.statistic_columns(records), ['a', 'b'])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,124 @@
+"""Test particle_filter.py
+"""
+
+import unittest
+import numpy as np
+import simsurveillance
+from simsurveillance import InfectionStatus as InfStatus
+
+
+class TestParticleFilter(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.N = 2000
+        cls.parameters = [0.5, 0.2, 0.02]
+        cls.survey_test = simsurveillance.DiseaseTest(0.9, 0.98)
+
+        model = simsurveillance.SIRSArrayAgentModel(cls.N, seed=3)
+        model.params.set_parameters(dict(zip(
+            ['transmission_rate', 'recovery_rate', 'waning_rate'],
+            cls.parameters)))
+        model.initialize_infection(20)
+        survey = simsurveillance.PrevalenceSurvey(
+            model, cls.survey_test, list(range(5, 61, 5)), [200] * 12)
+        testing = simsurveillance.SymptomaticTesting(
+            model, simsurveillance.DiseaseTest(), start_time=1)
+        model.add_observers(survey, testing)
+
+        output = model.simulate(list(range(61)))
+        cls.infected = output[InfStatus.INFECTED].to_numpy()
+        cls.prevalence = survey.records()
+        cls.cases = testing.records()
+
+    def particle_filter(self, parameters=None, **kwargs):
+        if parameters is None:
+            parameters = self.parameters
+        return simsurveillance.ParticleFilter(
+            self.N, 20, parameters, num_particles=500,
+            survey_test=self.survey_test, **kwargs)
+
+    def test_init(self):
+        pf = self.particle_filter()
+        self.assertEqual(pf.num_particles, 500)
+        self.assertEqual(pf.time, 0)
+        self.assertTrue(np.all(pf.counts == [1980, 20, 0]))
+        self.assertTrue(np.all(pf.parameters == self.parameters))
+        self.assertAlmostEqual(np.sum(pf.weights), 1)
+        self.assertEqual(pf.proportion_symptomatic, 0.25)
+
+    def test_update_without_data(self):
+        pf = self.particle_filter()
+        for _ in range(30):
+            step = pf.update()
+
+        self.assertEqual(pf.time, 30)
+        self.assertEqual(step.time, 30)
+        self.assertEqual(step.log_likelihood, 0)
+        self.assertFalse(step.resampled)
+        self.assertTrue(np.all(pf.counts.sum(axis=1) == self.N))
+        self.assertTrue(np.all(pf.counts >= 0))
+
+        # The particles spread around the epidemic
+        infected = pf.counts[:, 1]
+        self.assertGreater(np.std(infected), 0)
+        self.assertLess(np.min(infected), self.infected[30])
+        self.assertGreater(np.max(infected), self.infected[30])
+
+    def test_update(self):
+        pf = self.particle_filter()
+        pf.update()
+        day = pf.update({'num_tested': 200, 'num_positive': 150})
+        self.assertLess(day.log_likelihood, -50)
+        self.assertEqual(pf.log_likelihood, day.log_likelihood)
+
+        pf = self.particle_filter(resample_threshold=1.1)
+        step = pf.update({'cases': 1})
+        self.assertTrue(step.resampled)
+        self.assertTrue(np.allclose(pf.weights, 1 / 500))
+        self.assertLess(step.effective_sample_size, 500)
+
+    def test_filter_records(self):
+        pf = self.particle_filter()
+        steps = pf.filter_records(60, self.prevalence, self.cases)
+
+        self.assertEqual(len(steps), 60)
+        self.assertEqual(pf.time, 60)
+        self.assertEqual(pf.history, steps)
+        self.assertAlmostEqual(
+            pf.log_likelihood, sum(s.log_likelihood for s in steps))
+        self.assertTrue(any(s.resampled for s in steps))
+
+        # The filtered number infected tracks that of the agent model
+        filtered = np.array([s.mean_counts[1] for s in steps])
+        error = np.abs(filtered - self.infected[1:])
+        self.assertLess(np.max(error[10:] / self.infected[11:]), 0.5)
+
+        q = pf.quantiles([0.025, 0.5, 0.975])
+        self.assertEqual(q.shape, (3, 6))
+        self.assertTrue(np.all(np.diff(q, axis=0) >= 0))
+
+        # Reproducible
+        again = self.particle_filter()
+        again.filter_records(60, self.prevalence, self.cases)
+        self.assertEqual(again.log_likelihood, pf.log_likelihood)
+
+        # The true parameters explain the data better than wrong ones
+        wrong = self.particle_filter([0.3, 0.2, 0.02])
+        wrong.filter_records(60, self.prevalence, self.cases)
+        self.assertLess(wrong.log_likelihood, pf.log_likelihood)
+
+    def test_parameter_estimation(self):
+        rng = np.random.default_rng(1)
+        prior = np.column_stack((rng.uniform(0.2, 1, 500),
+                                 rng.uniform(0.05, 0.5, 500),
+                                 rng.uniform(0, 0.1, 500)))
+        pf = self.particle_filter(prior, jitter=0.02)
+        step = pf.filter_records(60, self.prevalence, self.cases)[-1]
+
+        self.assertAlmostEqual(step.mean_parameters[0], 0.5, delta=0.1)
+        self.assertLess(np.std(pf.parameters[:, 0]), np.std(prior[:, 0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
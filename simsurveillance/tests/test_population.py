@@ -0,0 +1,73 @@
+"""Test population.py
+"""
+
+import unittest
+import unittest.mock
+import simsurveillance
+
+
+class TestArrayPopulation(unittest.TestCase):
+
+    @unittest.mock.patch('simsurveillance.AgentModel')
+    def test_init(self, mock_agent_model):
+        population = simsurveillance.ArrayPopulation(mock_agent_model, 10)
+
+        self.assertEqual(population.N, 10)
+        self.assertEqual(len(population.status), 10)
+        self.assertEqual(
+            len(population.persons[
+                simsurveillance.InfectionStatus.SUSCEPTIBLE]), 10)
+        self.assertEqual(
+            len(population.persons[
+                simsurveillance.InfectionStatus.INFECTED]), 0)
+        self.assertEqual(len(population.all_persons), 10)
+
+    @unittest.mock.patch('simsurveillance.AgentModel')
+    def test_person(self, mock_agent_model):
+        population = simsurveillance.ArrayPopulation(mock_agent_model, 10)
+        person = population.person(3)
+
+        self.assertEqual(person.agent_id, 3)
+        self.assertIs(person.model, mock_agent_model)
+
+    @unittest.mock.patch('simsurveillance.AgentModel')
+    def test_update_status(self, mock_agent_model):
+        population = simsurveillance.ArrayPopulation(mock_agent_model, 10)
+        population.next_transition[3] = 4
+        population.update_status(
+            3, simsurveillance.InfectionStatus.INFECTED, 2)
+
+        self.assertEqual(
+            population.status[3],
+            simsurveillance.InfectionStatus.INFECTED.value)
+        self.assertEqual(population.last_transition[3], 2)
+        self.assertEqual(population.next_transition[3], -1)
+        self.assertIn(
+            population.person(3),
+            population.persons[simsurveillance.InfectionStatus.INFECTED])
+        self.assertNotIn(
+            population.person(3),
+            population.persons[simsurveillance.InfectionStatus.SUSCEPTIBLE])
+
+    @unittest.mock.patch('simsurveillance.AgentModel')
+    def test_update_status_many(self, mock_agent_model):
+        InfStatus = simsurveillance.InfectionStatus
+        population = simsurveillance.ArrayPopulation(mock_agent_model, 10)
+        population.update_status_many([1, 2, 3], InfStatus.INFECTED, 2)
+        population.update_status_many([5, 2, 1], InfStatus.RECOVERED, 4)
+
+        self.assertEqual(list(population.status[[1, 2, 3, 5]]),
+                         [InfStatus.RECOVERED.value, InfStatus.RECOVERED.value,
+                          InfStatus.INFECTED.value, InfStatus.RECOVERED.value])
+        self.assertEqual(list(population.last_transition[[1, 3, 5, 6]]),
+                         [4, 2, 4, -1])
+        self.assertEqual(len(population.persons[InfStatus.SUSCEPTIBLE]), 6)
+        self.assertEqual(
+            [p.agent_id for p in population.persons[InfStatus.INFECTED]], [3])
+        self.assertEqual(
+            [p.agent_id for p in population.persons[InfStatus.RECOVERED]],
+            [5, 2, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""Test scheduler.py
+"""
+
+import unittest
+import simsurveillance
+
+
+class TestEventScheduler(unittest.TestCase):
+
+    def test_init(self):
+        scheduler = simsurveillance.EventScheduler()
+        self.assertEqual(len(scheduler), 0)
+        self.assertIsNone(scheduler.next_time())
+
+    def test_schedule(self):
+        scheduler = simsurveillance.EventScheduler()
+        scheduler.schedule('a', 5)
+        scheduler.schedule('b', 3)
+
+        self.assertEqual(len(scheduler), 2)
+        self.assertIn('a', scheduler)
+        self.assertEqual(scheduler.time_of('a'), 5)
+
+        # Scheduling again moves the event
+        scheduler.schedule('a', 7)
+        self.assertEqual(len(scheduler), 2)
+        self.assertEqual(scheduler.time_of('a'), 7)
+        self.assertEqual(scheduler.pop_due(5), [])
+
+    def test_schedule_many(self):
+        scheduler = simsurveillance.EventScheduler()
+        scheduler.schedule('a', 5)
+        scheduler.schedule('x', 2)
+        scheduler.schedule_many(['b', 'c', 'a', 'd'], [2, 5, 3, 2])
+
+        self.assertEqual(len(scheduler), 5)
+        self.assertEqual(scheduler.time_of('a'), 3)
+        self.assertEqual(scheduler.next_time(), 2)
+        self.assertEqual(scheduler.pop_due(2), ['x', 'b', 'd'])
+        self.assertEqual(scheduler.pop_due(3), ['a'])
+        self.assertEqual(scheduler.pop_due(5), ['c'])
+        self.assertIsNone(scheduler.next_time())
+
+        scheduler.schedule_many([], [])
+        self.assertEqual(len(scheduler), 0)
+
+        with self.assertRaises(ValueError):
+            scheduler.schedule_many(['a'], [1, 2])
+
+    def test_cancel(self):
+        scheduler = simsurveillance.EventScheduler()
+        scheduler.schedule('a', 5)
+        scheduler.schedule('b', 5)
+
+        self.assertTrue(scheduler.cancel('a'))
+        self.assertFalse(scheduler.cancel('a'))
+        self.assertNotIn('a', scheduler)
+        self.assertEqual(scheduler.pop_due(5), ['b'])
+
+    def test_pop_due(self):
+        scheduler = simsurveillance.EventScheduler()
+        scheduler.schedule('a', 5)
+        scheduler.schedule('b', 5)
+        scheduler.schedule('c', 6)
+
+        self.assertEqual(scheduler.pop_due(5), ['a', 'b'])
+        self.assertEqual(scheduler.pop_due(5), [])
+        self.assertEqual(len(scheduler), 1)
+        self.assertNotIn('a', scheduler)
+
+    def test_next_time(self):
+        scheduler = simsurveillance.EventScheduler()
+        scheduler.schedule('a', 5)
+        scheduler.schedule('b', 2)
+        scheduler.schedule('c', 9)
+        self.assertEqual(scheduler.next_time(), 2)
+
+        # Emptied buckets are skipped
+        scheduler.cancel('b')
+        self.assertEqual(scheduler.next_time(), 5)
+
+        scheduler.pop_due(5)
+        self.assertEqual(scheduler.next_time(), 9)
+
+        scheduler.pop_due(9)
+        self.assertIsNone(scheduler.next_time())
+
+    def test_bounded_memory(self):
+        scheduler = simsurveillance.EventScheduler()
+        for time in range(1000):
+            scheduler.schedule(time, time)
+            scheduler.pop_due(time)
+
+        self.assertEqual(len(scheduler._buckets), 0)
+        self.assertEqual(len(scheduler._heap), 0)
+
+        # Cancelling and recreating the same bucket
+        for _ in range(1000):
+            scheduler.schedule('a', 1000)
+            scheduler.cancel('a')
+        self.assertEqual(len(scheduler._heap), 1)
+        self.assertIsNone(scheduler.next_time())
+        self.assertEqual(len(scheduler._heap), 0)
+
+        scheduler.schedule_many(['a', 'b'], [5, 7])
+        scheduler.schedule_many(['a', 'b'], [7, 5])
+        self.assertEqual(len(scheduler._heap), 2)
+        self.assertEqual(scheduler.pop_due(5), ['b'])
+        self.assertEqual(scheduler.pop_due(7), ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+"""Test seeding.py
+"""
+
+import unittest
+import numpy as np
+import simsurveillance
+
+
+class TestSpawnSeeds(unittest.TestCase):
+
+    def test_spawn_seeds(self):
+        seeds = simsurveillance.spawn_seeds(5, 4)
+        self.assertEqual(len(seeds), 4)
+        self.assertEqual(len(set(seeds)), 4)
+        self.assertTrue(all(isinstance(s, int) for s in seeds))
+        self.assertEqual(simsurveillance.spawn_seeds(5, 4), seeds)
+
+        # More seeds extend the same list
+        self.assertEqual(simsurveillance.spawn_seeds(5, 6)[:4], seeds)
+
+    def test_seed_sequence(self):
+        sequence = np.random.SeedSequence(5)
+        self.assertEqual(simsurveillance.spawn_seeds(sequence, 4),
+                         simsurveillance.spawn_seeds(5, 4))
+
+        # Later calls continue from the children already spawned
+        self.assertEqual(simsurveillance.spawn_seeds(sequence, 2),
+                         simsurveillance.spawn_seeds(5, 6)[4:])
+
+
+if __name__ == '__main__':
+    unittest.main()
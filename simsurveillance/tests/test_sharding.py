@@ -0,0 +1,161 @@
+"""Test sharding.py
+"""
+
+import unittest
+import numpy as np
+import simsurveillance
+from simsurveillance import InfectionStatus as InfStatus
+
+from equivalence import assert_same_distribution
+
+
+PARAMETERS = {'transmission_rate': 1.0,
+              'recovery_rate': 0.3,
+              'waning_rate': 0.05}
+
+
+def symptomatic_testing(model):
+    return simsurveillance.SymptomaticTesting(
+        model, simsurveillance.DiseaseTest(0.9, 0.95), start_time=1)
+
+
+def failing_observer(model):
+    raise ValueError('No observer')
+
+
+class TestShardTransmissionStep(unittest.TestCase):
+
+    def test_call(self):
+        model = simsurveillance.SIRSArrayAgentModel(1000)
+        model.params.set_parameters({'transmission_rate': 2.0})
+        step = simsurveillance.ShardTransmissionStep(model, 4000)
+        self.assertIsNone(step.next_time(0))
+
+        step(0)
+        self.assertEqual(step.num_infected, 0)
+
+        # The number infected is binomial, from the whole population
+        infected = []
+        for _ in range(200):
+            step.num_infectious = 1000
+            step(0)
+            infected.append(step.num_infected)
+            model.update_statuses(
+                list(model.persons[InfStatus.INFECTED]),
+                InfStatus.SUSCEPTIBLE, 0)
+        self.assertAlmostEqual(
+            np.mean(infected), 1000 * -np.expm1(-0.5), delta=5)
+
+
+class TestShardedSIRSModel(unittest.TestCase):
+
+    def model(self, num_workers=1, seed=1, N=5000, num_shards=4):
+        m = simsurveillance.ShardedSIRSModel(N, num_shards, num_workers, seed)
+        m.params.set_parameters(PARAMETERS)
+        m.add_shard_observers(symptomatic_testing)
+        m.add_observers(simsurveillance.PrevalenceSurvey(
+            m, simsurveillance.DiseaseTest(0.9, 0.95), [10, 20, 30],
+            [200] * 3))
+        m.initialize_infection(10)
+        return m
+
+    def test_init(self):
+        m = simsurveillance.ShardedSIRSModel(10, 3, 1)
+        self.assertEqual(m._shard_sizes, [4, 3, 3])
+        self.assertEqual(m.counts[InfStatus.SUSCEPTIBLE], 10)
+        self.assertEqual(len(set(m.shard_seeds())), 3)
+        self.assertEqual(m.shard_seeds(), m.shard_seeds())
+
+        with self.assertRaises(ValueError):
+            simsurveillance.ShardedSIRSModel(10, 2, 3)
+
+    def test_initialize_infection(self):
+        m = self.model()
+        self.assertEqual(m.counts[InfStatus.INFECTED], 10)
+        self.assertEqual(m._shard_counts[:, 1].sum(), 10)
+        self.assertEqual(m.num_infected, 10)
+
+        with self.assertRaises(RuntimeError):
+            m.add_shard_observers(symptomatic_testing)
+
+    def test_simulate(self):
+        m = self.model()
+        output = m.simulate(list(range(0, 60, 2)))
+
+        self.assertEqual(list(output['time']), list(range(0, 60, 2)))
+        self.assertTrue(np.all(output[list(InfStatus)].sum(axis=1) == 5000))
+        self.assertGreater(output[InfStatus.INFECTED].max(), 500)
+        self.assertEqual(m.time, 59)
+
+        # The records of the shards are summed
+        cases = m.shard_records()[0]
+        self.assertEqual(list(cases.columns), ['time', 'cases'])
+        self.assertEqual(list(cases['time']), list(range(1, 59)))
+        self.assertGreater(cases['cases'].sum(), 0)
+        self.assertEqual(list(m.observers[0].records()['time']),
+                         [10, 20, 30])
+
+        # Simulating in stages gives the same output
+        staged = self.model()
+        first = staged.simulate(list(range(0, 30, 2)))
+        second = staged.simulate(list(range(0, 60, 2)))
+        self.assertTrue(output.iloc[:15].reset_index(drop=True).equals(first))
+        self.assertTrue(
+            output.iloc[15:].reset_index(drop=True).equals(second))
+        self.assertTrue(staged.shard_records()[0].equals(cases))
+
+    def test_simulate_skips_time_steps(self):
+        m = simsurveillance.ShardedSIRSModel(100, 2, 1)
+        output = m.simulate([0, 50, 100])
+        self.assertEqual(list(output[InfStatus.SUSCEPTIBLE]), [100] * 3)
+        self.assertEqual(m.time, 101)
+
+    def test_workers(self):
+        # The results do not depend on the number of worker processes
+        with self.model(num_workers=2) as m:
+            output = m.simulate(list(range(40)))
+        self.assertTrue(output.equals(self.model().simulate(list(range(40)))))
+        self.assertEqual(len(m.shard_records()[0]), 39)
+
+        with self.assertRaises(RuntimeError):
+            m.simulate(list(range(50)))
+
+        m = simsurveillance.ShardedSIRSModel(100, 2, 2)
+        m.add_shard_observers(failing_observer)
+        with self.assertRaises(RuntimeError):
+            m.initialize_infection(1)
+        m.close()
+
+        # A worker process which has died
+        m = self.model(num_workers=2)
+        m.simulate(list(range(5)))
+        workers = m._workers
+        workers[0].process.kill()
+        workers[0].process.join()
+        with self.assertRaises(RuntimeError):
+            m.simulate(list(range(10)))
+        m.close()
+        for worker in workers:
+            self.assertFalse(worker.process.is_alive())
+
+    def test_equivalence(self):
+        # The sharded and single process models agree in distribution
+        def single(seed):
+            m = simsurveillance.SIRSArrayAgentModel(2000, seed)
+            m.params.set_parameters(PARAMETERS)
+            m.initialize_infection(10)
+            return m
+
+        def sharded(seed):
+            m = simsurveillance.ShardedSIRSModel(2000, 4, 1, seed)
+            m.params.set_parameters(PARAMETERS)
+            m.initialize_infection(10)
+            return m
+
+        assert_same_distribution(self, single, sharded, range(30),
+                                 list(range(40)),
+                                 other_seeds=range(1000, 1030))
+
+
+if __name__ == '__main__':
+    unittest.main()
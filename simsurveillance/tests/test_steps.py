@@ -1,8 +1,8 @@
 """Test the agent based simulation steps.
 """
 
-from collections import defaultdict
 import unittest
+import numpy as np
 import simsurveillance
 
 
@@ -19,6 +19,11 @@ class TestModelStep(unittest.TestCase):
         with self.assertRaises(NotImplementedError):
             step(2)
 
+    @unittest.mock.patch('simsurveillance.AgentModel')
+    def test_next_time(self, mock_agent_model):
+        step = simsurveillance.ModelStep(mock_agent_model)
+        self.assertEqual(step.next_time(2), 2)
+
 
 class TestInfectionProgressionStep(unittest.TestCase):
 
@@ -33,26 +38,78 @@ class TestInfectionProgressionStep(unittest.TestCase):
         person = simsurveillance.Person(mock_agent_model)
         person.status = simsurveillance.InfectionStatus.RECOVERED
 
-        mock_agent_model.transitions = {5: [person]}
+        mock_agent_model.transitions = simsurveillance.EventScheduler()
+        mock_agent_model.transitions.schedule(person, 5)
 
         step = simsurveillance.InfectionProgressionStep(mock_agent_model)
         step(5)
 
-        self.assertIs(
-            person.status, simsurveillance.InfectionStatus.SUSCEPTIBLE)
+        mock_agent_model.update_statuses.assert_any_call(
+            [person], simsurveillance.InfectionStatus.SUSCEPTIBLE, 5)
 
         # Test recovering person
+        mock_agent_model.reset_mock()
         mock_agent_model.params.waning_rate = 1e-10
         person = simsurveillance.Person(mock_agent_model)
         person.status = simsurveillance.InfectionStatus.INFECTED
+        person.symptoms = True
 
-        mock_agent_model.transitions = defaultdict(list)
-        mock_agent_model.transitions[5] = [person]
+        mock_agent_model.transitions = simsurveillance.EventScheduler()
+        mock_agent_model.transitions.schedule(person, 5)
 
         step = simsurveillance.InfectionProgressionStep(mock_agent_model)
         step(5)
 
-        self.assertIs(person.status, simsurveillance.InfectionStatus.RECOVERED)
+        mock_agent_model.update_statuses.assert_any_call(
+            [person], simsurveillance.InfectionStatus.RECOVERED, 5)
+        self.assertFalse(person.symptoms)
+        mock_agent_model.draw_delays.assert_called_once_with(
+            1e-10, 1, step.rng)
+        self.assertEqual(len(mock_agent_model.transitions), 0)
+
+        # Test recovering and waning with a model
+        model = simsurveillance.SIRSAgentModel(3)
+        model.params.set_parameters({'transmission_rate': 0.5,
+                                     'recovery_rate': 0.1,
+                                     'waning_rate': 1e-10})
+        model.initialize_infection(2)
+        infected = list(
+            model.persons[simsurveillance.InfectionStatus.INFECTED])
+        model.schedule_transitions(infected, [5, 5])
+        model.update_statuses(
+            infected[1:], simsurveillance.InfectionStatus.RECOVERED, 4)
+
+        step = simsurveillance.InfectionProgressionStep(model)
+        step(5)
+
+        self.assertIs(
+            infected[0].status, simsurveillance.InfectionStatus.RECOVERED)
+        self.assertIs(
+            infected[1].status, simsurveillance.InfectionStatus.SUSCEPTIBLE)
+        self.assertEqual(list(model.transitions.pop_due(5)), [])
+        self.assertEqual(len(model.transitions), 1)
+
+    def test_next_time(self):
+        model = simsurveillance.SIRSAgentModel(3)
+        step = simsurveillance.InfectionProgressionStep(model)
+        self.assertIsNone(step.next_time(0))
+
+        model.transitions.schedule(model.all_persons[0], 7)
+        self.assertEqual(step.next_time(0), 7)
+
+    def test_call_same_time_step(self):
+        # Recovery and waning both due in the time step of infection
+        model = simsurveillance.SIRSAgentModel(3)
+        model.params.set_parameters(
+            {'recovery_rate': 1e10, 'waning_rate': 1e10})
+        model.initialize_infection(2, time=4)
+
+        model.infection_progression_step(4)
+
+        self.assertEqual(
+            len(model.persons[simsurveillance.InfectionStatus.SUSCEPTIBLE]),
+            3)
+        self.assertEqual(len(model.transitions), 0)
 
 
 class TestTransmissionStep(unittest.TestCase):
@@ -62,11 +119,13 @@ class TestTransmissionStep(unittest.TestCase):
         step = simsurveillance.TransmissionStep(mock_agent_model)
         self.assertIs(step.model, mock_agent_model)
 
-    @unittest.mock.patch('numpy.random.poisson')
-    def test_call(self, mock_random_pois):
+    @unittest.mock.patch(
+        'simsurveillance.TransmissionStep.draw_number_infected')
+    def test_call(self, mock_draw):
 
-        # A value to ensure that we will always expect to cause infections
-        mock_random_pois.side_effect = lambda x: 100
+        # Always infect every susceptible
+        mock_draw.side_effect = lambda rng, num_susceptible, force: \
+            num_susceptible
 
         # Test infecting both others
         model = simsurveillance.SIRSAgentModel(3)
@@ -103,7 +162,6 @@ class TestTransmissionStep(unittest.TestCase):
                 as mock_rate:
 
             mock_rate.side_effect = lambda x: 1
-            mock_random_pois.side_effect = lambda x: 100
 
             model = simsurveillance.SIRSAgentModel(3)
             params = {'transmission_rate': 0.5,
@@ -117,6 +175,185 @@ class TestTransmissionStep(unittest.TestCase):
             step = simsurveillance.TransmissionStep(model)
             step(1)
 
+    def test_draw_number_infected(self):
+        draw = simsurveillance.TransmissionStep.draw_number_infected
+        rng = np.random.default_rng(3)
+
+        self.assertEqual(draw(rng, 0, 2.0), 0)
+        self.assertEqual(draw(rng, 100, 0.0), 0)
+        self.assertEqual(draw(rng, 100, -1.0), 0)
+        self.assertEqual(draw(rng, 100, 1e3), 100)
+
+        # Binomial(S, 1 - exp(-force))
+        draws = [draw(rng, 1000, 0.1) for _ in range(2000)]
+        self.assertAlmostEqual(
+            np.mean(draws), 1000 * -np.expm1(-0.1), delta=1.0)
+
+    @unittest.mock.patch(
+        'simsurveillance.TransmissionStep._compute_number_to_infect')
+    def test_call_per_infector(self, mock_random_pois):
+        mock_random_pois.side_effect = lambda x: 1
+
+        model = simsurveillance.SIRSAgentModel(5)
+        model.initialize_infection(2)
+
+        step = simsurveillance.TransmissionStep(model, batched=False)
+        step(1)
+
+        # One Poisson draw, and one infection, per infectious person
+        self.assertEqual(mock_random_pois.call_count, 2)
+        self.assertEqual(step.num_infected, 2)
+        self.assertEqual(
+            len(model.persons[simsurveillance.InfectionStatus.INFECTED]), 4)
+
+    def test_next_time(self):
+        model = simsurveillance.SIRSAgentModel(3)
+        step = simsurveillance.TransmissionStep(model)
+        self.assertIsNone(step.next_time(4))
+
+        model.initialize_infection(1)
+        self.assertEqual(step.next_time(4), 4)
+
+        model.initialize_infection(2)
+        self.assertIsNone(step.next_time(4))
+
+    def test_batch_number_to_infect(self):
+        model = simsurveillance.SIRSAgentModel(1000)
+        model.params.set_parameters({'transmission_rate': 2.0})
+
+        # Batched and per-infector draws should agree in distribution
+        batched = []
+        per_infector = []
+        for _ in range(500):
+            step = simsurveillance.TransmissionStep(model)
+            batched.append(step._compute_batch_number_to_infect(500, 500))
+
+            num_susceptible = 500
+            for _ in range(500):
+                num_to_infect = min(
+                    step._compute_number_to_infect(
+                        step._transmission_rate(num_susceptible)),
+                    num_susceptible)
+                num_susceptible -= num_to_infect
+            per_infector.append(500 - num_susceptible)
+
+        self.assertLessEqual(max(batched), 500)
+        self.assertAlmostEqual(
+            np.mean(batched) / np.mean(per_infector), 1.0, delta=0.02)
+
+        step = simsurveillance.TransmissionStep(model)
+        self.assertEqual(step._compute_batch_number_to_infect(10, 0), 0)
+
+
+class TestCompartmentStep(unittest.TestCase):
+
+    def model(self, **kwargs):
+        model = simsurveillance.HybridSIRSModel(2000, seed=2, **kwargs)
+        model.params.set_parameters({'transmission_rate': 1.5,
+                                     'recovery_rate': 0.3,
+                                     'waning_rate': 0.2})
+        model.initialize_infection(400)
+        return model
+
+    def test_init(self):
+        model = self.model()
+        step = simsurveillance.CompartmentStep(model)
+        self.assertIs(step.model, model)
+        self.assertEqual(step.method, 'tau')
+
+        with self.assertRaises(ValueError):
+            simsurveillance.CompartmentStep(model, 'exact')
+
+    def test_call(self):
+        for method in ['tau', 'ode']:
+            model = self.model(method=method)
+            model.switch_representation('compartments', 1)
+            step = model.compartment_step
+            before = model.population.status.copy()
+            step(1)
+
+            # The changes of status match the counts of the model
+            after = model.population.status
+            self.assertEqual(sum(model.counts.values()), 2000)
+            for status in simsurveillance.InfectionStatus:
+                self.assertEqual(np.count_nonzero(after == status.value),
+                                 model.counts[status])
+
+            # New infections are indexed, with their symptoms, and logged
+            newly_infected = np.flatnonzero(
+                (before == simsurveillance.InfectionStatus.SUSCEPTIBLE.value)
+                & (model.population.last_transition == 1))
+            self.assertEqual(
+                len(newly_infected), model.transmission_step.num_infected)
+            self.assertGreater(len(newly_infected), 0)
+            indexed = model.incidence.new_infections(1)
+            self.assertEqual(sorted(p.agent_id for p in indexed),
+                             newly_infected.tolist())
+            for person in model.incidence.new_infections(1, True):
+                if person.status is simsurveillance.InfectionStatus.INFECTED:
+                    self.assertTrue(person.symptoms)
+            agent_ids, _ = model.event_log.events_at(1)
+            self.assertEqual(
+                set(agent_ids.tolist()),
+                set(np.flatnonzero(
+                    model.population.last_transition == 1).tolist()))
+            self.assertEqual(len(model.transitions), 0)
+
+    def test_draw_changes(self):
+        # The leaps have the mean of the agent based model
+        model = self.model()
+        step = model.compartment_step
+        changes = np.array([step._draw_changes([1000, 500, 500])
+                            for _ in range(2000)])
+        expected = [1000 * -np.expm1(-1.5 * 500 / 2000),
+                    500 * -np.expm1(-0.3), 500 * -np.expm1(-0.2)]
+        self.assertTrue(np.allclose(
+            np.mean(changes, axis=0), expected, rtol=0.01))
+
+    def test_ode_changes(self):
+        model = self.model(method='ode')
+        infections, recoveries, wanings = \
+            model.compartment_step._ode_changes([1000, 500, 500])
+
+        ode = simsurveillance.SIRSModel([0.5, 0.25, 0.25])
+        prevalence, incidence = ode.simulate([1.5, 0.3, 0.2], [0, 1])[1]
+        self.assertEqual(infections, round(incidence * 2000))
+        self.assertAlmostEqual(infections - recoveries,
+                               prevalence * 2000 - 500, delta=1)
+        self.assertGreater(wanings, 0)
+
+    def test_next_time(self):
+        model = simsurveillance.HybridSIRSModel(10)
+        step = model.compartment_step
+        self.assertIsNone(step.next_time(3))
+
+        model.initialize_infection(1)
+        self.assertEqual(step.next_time(3), 3)
+
+
+class TestRepresentationSwitchStep(unittest.TestCase):
+
+    def test_call(self):
+        model = simsurveillance.HybridSIRSModel(100, threshold=10)
+        step = model.switch_step
+        self.assertIsNone(step.next_time(0))
+
+        model.initialize_infection(9)
+        step(0)
+        self.assertEqual(model.representation, 'agents')
+
+        model.initialize_infection(1)
+        step(0)
+        self.assertEqual(model.representation, 'compartments')
+        self.assertEqual(model.switches[-1], (1, 'compartments'))
+
+        model.update_statuses(
+            list(model.persons[simsurveillance.InfectionStatus.INFECTED])[:6],
+            simsurveillance.InfectionStatus.RECOVERED, 3)
+        step(3)
+        self.assertEqual(model.representation, 'agents')
+        self.assertEqual(model.switches[-1], (4, 'agents'))
+
 
 if __name__ == '__main__':
     unittest.main()
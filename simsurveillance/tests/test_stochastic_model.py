@@ -0,0 +1,136 @@
+"""Test the classes of the stochastic_model.py
+"""
+
+import unittest
+import unittest.mock
+import numpy as np
+import simsurveillance
+from simsurveillance import InfectionStatus as InfStatus
+
+
+class TestSIRSStochasticCountModel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.params = {'transmission_rate': 0.4,
+                      'recovery_rate': 0.2,
+                      'waning_rate': 0.05}
+
+    def test_init(self):
+        m = simsurveillance.SIRSStochasticCountModel(10)
+        self.assertEqual(m.N, 10)
+        self.assertEqual(m.counts[InfStatus.SUSCEPTIBLE], 10)
+        self.assertEqual(m.counts[InfStatus.INFECTED], 0)
+
+        with self.assertRaises(ValueError):
+            simsurveillance.SIRSStochasticCountModel(10, method='euler')
+
+    def test_add_observers(self):
+        m = simsurveillance.SIRSStochasticCountModel(10)
+        obs = simsurveillance.Observer(m)
+        m.add_observers(obs)
+        self.assertIn(obs, m.observers)
+
+    def test_initialize_infection(self):
+        m = simsurveillance.SIRSStochasticCountModel(10)
+        m.initialize_infection(4)
+        self.assertEqual(m.counts[InfStatus.SUSCEPTIBLE], 6)
+        self.assertEqual(m.counts[InfStatus.INFECTED], 4)
+
+    def test_simulate(self):
+        for method in ['ssa', 'tau']:
+            m = simsurveillance.SIRSStochasticCountModel(1000, method=method)
+            m.params.set_parameters(self.params)
+            m.initialize_infection(10)
+
+            df = m.simulate([0, 5, 10, 20])
+            self.assertEqual(list(df['time']), [0, 5, 10, 20])
+            self.assertSetEqual(
+                set(df.columns), {'time', 'transmissions', *InfStatus})
+            self.assertEqual(df['transmissions'][0], 10)
+
+            total = sum(df[status] for status in InfStatus)
+            self.assertTrue(np.all(total == 1000))
+
+    def test_simulate_reproducible(self):
+        outputs = []
+        for _ in range(2):
+            m = simsurveillance.SIRSStochasticCountModel(1000, seed=5)
+            m.params.set_parameters(self.params)
+            m.initialize_infection(10)
+            outputs.append(m.simulate([0, 10, 20]))
+        self.assertTrue(outputs[0].equals(outputs[1]))
+
+    def test_simulate_stages(self):
+        for method in ['ssa', 'tau']:
+            models = []
+            for _ in range(2):
+                m = simsurveillance.SIRSStochasticCountModel(
+                    1000, seed=5, method=method)
+                m.params.set_parameters(self.params)
+                m.initialize_infection(10)
+                models.append(m)
+
+            whole = models[0].simulate(list(range(41)))
+            first = models[1].simulate(list(range(21)))
+            self.assertEqual(models[1].time, 21)
+            second = models[1].simulate(list(range(41)))
+            self.assertEqual(list(second['time']), list(range(21, 41)))
+            self.assertTrue(whole.iloc[21:].reset_index(drop=True).equals(
+                second))
+            self.assertTrue(whole.iloc[:21].equals(first))
+
+    def test_simulate_skips(self):
+        # Nothing happens without infected or recovered persons
+        m = simsurveillance.SIRSStochasticCountModel(100)
+        m.params.set_parameters(self.params)
+        with unittest.mock.patch.object(m, '_advance') as advance:
+            df = m.simulate(list(range(50)))
+        self.assertEqual(advance.call_count, 1)
+        self.assertEqual(list(df['time']), list(range(50)))
+        self.assertTrue(np.all(df[InfStatus.SUSCEPTIBLE] == 100))
+
+    def test_mean_matches_diffeq_model(self):
+        N = 10000
+        times = [0, 20, 40]
+        ode = simsurveillance.SIRSModel([0.995, 0.005, 0.0], N=N)
+        expected = ode.simulate(
+            [self.params[k] for k in ['transmission_rate',
+                                      'recovery_rate',
+                                      'waning_rate']],
+            times)[:, 0] * N
+
+        for method in ['ssa', 'tau']:
+            infected = []
+            for seed in range(10):
+                m = simsurveillance.SIRSStochasticCountModel(
+                    N, seed=seed, method=method)
+                m.params.set_parameters(self.params)
+                m.initialize_infection(50)
+                df = m.simulate(times)
+                infected.append(df[InfStatus.INFECTED])
+
+            mean_infected = np.mean(infected, axis=0)
+            for observed, ode_value in zip(mean_infected[1:], expected[1:]):
+                self.assertAlmostEqual(observed / ode_value, 1.0, delta=0.1)
+
+    def test_observers(self):
+        m = simsurveillance.SIRSStochasticCountModel(1000, method='tau')
+        m.params.set_parameters(self.params)
+        m.initialize_infection(100)
+
+        survey = simsurveillance.PrevalenceSurvey(
+            m, simsurveillance.DiseaseTest(), [2, 4], [50, 1000])
+        m.add_observers(survey)
+        df = m.simulate([0, 4])
+
+        self.assertTrue(survey.aggregate)
+        self.assertEqual(survey.times, [2, 4])
+
+        # Testing everyone with a perfect test finds all infected
+        self.assertEqual(survey.num_positive[1],
+                         df[InfStatus.INFECTED][1])
+
+
+if __name__ == '__main__':
+    unittest.main()